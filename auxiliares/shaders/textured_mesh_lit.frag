@@ -20,6 +20,9 @@ uniform sampler2D u_texture;
 // Lighting
 uniform vec3 u_viewPos;
 
+// Las luces se guardan en un uniform buffer compartido por todos los pipelines
+// iluminados. El layout std140 debe coincidir con LIGHTS_DTYPE en drawables.py
+
 // Directional
 struct DirectionalLight {
     vec3 direction;
@@ -28,42 +31,42 @@ struct DirectionalLight {
     vec3 specular;
 };
 
-uniform DirectionalLight u_dirLight;
-
 // Pointlight
 const int MAX_POINT_LIGHTS = 16;
-uniform int u_numPointLights;
 
 struct PointLight {
     vec3 position;
-    vec3 ambient;
-    vec3 diffuse;
-    vec3 specular;
     float constant;
+    vec3 ambient;
     float linear;
+    vec3 diffuse;
     float quadratic;
+    vec3 specular;
 };
 
-uniform PointLight u_pointLights[MAX_POINT_LIGHTS];
-
 // Spotlight
 const int MAX_SPOT_LIGHTS = 16;
-uniform int u_numSpotLights;
 
 struct SpotLight {
     vec3 position;
-    vec3 direction;
-    vec3 ambient;
-    vec3 diffuse;
-    vec3 specular;
     float constant;
+    vec3 direction;
     float linear;
+    vec3 ambient;
     float quadratic;
+    vec3 diffuse;
     float cutOff;
+    vec3 specular;
     float outerCutOff;
 };
 
-uniform SpotLight u_spotLights[MAX_SPOT_LIGHTS];
+layout (std140) uniform Lights {
+    DirectionalLight u_dirLight;
+    PointLight u_pointLights[MAX_POINT_LIGHTS];
+    SpotLight u_spotLights[MAX_SPOT_LIGHTS];
+    int u_numPointLights;
+    int u_numSpotLights;
+};
 
 vec3 computeDirectionalLight(vec3 normal, vec3 viewDir, DirectionalLight light) {
     //ambient
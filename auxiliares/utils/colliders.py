@@ -1,13 +1,25 @@
 import numpy as np
+from collections import defaultdict
+from itertools import combinations
 
 class Collider:
     def __init__(self, name):
         self.name = name
         self.type = "undefined"
+        # CollisionManagers que contienen al collider, se les avisa cuando se mueve
+        self.managers = []
     
     def set_position(self, position):
         pass
 
+    def moved(self):
+        for manager in self.managers:
+            manager.mark_dirty(self)
+
+    def bounds(self):
+        # caja (min, max) que contiene al collider, None si no puede colisionar
+        return None
+
     def detect_collision(self, other):
         return False
 
@@ -26,6 +38,10 @@ class AABB(Collider):
             return
         self.min = np.array(position) + self.minSize
         self.max = np.array(position) + self.maxSize
+        self.moved()
+
+    def bounds(self):
+        return self.min, self.max
     
     def detect_collision(self, other):
         if other.type == "AABB":
@@ -51,6 +67,10 @@ class Sphere(Collider):
         if (position is None) or (len(position) != 3):
             return
         self.center = np.array(position)
+        self.moved()
+
+    def bounds(self):
+        return self.center - self.radius, self.center + self.radius
     
     def detect_collision(self, other):
         if other.type == "Sphere":
@@ -64,32 +84,269 @@ class Sphere(Collider):
             return False
 
 
+class ColliderWorld:
+    """ Datos de todos los colliders en arreglos contiguos float32 (structure of arrays),
+    para probar muchos pares a la vez con expresiones de numpy en vez de un ciclo en python.
+    Cada collider ocupa una posición (slot) de los arreglos """
+
+    UNDEFINED = 0
+    AABB = 1
+    SPHERE = 2
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.kinds = np.zeros(capacity, dtype=np.int8)
+        self.mins = np.zeros((capacity, 3), dtype=np.float32)
+        self.maxs = np.zeros((capacity, 3), dtype=np.float32)
+        self.centers = np.zeros((capacity, 3), dtype=np.float32)
+        self.radii = np.zeros(capacity, dtype=np.float32)
+
+    def _grow(self, capacity):
+        for name in ["kinds", "mins", "maxs", "centers", "radii"]:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, collider):
+        """ Agrega el collider al final y entrega su slot """
+        if self.size == len(self.kinds):
+            self._grow(2 * len(self.kinds))
+        slot = self.size
+        self.size += 1
+        self.update(slot, collider)
+        return slot
+
+    def remove(self, slot):
+        """ Libera el slot moviendo a él el último collider, cuyo slot cambia """
+        last = self.size - 1
+        for name in ["kinds", "mins", "maxs", "centers", "radii"]:
+            values = getattr(self, name)
+            values[slot] = values[last]
+        self.size -= 1
+
+    def update(self, slot, collider):
+        """ Copia la posición actual del collider a su slot """
+        if collider.type == "AABB":
+            self.kinds[slot] = ColliderWorld.AABB
+            self.mins[slot] = collider.min
+            self.maxs[slot] = collider.max
+        elif collider.type == "Sphere":
+            self.kinds[slot] = ColliderWorld.SPHERE
+            self.centers[slot] = collider.center
+            self.radii[slot] = collider.radius
+            # la caja de la esfera, para la prueba contra cajas
+            self.mins[slot] = collider.center - collider.radius
+            self.maxs[slot] = collider.center + collider.radius
+        else:
+            self.kinds[slot] = ColliderWorld.UNDEFINED
+
+    def test_pairs(self, a, b):
+        """ Arreglo de bools: si colisionan los colliders de los slots a[i] y b[i] """
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        kind_a = self.kinds[a]
+        kind_b = self.kinds[b]
+        result = np.zeros(len(a), dtype=bool)
+
+        # caja con caja
+        boxes = (kind_a == ColliderWorld.AABB) & (kind_b == ColliderWorld.AABB)
+        i, j = a[boxes], b[boxes]
+        result[boxes] = np.all((self.mins[i] <= self.maxs[j]) & (self.maxs[i] >= self.mins[j]), axis=1)
+
+        # esfera con esfera
+        spheres = (kind_a == ColliderWorld.SPHERE) & (kind_b == ColliderWorld.SPHERE)
+        i, j = a[spheres], b[spheres]
+        distance = self.centers[i] - self.centers[j]
+        result[spheres] = np.einsum("ij,ij->i", distance, distance) <= (self.radii[i] + self.radii[j]) ** 2
+
+        # caja con esfera, en cualquier orden: el punto de la caja más cercano al centro
+        box_sphere = (kind_a == ColliderWorld.AABB) & (kind_b == ColliderWorld.SPHERE)
+        sphere_box = (kind_a == ColliderWorld.SPHERE) & (kind_b == ColliderWorld.AABB)
+        mixed = box_sphere | sphere_box
+        box = np.where(box_sphere, a, b)[mixed]
+        sphere = np.where(box_sphere, b, a)[mixed]
+        center = self.centers[sphere]
+        distance = center - np.maximum(self.mins[box], np.minimum(center, self.maxs[box]))
+        result[mixed] = np.einsum("ij,ij->i", distance, distance) <= self.radii[sphere] ** 2
+
+        return result
+
+
 class CollisionManager:
-    def __init__(self):
+    """ Fase amplia con una grilla uniforme (spatial hash): cada collider se guarda
+    en las celdas que toca su caja, y solo se prueban los pares que comparten alguna celda.
+    cell_size debería ser parecido al tamaño de los objetos de la escena """
+
+    # colliders que tocan más celdas que esto se prueban contra todos
+    MAX_CELLS = 64
+    # con menos candidatos conviene probarlos uno a uno
+    MIN_VECTORIZED = 16
+
+    def __init__(self, cell_size=2.0):
         self.colliders = []
+        self.cell_size = cell_size
+        # nombre -> collider, si se repite un nombre se mantiene el primero
+        self.index = {}
+        # orden de inserción, para entregar los resultados en el mismo orden que la lista
+        self.order = {}
+        self.next_order = 0
+        # celda (i, j, k) -> colliders que la tocan
+        self.cells = defaultdict(set)
+        # collider -> rango de celdas que ocupa
+        self.cell_ranges = {}
+        self.large = set()
+        # fase angosta vectorizada: collider -> slot en world, y slot -> collider
+        self.world = ColliderWorld()
+        self.slots = {}
+        self.slot_colliders = []
+        # colliders movidos desde la última consulta, ver sync
+        self.dirty = set()
 
     def add_collider(self, collider):
+        self.order[collider] = self.next_order
+        self.next_order += 1
         self.colliders.append(collider)
+        self.index.setdefault(collider.name, collider)
+        self.slots[collider] = self.world.add(collider)
+        self.slot_colliders.append(collider)
+        collider.managers.append(self)
+        self.update_cells(collider)
 
-    def __getitem__(self, name):
+    def remove_collider(self, name):
+        collider = self[name]
+        if collider is None:
+            return
+        self._clear_cells(collider)
+        self.cell_ranges.pop(collider, None)
+        self.colliders.remove(collider)
+        del self.order[collider]
+        collider.managers.remove(self)
+        self.dirty.discard(collider)
+
+        # el último slot pasa a ocupar el del collider eliminado
+        slot = self.slots.pop(collider)
+        self.world.remove(slot)
+        last = self.slot_colliders.pop()
+        if last is not collider:
+            self.slot_colliders[slot] = last
+            self.slots[last] = slot
+
+        del self.index[name]
         for c in self.colliders:
             if c.name == name:
-                return c
-        return None
+                self.index[name] = c
+                break
+
+    def __getitem__(self, name):
+        return self.index.get(name)
     
     def set_position(self, name, position):
         collider = self[name]
         if collider is not None:
             collider.set_position(position)
 
+    def mark_dirty(self, collider):
+        self.dirty.add(collider)
+
+    def sync(self):
+        """ Lleva a la grilla y a world las posiciones de los colliders movidos,
+        ya sea con set_position del manager o directamente con el del collider """
+        for collider in self.dirty:
+            self.world.update(self.slots[collider], collider)
+            self.update_cells(collider)
+        self.dirty.clear()
+
+    def _cell_range(self, collider):
+        bounds = collider.bounds()
+        if bounds is None:
+            return None
+        low = np.floor(np.asarray(bounds[0], dtype=float) / self.cell_size).astype(int)
+        high = np.floor(np.asarray(bounds[1], dtype=float) / self.cell_size).astype(int)
+        return tuple(low), tuple(high)
+
+    def _clear_cells(self, collider):
+        cell_range = self.cell_ranges.get(collider)
+        if cell_range is None:
+            return
+        if collider in self.large:
+            self.large.discard(collider)
+            return
+        for cell in self._cells(cell_range):
+            members = self.cells[cell]
+            members.discard(collider)
+            if len(members) == 0:
+                del self.cells[cell]
+
+    @staticmethod
+    def _cells(cell_range):
+        (i0, j0, k0), (i1, j1, k1) = cell_range
+        return [(i, j, k) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) for k in range(k0, k1 + 1)]
+
+    def update_cells(self, collider):
+        """ Actualiza las celdas del collider después de moverlo.
+        Si sigue en las mismas celdas no se hace nada """
+        cell_range = self._cell_range(collider)
+        if cell_range == self.cell_ranges.get(collider):
+            return
+
+        self._clear_cells(collider)
+        self.cell_ranges[collider] = cell_range
+        if cell_range is None:
+            return
+
+        size = np.prod(np.array(cell_range[1]) - np.array(cell_range[0]) + 1)
+        if size > self.MAX_CELLS:
+            self.large.add(collider)
+            return
+        for cell in self._cells(cell_range):
+            self.cells[cell].add(collider)
+
+    def candidates(self, collider):
+        """ Colliders que comparten alguna celda con collider """
+        self.sync()
+        cell_range = self.cell_ranges.get(collider)
+        if cell_range is None:
+            return set()
+        if collider in self.large:
+            return set(c for c in self.colliders if self.cell_ranges.get(c) is not None)
+
+        result = set(self.large)
+        for cell in self._cells(cell_range):
+            result.update(self.cells.get(cell, ()))
+        return result
+
     def check_collision(self, name):
         collider = self[name]
-        result = []
         if collider is None:
             return []
-        for c in self.colliders:
-            # ignorar colisiones de un objeto consigo mismo
-            if c.name != collider.name and c.detect_collision(collider):
-                result.append(c.name)
+        # ignorar colisiones de un objeto consigo mismo
+        others = sorted((c for c in self.candidates(collider) if c.name != collider.name), key=self.order.get)
+        if len(others) < self.MIN_VECTORIZED:
+            return [c.name for c in others if c.detect_collision(collider)]
+        slots = np.array([self.slots[c] for c in others])
+        hits = self.world.test_pairs(np.full(len(slots), self.slots[collider]), slots)
+        return [others[k].name for k in np.nonzero(hits)[0]]
+
+    def candidate_pairs(self):
+        """ Pares (a, b) de colliders que comparten alguna celda, cada par una vez """
+        self.sync()
+        pairs = set()
+        for members in self.cells.values():
+            if len(members) > 1:
+                for a, b in combinations(members, 2):
+                    pairs.add((a, b) if self.order[a] < self.order[b] else (b, a))
+        for a in self.large:
+            for b in self.colliders:
+                if b is not a and self.cell_ranges.get(b) is not None:
+                    pairs.add((a, b) if self.order[a] < self.order[b] else (b, a))
+        return sorted(pairs, key=lambda pair: (self.order[pair[0]], self.order[pair[1]]))
 
-        return result
\ No newline at end of file
+    def check_all_collisions(self):
+        """ Todos los pares de nombres (a, b) que colisionan, en una sola llamada """
+        pairs = [(a, b) for a, b in self.candidate_pairs() if a.name != b.name]
+        if len(pairs) == 0:
+            return []
+        slots = np.array([(self.slots[a], self.slots[b]) for a, b in pairs])
+        hits = self.world.test_pairs(slots[:, 0], slots[:, 1])
+        return [(pairs[k][0].name, pairs[k][1].name) for k in np.nonzero(hits)[0]]
\ No newline at end of file
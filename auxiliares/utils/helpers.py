@@ -1,8 +1,18 @@
+import pyglet
 from pyglet.graphics.shader import ShaderProgram, Shader
 import trimesh as tm
 from OpenGL.GL import GL_LINES, GL_TRIANGLES
 import os
+import json
+import hashlib
+import shutil
+from collections import OrderedDict
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+import threading
 from pathlib import Path
+import numpy as np
+from PIL import Image
 from auxiliares.utils.drawables import Model, Texture
 from trimesh.scene.scene import Scene
 from auxiliares.utils.scene_graph import SceneGraph 
@@ -20,7 +30,7 @@ def init_axis(controller):
     with open(Path(os.path.dirname(__file__)) / "../shaders/color.frag") as f:
         color_fragment_source_code = f.read()
 
-    color_pipeline = ShaderProgram(Shader(color_vertex_source_code, "vertex"), Shader(color_fragment_source_code, "fragment"))
+    color_pipeline = get_program(color_vertex_source_code, color_fragment_source_code)
 
     axes = Model(shapes.Axes["position"])
 
@@ -31,6 +41,20 @@ def init_axis(controller):
 
     return axis_scene
 
+# Programs ya enlazados: (contexto, hash de los shaders) -> ShaderProgram
+_program_cache = {}
+
+def get_program(vs, fs):
+    """ Compila y enlaza los shaders solo la primera vez que se piden en el contexto actual,
+    después todos los pipelines con el mismo código comparten el programa """
+    key = (id(pyglet.gl.current_context), hashlib.sha1((vs + "\0" + fs).encode()).hexdigest())
+    if key not in _program_cache:
+        _program_cache[key] = ShaderProgram(
+            Shader(vs, "vertex"),
+            Shader(fs, "fragment")
+        )
+    return _program_cache[key]
+
 def init_pipeline(vertex_source, fragment_source):
     with open(vertex_source) as f:
         vs = f.read()
@@ -38,39 +62,216 @@ def init_pipeline(vertex_source, fragment_source):
     with open(fragment_source) as f:
         fs = f.read()
 
-    pipeline = ShaderProgram(
-        Shader(vs, "vertex"),
-        Shader(fs, "fragment")
-    )
+    return get_program(vs, fs)
+
+# Caché en memoria de mesh_from_file (LRU): llave -> lista de {"id", "mesh", "texture"}
+MESH_CACHE_SIZE = 16
+_mesh_cache = OrderedDict()
 
-    return pipeline
+def _mesh_cache_key(path, normalize):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size, normalize)
 
-def mesh_from_file(path):
+def _mesh_cache_dir(key):
+    path, mtime, size, normalize = key
+    return os.path.join(os.path.dirname(path), "__meshcache__", f"{os.path.basename(path)}-{int(normalize)}-{mtime}-{size}")
+
+def _read_geometries(path, normalize):
+    """Lee el archivo con trimesh y retorna los arreglos de cada geometría"""
     mesh_data = tm.load(path)
-    mesh_data.apply_transform(tr.uniformScale(2.0 / mesh_data.scale) @ tr.translate(*-mesh_data.centroid))
+    if normalize:
+        mesh_data.apply_transform(tr.uniformScale(2.0 / mesh_data.scale) @ tr.translate(*-mesh_data.centroid))
 
-    mesh_list = []
+    geometries = []
 
     def process_geometry(id, geometry):
         vertex_data = tm.rendering.mesh_to_vertexlist(geometry)
-        indices = vertex_data[3]
-        positions = vertex_data[4][1]
-        uvs = None
-        texture = None
-        normals = vertex_data[5][1]
-
+        data = {
+            "id": id,
+            "indices": np.asarray(vertex_data[3], dtype=np.uint32),
+            "positions": np.asarray(vertex_data[4][1], dtype=np.float32),
+            "normals": np.asarray(vertex_data[5][1], dtype=np.float32),
+            "uvs": None,
+            "image": None,
+        }
         if geometry.visual.kind == "texture":
-            texture = Texture()
-            uvs = vertex_data[6][1]
-            texture.create_from_image(geometry.visual.material.image)
-
-        model = Model(positions, uvs, normals, indices)
-        return {"id": id, "mesh": model, "texture": texture}
+            data["uvs"] = np.asarray(vertex_data[6][1], dtype=np.float32)
+            # materiales que referencian una imagen que no se encontró quedan sin textura
+            if geometry.visual.material.image is not None:
+                data["image"] = np.asarray(geometry.visual.material.image)
+        geometries.append(data)
 
     if type(mesh_data) is Scene:
         for id, geometry in mesh_data.geometry.items():
-            mesh_list.append(process_geometry(id, geometry))
+            process_geometry(id, geometry)
     else:
-        mesh_list.append(process_geometry("model", mesh_data))
+        process_geometry("model", mesh_data)
+
+    return geometries
+
+def _save_geometries(directory, geometries):
+    """Guarda los arreglos en disco, un .npy por arreglo para poder mapearlos en memoria"""
+    try:
+        parent = os.path.dirname(directory)
+        os.makedirs(parent, exist_ok=True)
+        # las entradas de versiones anteriores del archivo ya no sirven
+        name = os.path.basename(directory).rsplit("-", 2)[0]
+        for entry in os.listdir(parent):
+            if entry.rsplit("-", 2)[0] == name:
+                shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+        temp_directory = directory + f".{os.getpid()}-{threading.get_ident()}.tmp"
+        os.makedirs(temp_directory, exist_ok=True)
+        index = []
+        for i, data in enumerate(geometries):
+            index.append({"id": data["id"], "uvs": data["uvs"] is not None, "image": data["image"] is not None})
+            for name in ["indices", "positions", "normals", "uvs", "image"]:
+                if data[name] is not None:
+                    np.save(os.path.join(temp_directory, f"{i}.{name}.npy"), data[name])
+        with open(os.path.join(temp_directory, "index.json"), "w") as f:
+            json.dump(index, f)
+        os.replace(temp_directory, directory)
+    except OSError:
+        # el caché en disco es opcional, p.ej. si la carpeta de assets es de sólo lectura
+        pass
+
+def _load_geometries(directory):
+    with open(os.path.join(directory, "index.json")) as f:
+        index = json.load(f)
+
+    geometries = []
+    for i, entry in enumerate(index):
+        data = {"id": entry["id"], "uvs": None, "image": None}
+        names = ["indices", "positions", "normals"]
+        names += [name for name in ["uvs", "image"] if entry[name]]
+        for name in names:
+            data[name] = np.load(os.path.join(directory, f"{i}.{name}.npy"), mmap_mode="r")
+        geometries.append(data)
+    return geometries
+
+def _mesh_geometries(key, cache=True):
+    """Arreglos de las geometrías del archivo, desde el caché en disco o leyéndolo con trimesh. No usa OpenGL."""
+    directory = _mesh_cache_dir(key)
+    if cache and os.path.exists(os.path.join(directory, "index.json")):
+        return _load_geometries(directory)
+
+    geometries = _read_geometries(key[0], key[3])
+    if cache:
+        _save_geometries(directory, geometries)
+    return geometries
+
+def _meshes_from_geometries(key, geometries, cache=True):
+    """Crea los modelos y sube las texturas, debe llamarse desde el hilo con el contexto de OpenGL"""
+    mesh_list = []
+    for data in geometries:
+        texture = None
+        if data["image"] is not None:
+            texture = Texture(image=Image.fromarray(np.asarray(data["image"])))
+
+        model = Model(data["positions"], data["uvs"], data["normals"], data["indices"])
+        mesh_list.append({"id": data["id"], "mesh": model, "texture": texture})
+
+    if cache:
+        _mesh_cache[key] = mesh_list
+        if len(_mesh_cache) > MESH_CACHE_SIZE:
+            _mesh_cache.popitem(last=False)
+        return [dict(mesh) for mesh in mesh_list]
+
+    return mesh_list
+
+def mesh_from_file(path, normalize=True, cache=True):
+    """
+    Carga los meshes de un archivo. Retorna una lista de diccionarios con "id", "mesh" y "texture".
+    Los resultados se guardan en un caché en memoria (LRU) y los datos ya procesados en una
+    carpeta __meshcache__ junto al archivo, así cargar otra vez el mismo archivo, o después de
+    reiniciar el programa, no vuelve a leerlo con trimesh mientras no cambie.
+    """
+    key = _mesh_cache_key(path, normalize)
+    if cache and key in _mesh_cache:
+        _mesh_cache.move_to_end(key)
+        return [dict(mesh) for mesh in _mesh_cache[key]]
+
+    return _meshes_from_geometries(key, _mesh_geometries(key, cache), cache)
+
+def _decode_image(path):
+    image = Image.open(path)
+    image.load()
+    return image
+
+class AssetManager():
+    """
+    Carga meshes y texturas en paralelo. Leer los archivos y decodificar las imágenes se
+    hace en un pool de hilos; la creación de texturas, que usa OpenGL, se hace en el hilo
+    que llama a wait() o poll(), a medida que cada recurso está listo.
+
+    progress, si se entrega, se llama como progress(nombre, cargados, total) por cada recurso.
+    """
+    def __init__(self, max_workers=None, progress=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.progress = progress
+        self.assets = {}
+        # nombre -> (future, función que termina la carga en el hilo de OpenGL)
+        self.pending = {}
+        # futures por llave de caché, para no leer dos veces el mismo archivo
+        self.mesh_futures = {}
+        self.total = 0
+
+    def mesh(self, name, path, normalize=True, cache=True):
+        """Agenda mesh_from_file(path); el resultado queda en manager[name]"""
+        key = _mesh_cache_key(path, normalize)
+        if cache and key in _mesh_cache:
+            self.add(name, None, lambda _: mesh_from_file(path, normalize))
+            return
+
+        if key not in self.mesh_futures or not cache:
+            self.mesh_futures[key] = self.executor.submit(_mesh_geometries, key, cache)
+
+        def finish_mesh(geometries):
+            # otro recurso pudo haber cargado el mismo archivo antes
+            if cache and key in _mesh_cache:
+                return mesh_from_file(path, normalize)
+            return _meshes_from_geometries(key, geometries, cache)
+
+        self.add(name, self.mesh_futures[key], finish_mesh)
+
+    def texture(self, name, path, **kwargs):
+        """Agenda Texture(path, **kwargs); el resultado queda en manager[name]"""
+        self.add(name, self.executor.submit(_decode_image, path), lambda image: Texture(image=image, **kwargs))
+
+    def add(self, name, future, finish):
+        self.pending[name] = (future, finish)
+        self.total += 1
+
+    def finish(self, name):
+        future, finish = self.pending.pop(name)
+        self.assets[name] = finish(future.result() if future is not None else None)
+        if self.progress is not None:
+            self.progress(name, len(self.assets), self.total)
+
+    def poll(self):
+        """Termina los recursos que ya están listos sin bloquear. Retorna True si no queda ninguno pendiente."""
+        for name, (future, _) in list(self.pending.items()):
+            if future is None or future.done():
+                self.finish(name)
+        return len(self.pending) == 0
+
+    def wait(self):
+        """Bloquea hasta que todos los recursos estén cargados, terminándolos en el orden en que llegan"""
+        while len(self.pending) > 0:
+            futures = [future for future, _ in self.pending.values() if future is not None]
+            if len(futures) > 0:
+                concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            self.poll()
+        self.mesh_futures.clear()
+        return self.assets
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
 
-    return mesh_list
\ No newline at end of file
+    def __getitem__(self, name):
+        if name not in self.assets:
+            if name not in self.pending:
+                raise KeyError(f"Recurso {name} no fue agendado")
+            self.finish(name)
+        return self.assets[name]
@@ -15,7 +15,7 @@ import auxiliares.utils.shapes as shapes
 from auxiliares.utils.camera import FreeCamera
 from auxiliares.utils.scene_graph import SceneGraph
 from auxiliares.utils.drawables import Model, Texture, DirectionalLight, PointLight, SpotLight, Material
-from auxiliares.utils.helpers import init_axis, init_pipeline, mesh_from_file, get_path
+from auxiliares.utils.helpers import init_axis, init_pipeline, mesh_from_file, get_path, AssetManager
 
 WIDTH = 640
 HEIGHT = 640
@@ -70,11 +70,23 @@ if __name__ == "__main__":
     pyramid = Model(shapes.SquarePyramid["position"], shapes.SquarePyramid["uv"], shapes.SquarePyramid["normal"], index_data=shapes.SquarePyramid["indices"])
     triangle = Model(shapes.Triangle["position"], shapes.Triangle["uv"], shapes.Triangle["normal"])
     quad = Model(shapes.Square["position"], shapes.Square["uv"], shapes.Square["normal"], index_data=shapes.Square["indices"])
-    arrow = mesh_from_file("assets/arrow.off")[0]["mesh"]
 
-    bricks = Texture("assets/bricks.jpg")
-    wall2 = Texture("assets/wall2.jpg")
-    boo = Texture("assets/boo.png", maxFilterMode=GL.GL_NEAREST)
+    # Los archivos se leen en paralelo, las texturas se suben a la GPU a medida que llegan
+    assets = AssetManager(progress=lambda name, loaded, total: print(f"Cargado {name} ({loaded}/{total})"))
+    assets.mesh("arrow", "assets/arrow.off")
+    assets.mesh("zorzal", "assets/zorzal.obj")
+    assets.mesh("auto", "assets/auto.off")
+    assets.texture("bricks", "assets/bricks.jpg")
+    assets.texture("wall2", "assets/wall2.jpg")
+    assets.texture("boo", "assets/boo.png", maxFilterMode=GL.GL_NEAREST)
+    assets.wait()
+    assets.shutdown()
+
+    arrow = assets["arrow"][0]["mesh"]
+
+    bricks = assets["bricks"]
+    wall2 = assets["wall2"]
+    boo = assets["boo"]
 
     graph = SceneGraph(controller)
 
@@ -123,7 +135,7 @@ if __name__ == "__main__":
 
     # mesh_from_file() devuelve una lista de diccionarios, cada uno con la información de un mesh
     # [{id, mesh, texture}, ...]
-    zorzal = mesh_from_file("assets/zorzal.obj")
+    zorzal = assets["zorzal"]
     graph.add_node("zorzal")
     for i in range(len(zorzal)):
         graph.add_node(zorzal[i]["id"],
@@ -134,7 +146,7 @@ if __name__ == "__main__":
                     texture=zorzal[i]["texture"],
                     cull_face=False)
         
-    auto = mesh_from_file("assets/auto.off")
+    auto = assets["auto"]
     graph.add_node(auto[0]["id"],
                 attach_to="root",
                 mesh=auto[0]["mesh"],
@@ -17,7 +17,7 @@ import auxiliares.utils.shapes as shapes
 from auxiliares.utils.camera import FreeCamera
 from auxiliares.utils.scene_graph import SceneGraph
 from auxiliares.utils.drawables import Model, Texture, DirectionalLight, PointLight, SpotLight, Material
-from auxiliares.utils.helpers import init_axis, init_pipeline, mesh_from_file, get_path
+from auxiliares.utils.helpers import init_axis, init_pipeline, mesh_from_file, get_path, AssetManager
 
 WIDTH = 640
 HEIGHT = 640
@@ -84,10 +84,20 @@ if __name__ == "__main__":
     cube = Model(shapes.Cube["position"], shapes.Cube["uv"], shapes.Cube["normal"], index_data=shapes.Cube["indices"])
     pyramid = Model(shapes.SquarePyramid["position"], shapes.SquarePyramid["uv"], shapes.SquarePyramid["normal"], index_data=shapes.SquarePyramid["indices"])
     quad = Model(shapes.Square["position"], shapes.Square["uv"], shapes.Square["normal"], index_data=shapes.Square["indices"])
-    sphere = mesh_from_file("assets/sphere.off")[0]["mesh"]
 
-    bricks = Texture("assets/bricks.jpg")
-    wall2 = Texture("assets/wall2.jpg")
+    # Los archivos se leen en paralelo, las texturas se suben a la GPU a medida que llegan
+    assets = AssetManager(progress=lambda name, loaded, total: print(f"Cargado {name} ({loaded}/{total})"))
+    assets.mesh("sphere", "assets/sphere.off")
+    assets.mesh("zorzal", "assets/zorzal.obj")
+    assets.texture("bricks", "assets/bricks.jpg")
+    assets.texture("wall2", "assets/wall2.jpg")
+    assets.wait()
+    assets.shutdown()
+
+    sphere = assets["sphere"][0]["mesh"]
+
+    bricks = assets["bricks"]
+    wall2 = assets["wall2"]
 
     graph = SceneGraph(controller)
 
@@ -97,7 +107,7 @@ if __name__ == "__main__":
                    rotation=[-np.pi/4, 0, 0],
                    light=DirectionalLight(diffuse = [1, 1, 1], specular = [0.25, 0.25, 0.25], ambient = [0.15, 0.15, 0.15]))
 
-    zorzal = mesh_from_file("assets/zorzal.obj")
+    zorzal = assets["zorzal"]
     graph.add_node("zorzal")
     for i in range(len(zorzal)):
         graph.add_node(zorzal[i]["id"],
@@ -190,9 +190,9 @@ if __name__ == "__main__":
         # The axis is drawn without lighting effects
         if controller.showAxis:
             glUseProgram(mvpPipeline.shaderProgram)
-            glUniformMatrix4fv(glGetUniformLocation(mvpPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-            glUniformMatrix4fv(glGetUniformLocation(mvpPipeline.shaderProgram, "view"), 1, GL_TRUE, view)
-            glUniformMatrix4fv(glGetUniformLocation(mvpPipeline.shaderProgram, "model"), 1, GL_TRUE, tr.identity())
+            mvpPipeline.uniforms["projection"] = projection
+            mvpPipeline.uniforms["view"] = view
+            mvpPipeline.uniforms["model"] = tr.identity()
             mvpPipeline.drawCall(gpuAxis, GL_LINES)
 
         # Selecting the shape to display
@@ -221,31 +221,35 @@ if __name__ == "__main__":
         
         glUseProgram(lightingPipeline.shaderProgram)
 
-        # Setting all uniform shader variables
+        # Setting all uniform shader variables.
+        # Uniform locations are cached by the pipeline, and values equal to
+        # the ones sent in a previous frame are not sent again
+        uniforms = lightingPipeline.uniforms
+        uniforms.skipUnchanged = True
 
         # White light in all components: ambient, diffuse and specular.
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "La"), 1.0, 1.0, 1.0)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ld"), 1.0, 1.0, 1.0)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ls"), 1.0, 1.0, 1.0)
+        uniforms["La"] = [1.0, 1.0, 1.0]
+        uniforms["Ld"] = [1.0, 1.0, 1.0]
+        uniforms["Ls"] = [1.0, 1.0, 1.0]
 
         # Object is barely visible at only ambient. Diffuse behavior is slightly red. Sparkles are white
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ka"), 0.2, 0.2, 0.2)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Kd"), 0.9, 0.5, 0.5)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "Ks"), 1.0, 1.0, 1.0)
+        uniforms["Ka"] = [0.2, 0.2, 0.2]
+        uniforms["Kd"] = [0.9, 0.5, 0.5]
+        uniforms["Ks"] = [1.0, 1.0, 1.0]
 
         # TO DO: Explore different parameter combinations to understand their effect!
 
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "lightPosition"), -5, -5, 5)
-        glUniform3f(glGetUniformLocation(lightingPipeline.shaderProgram, "viewPosition"), viewPos[0], viewPos[1], viewPos[2])
-        glUniform1ui(glGetUniformLocation(lightingPipeline.shaderProgram, "shininess"), 100)
-        
-        glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "constantAttenuation"), 0.0001)
-        glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "linearAttenuation"), 0.03)
-        glUniform1f(glGetUniformLocation(lightingPipeline.shaderProgram, "quadraticAttenuation"), 0.01)
+        uniforms["lightPosition"] = [-5, -5, 5]
+        uniforms["viewPosition"] = viewPos
+        uniforms["shininess"] = 100
+
+        uniforms["constantAttenuation"] = 0.0001
+        uniforms["linearAttenuation"] = 0.03
+        uniforms["quadraticAttenuation"] = 0.01
 
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "projection"), 1, GL_TRUE, projection)
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "view"), 1, GL_TRUE, view)
-        glUniformMatrix4fv(glGetUniformLocation(lightingPipeline.shaderProgram, "model"), 1, GL_TRUE, model)
+        uniforms["projection"] = projection
+        uniforms["view"] = view
+        uniforms["model"] = model
 
         # Drawing
         lightingPipeline.drawCall(gpuShape)
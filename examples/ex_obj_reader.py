@@ -13,6 +13,7 @@ import grafica.basic_shapes as bs
 import grafica.easy_shaders as es
 import grafica.lighting_shaders as ls
 import grafica.performance_monitor as pm
+import grafica.obj_reader as obj
 from grafica.assets_path import getAssetPath
 
 __author__ = "Daniel Calderon"
@@ -43,78 +44,6 @@ def on_key(window, key, scancode, action, mods):
         glfw.set_window_should_close(window, True)
 
 
-def readFaceVertex(faceDescription):
-
-    aux = faceDescription.split('/')
-
-    assert len(aux[0]), "Vertex index has not been defined."
-
-    faceVertex = [int(aux[0]), None, None]
-
-    assert len(aux) == 3, "Only faces where its vertices require 3 indices are defined."
-
-    if len(aux[1]) != 0:
-        faceVertex[1] = int(aux[1])
-
-    if len(aux[2]) != 0:
-        faceVertex[2] = int(aux[2])
-
-    return faceVertex
-
-
-
-def readOBJ(filename, color):
-
-    vertices = []
-    normals = []
-    textCoords= []
-    faces = []
-
-    with open(filename, 'r') as file:
-        for line in file.readlines():
-            aux = line.strip().split(' ')
-            
-            if aux[0] == 'v':
-                vertices += [[float(coord) for coord in aux[1:]]]
-
-            elif aux[0] == 'vn':
-                normals += [[float(coord) for coord in aux[1:]]]
-
-            elif aux[0] == 'vt':
-                assert len(aux[1:]) == 2, "Texture coordinates with different than 2 dimensions are not supported"
-                textCoords += [[float(coord) for coord in aux[1:]]]
-
-            elif aux[0] == 'f':
-                N = len(aux)                
-                faces += [[readFaceVertex(faceVertex) for faceVertex in aux[1:4]]]
-                for i in range(3, N-1):
-                    faces += [[readFaceVertex(faceVertex) for faceVertex in [aux[i], aux[i+1], aux[1]]]]
-
-        vertexData = []
-        indices = []
-        index = 0
-
-        # Per previous construction, each face is a triangle
-        for face in faces:
-
-            # Checking each of the triangle vertices
-            for i in range(0,3):
-                vertex = vertices[face[i][0]-1]
-                normal = normals[face[i][2]-1]
-
-                vertexData += [
-                    vertex[0], vertex[1], vertex[2],
-                    color[0], color[1], color[2],
-                    normal[0], normal[1], normal[2]
-                ]
-
-            # Connecting the 3 vertices to create a triangle
-            indices += [index, index + 1, index + 2]
-            index += 3        
-
-        return bs.Shape(vertexData, indices)
-
-
 if __name__ == "__main__":
 
     # Initialize glfw
@@ -159,10 +88,10 @@ if __name__ == "__main__":
     # Creating shapes on GPU memory
     gpuAxis = createGPUShape(mvpPipeline, bs.createAxis(7))
 
-    shapeSuzanne = readOBJ(getAssetPath('suzanne.obj'), (0.9, 0.6, 0.2))
+    shapeSuzanne = obj.readOBJ(getAssetPath('suzanne.obj'), (0.9, 0.6, 0.2))
     gpuSuzanne = createGPUShape(pipeline, shapeSuzanne)
 
-    shapeCarrot = readOBJ(getAssetPath('carrot.obj'), (0.6, 0.9, 0.5))
+    shapeCarrot = obj.readOBJ(getAssetPath('carrot.obj'), (0.6, 0.9, 0.5))
     gpuCarrot = createGPUShape(pipeline, shapeCarrot)
 
     # Setting uniforms that will NOT change on each iteration
@@ -54,27 +54,23 @@ def createVertices(N, maxPerturbationSize, time, normalizedMousePos):
     numberOfPerturbations = 20 * normalizedMousePos[0]
     perturbationSize = maxPerturbationSize * normalizedMousePos[1]
 
-    # First vertex at the center
-    vertices = [0.0, 0.0, 0.0, 1.0, 1.0, 1.0]
-
-    dtheta = 2 * math.pi / N
+    # Vertices are generated directly into a numpy array, one row per vertex
+    vertices = np.zeros((N + 1, 6), dtype=np.float32)
 
-    for i in range(N):
-        theta = i * dtheta
-
-        radialDirection = np.array([math.cos(theta), math.sin(theta)])
-        smallPerturbation = perturbationSize * math.sin(4 * time) * math.cos(numberOfPerturbations * theta)
-        radious = 0.7 + smallPerturbation
+    # First vertex at the center
+    vertices[0] = [0.0, 0.0, 0.0, 1.0, 1.0, 1.0]
 
-        xCoord = radious * radialDirection[0]
-        yCoord = radious * radialDirection[1]
+    theta = np.arange(N) * (2 * math.pi / N)
+    smallPerturbation = perturbationSize * math.sin(4 * time) * np.cos(numberOfPerturbations * theta)
+    radious = 0.7 + smallPerturbation
 
-        vertices += [
-            # vertex coordinates
-            xCoord, yCoord, 0,
+    # vertex coordinates
+    vertices[1:, 0] = radious * np.cos(theta)
+    vertices[1:, 1] = radious * np.sin(theta)
 
-            # color generates varying between 0 and 1
-            math.sin(theta + 3 * time),       math.cos(theta + 3 * time), 0]
+    # color generates varying between 0 and 1
+    vertices[1:, 3] = np.sin(theta + 3 * time)
+    vertices[1:, 4] = np.cos(theta + 3 * time)
 
     return vertices
 
@@ -96,7 +92,7 @@ def createShape(N, maxPerturbationSize, time, normalizedMousePos):
     vertices = createVertices(N, maxPerturbationSize, time, normalizedMousePos)
     indices = createIndices(N)
     
-    return bs.Shape(vertices, indices)
+    return bs.ArrayShape(vertices, indices)
     
 
 if __name__ == "__main__":
@@ -128,8 +124,12 @@ if __name__ == "__main__":
     shape = createShape(200, 15, 0.0, (0,0))
     gpuShape = es.GPUShape().initBuffers()
     pipeline.setupVAO(gpuShape)
-    # We use stream as we will be changing the vertex data on each frame
-    gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STREAM_DRAW)
+    # We use stream as we will be changing the vertex data on each frame.
+    # Memory is reserved only once, with 3 segments so each frame writes
+    # vertices the GPU is not reading anymore
+    gpuShape.allocateBuffers(len(shape.vertices), 6, len(shape.indices), GL_STREAM_DRAW, segments=3)
+    gpuShape.streamVertices(shape.vertices)
+    gpuShape.updateIndices(shape.indices)
     
     # Setting up the clear screen color
     glClearColor(0.15, 0.15, 0.15, 1.0)
@@ -154,12 +154,9 @@ if __name__ == "__main__":
             controller.mousePos[1] / height
         )
 
-        # A better approach is to generate the vertices directly into the numpy array.
-        # python lists are always expensive...
+        # Only the vertices change, they are written into the next segment of the buffer
         vertices = createVertices(200, 0.2, time, normalizedMousePos)
-        vertexData = np.array(vertices, dtype=np.float32)
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBufferData(GL_ARRAY_BUFFER, len(vertexData) * SIZE_IN_BYTES, vertexData, GL_STREAM_DRAW)
+        gpuShape.streamVertices(vertices)
 
         # Drawing the Quad as specified in the VAO with the active shader program
         pipeline.drawCall(gpuShape)
@@ -67,6 +67,7 @@ if __name__ == "__main__":
     # Creating shader programs
     texturePipeline = es.SimpleTextureShaderProgram()
     textPipeline = tx.TextureTextRendererShaderProgram()
+    textAtlasPipeline = tx.TextureTextAtlasShaderProgram()
 
     # Setting up the clear screen color
     glClearColor(0.25, 0.25, 0.25, 1.0)
@@ -110,22 +111,14 @@ if __name__ == "__main__":
     dateCharSize = 0.15
     timeCharSize = 0.1
 
-    now = datetime.datetime.now()
-    dateStr = now.strftime("%d/%m/%Y")
-    timeStr = now.strftime("%H:%M:%S.%f")[:-3]
-    dateShape = tx.textToShape(dateStr, dateCharSize, dateCharSize)
-    timeShape = tx.textToShape(timeStr, timeCharSize, timeCharSize)
-    gpuDate = es.GPUShape().initBuffers()
-    gpuTime = es.GPUShape().initBuffers()
-    textPipeline.setupVAO(gpuDate)
-    textPipeline.setupVAO(gpuTime)
-    gpuDate.fillBuffers(dateShape.vertices, dateShape.indices, GL_STATIC_DRAW)
-    gpuTime.fillBuffers(timeShape.vertices, timeShape.indices, GL_STATIC_DRAW)
-    gpuDate.texture = gpuText3DTexture
-    gpuTime.texture = gpuText3DTexture
+    # Date and time share a buffer on GPU memory, only the characters that change
+    # are sent to it and both are drawn with a single draw call
+    hud = tx.TextBuffer(textAtlasPipeline, 32)
+    dateField = hud.addField(-0.9, -0.7, dateCharSize, dateCharSize, 10, [1, 1, 1, 1], [0, 0, 0, 0.5])
+    timeField = hud.addField(-0.9, -0.9, timeCharSize, timeCharSize, 12, [1, 1, 1, 1], [0, 0, 0, 0])
 
+    now = datetime.datetime.now()
     second = now.second
-    color = [1.0,1.0,1.0]
 
     perfMonitor = pm.PerformanceMonitor(glfw.get_time(), 0.5)
 
@@ -160,30 +153,17 @@ if __name__ == "__main__":
         textPipeline.drawCall(gpuHeader)
 
         now = datetime.datetime.now()
-        dateStr = now.strftime("%d/%m/%Y")
-        timeStr = now.strftime("%H:%M:%S.%f")[:-3]
-        dateShape = tx.textToShape(dateStr, dateCharSize, dateCharSize)
-        timeShape = tx.textToShape(timeStr, timeCharSize, timeCharSize)
 
-        # Updating GPU memory...
-        gpuDate.fillBuffers(dateShape.vertices, dateShape.indices, GL_STREAM_DRAW)
-        gpuTime.fillBuffers(timeShape.vertices, timeShape.indices, GL_STREAM_DRAW)
+        # Updating GPU memory, only for the digits that changed
+        hud.setText(dateField, now.strftime("%d/%m/%Y"))
+        hud.setText(timeField, now.strftime("%H:%M:%S.%f")[:-3])
 
         if now.second != second:
             second = now.second
             color = [random.random(), random.random(), random.random()]
-        
-        glUniform4f(glGetUniformLocation(textPipeline.shaderProgram, "fontColor"), color[0], color[1], color[2], 1)
-        glUniform4f(glGetUniformLocation(textPipeline.shaderProgram, "backColor"), 1-color[0], 1-color[1], 1-color[2],0.5)
-        glUniformMatrix4fv(glGetUniformLocation(textPipeline.shaderProgram, "transform"), 1, GL_TRUE,
-            tr.translate(-0.9, -0.7, 0))
-        textPipeline.drawCall(gpuDate)
-
-        glUniform4f(glGetUniformLocation(textPipeline.shaderProgram, "fontColor"), 1,1,1,1)
-        glUniform4f(glGetUniformLocation(textPipeline.shaderProgram, "backColor"), 0,0,0,0)
-        glUniformMatrix4fv(glGetUniformLocation(textPipeline.shaderProgram, "transform"), 1, GL_TRUE,
-            tr.translate(-0.9, -0.9, 0))
-        textPipeline.drawCall(gpuTime)
+            hud.setColors(dateField, color + [1], [1-color[0], 1-color[1], 1-color[2], 0.5])
+
+        hud.draw(tr.identity())
 
         # Once the drawing is rendered, buffers are swap so an uncomplete drawing is never seen.
         glfw.swap_buffers(window)
@@ -191,7 +171,6 @@ if __name__ == "__main__":
     # freeing GPU memory
     gpuBackground.clear()
     gpuHeader.clear()
-    gpuDate.clear()
-    gpuTime.clear()
+    hud.clear()
 
     glfw.terminate()
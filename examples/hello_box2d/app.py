@@ -14,6 +14,8 @@ if sys.path[0] != "":
     sys.path.insert(0, "")
 
 import grafica.transformations as tr
+from grafica.performance_monitor import FrameProfiler
+from auxiliares.utils.drawables import Model
 
 if __name__ == "__main__":
     width = 960
@@ -38,13 +40,18 @@ if __name__ == "__main__":
     frag_shader = pyglet.graphics.shader.Shader(fragment_source_code, "fragment")
     pipeline = pyglet.graphics.shader.ShaderProgram(vert_shader, frag_shader)
 
-    cube_vertex_list = tm.rendering.mesh_to_vertexlist(cube)
+    # los cubos se dibujan todos juntos con instancing: cada cuerpo es una instancia
+    # con su propia matriz de transformación.
+    with open(Path(os.path.dirname(__file__)) / "instanced_vertex_program.glsl") as f:
+        instanced_vertex_source_code = f.read()
 
-    cube_gpu = pipeline.vertex_list_indexed(
-        len(cube_vertex_list[4][1]) // 3, GL.GL_TRIANGLES, cube_vertex_list[3]
-    )
+    instanced_vert_shader = pyglet.graphics.shader.Shader(instanced_vertex_source_code, "vertex")
+    instanced_pipeline = pyglet.graphics.shader.ShaderProgram(instanced_vert_shader, frag_shader)
+
+    cube_vertex_list = tm.rendering.mesh_to_vertexlist(cube)
 
-    cube_gpu.position[:] = cube_vertex_list[4][1]
+    cube_gpu = Model(cube_vertex_list[4][1], index_data=cube_vertex_list[3])
+    cube_gpu.init_gpu_data(instanced_pipeline)
 
     # construimos nuestra grilla para representar el "suelo" del mundo.
     grid_resolution = 100
@@ -135,13 +142,18 @@ if __name__ == "__main__":
         "grid_transform": tr.rotationX(np.pi / 2.0) @ tr.uniformScale(100),
     }
 
+    # mide cuánto toma cada parte del frame: la física, el dibujo en CPU y en GPU.
+    # con la tecla T se guarda una traza para abrir en chrome://tracing
+    profiler = FrameProfiler(gpu=True)
+
     def update_world(dt, window):
         # aquí actualizamos el mundo.
         window.program_state["total_time"] += dt
         world = window.program_state["world"]
-        world.Step(
-            dt, window.program_state["vel_iters"], window.program_state["pos_iters"]
-        )
+        with profiler.scope("physics"):
+            world.Step(
+                dt, window.program_state["vel_iters"], window.program_state["pos_iters"]
+            )
 
         # si ya se aplicaron las fuerzas, hay que eliminarlas de la simulación.
         # la única que se mantiene de manera automática es la gravedad.
@@ -149,14 +161,53 @@ if __name__ == "__main__":
 
     pyglet.clock.schedule_interval(update_world, time_step, window)
 
+    def report(dt):
+        print(profiler, {name: f"{1000 * t:.2f} ms" for name, t in profiler.scopeTimes().items()})
+        for hitch in profiler.hitches:
+            print("  frame lento", hitch["frame"], f"{1000 * hitch['duration']:.2f} ms", hitch["scopes"][0:2])
+        profiler.hitches.clear()
+
+    pyglet.clock.schedule_interval(report, 2.0)
+
+    @window.event
+    def on_key_press(symbol, modifiers):
+        if symbol == pyglet.window.key.T:
+            profiler.exportChromeTrace("hello_box2d_trace.json")
+
     @window.event
     def on_draw():
+        profiler.newFrame()
+        with profiler.scope("draw", gpu=True):
+            draw()
+
+    def draw():
         GL.glClearColor(0.5, 0.5, 0.5, 1.0)
         GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_LINE)
         GL.glLineWidth(1.0)
 
         window.clear()
 
+        bodies = window.program_state["bodies"]
+        if len(bodies) > 0:
+            # usamos el mismo modelo 3d para cada cuerpo. las transformaciones de todos
+            # los cuerpos se calculan juntas y se dibujan con una sola llamada.
+            body_state = np.array(
+                [(body.position[0], body.position[1], body.angle) for body in bodies],
+                dtype=np.float32,
+            )
+            transforms = tr.translateBatch(
+                body_state[:, 0], body_state[:, 1], 0.0
+            ) @ tr.rotationZBatch(body_state[:, 2])
+
+            instanced_pipeline.use()
+            instanced_pipeline["view"] = window.program_state["view"].reshape(
+                16, 1, order="F"
+            )
+            instanced_pipeline["projection"] = window.program_state[
+                "projection"
+            ].reshape(16, 1, order="F")
+            cube_gpu.draw_instanced(instanced_pipeline, transforms)
+
         pipeline.use()
 
         pipeline["view"] = window.program_state["view"].reshape(16, 1, order="F")
@@ -164,14 +215,6 @@ if __name__ == "__main__":
             16, 1, order="F"
         )
 
-        for body in window.program_state["bodies"]:
-            # iteramos sobre cada uno de los cuerpos. en este caso, usamos el mismo modelo 3d para cada cuerpo.
-            pipeline["transform"] = (
-                tr.translate(body.position[0], body.position[1], 0.0)
-                @ tr.rotationZ(body.angle)
-            ).reshape(16, 1, order="F")
-            cube_gpu.draw(pyglet.gl.GL_TRIANGLES)
-
         pipeline["transform"] = window.program_state["grid_transform"].reshape(
             16, 1, order="F"
         )
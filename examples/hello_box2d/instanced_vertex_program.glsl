@@ -0,0 +1,20 @@
+#version 330
+in vec3 position;
+
+// transformación de cada cuerpo, guardada por columnas
+in vec4 a_model0;
+in vec4 a_model1;
+in vec4 a_model2;
+in vec4 a_model3;
+
+uniform mat4 projection;
+uniform mat4 view;
+
+out vec3 fragColor;
+
+void main()
+{
+    mat4 transform = mat4(a_model0, a_model1, a_model2, a_model3);
+    fragColor = vec3(1.0, 1.0, 1.0);
+    gl_Position = projection * view * transform * vec4(position, 1.0f);
+}
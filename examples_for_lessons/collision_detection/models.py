@@ -10,6 +10,7 @@ from collections import deque  # to allow use of double linked lists
 
 import grafica.basic_shapes as bs
 import grafica.easy_shaders as es
+from grafica.textures import textureManager
 
 
 from grafica.assets_path import getAssetPath
@@ -55,6 +56,8 @@ class ObstacleManager:
     X_DISTANCE_BETWEEN_OBSTACLES_STD = 0.4
     FIRST_OBSTACLE_OFFSET_IN_X = 0.8
     game_state = None
+    # Pipeline used to draw obstacles, so the ones created while playing can be drawn too
+    pipeline = None
 
     def __new__(cls, game_state=None):
         """ This function makes sure we always get the same instance of ObstacleManager.
@@ -104,6 +107,8 @@ class ObstacleManager:
         if (cls.obstacles[-1].x <= cls.game_state.camera_position or 
             cls.game_state.camera_position + 0.3 >= cls.obstacles[-1].x):
             new_obstacle = Obstacle()
+            if cls.pipeline is not None:
+                new_obstacle.set_gpu_shape(cls.pipeline)
             cls._set_random_position(new_obstacle)
             cls.obstacles.append(new_obstacle)
 
@@ -123,6 +128,7 @@ class ObstacleManager:
 
     @classmethod
     def set_gpu_shapes_of_obstacles(cls, current_pipeline: MovingShader2D):
+        cls.pipeline = current_pipeline
         for obstacle in cls.obstacles:
             obstacle.set_gpu_shape(current_pipeline)
 
@@ -230,6 +236,9 @@ DESTRUCT_OFFSET_IN_X = 1.0
 
 class Obstacle(RectangleCollisionObject):
 
+    # GPU shapes shared by every obstacle: (pipeline, asset path) -> GPUShape
+    gpu_shapes = {}
+
     def __init__(
             self, 
             x=0.0,
@@ -244,13 +253,17 @@ class Obstacle(RectangleCollisionObject):
         
 
     def set_gpu_shape(self, pipeline, asset_path="bricks.jpg"):
-        """ Note that this is a method and using self. This may require more memory.
+        """ Every obstacle with the same asset path uses the same gpu_shape, so spawning
+        obstacles does not read the image or allocate GPU memory again.
         If we want to add different obstacles, the asset path should change.
-        We could save memory be ussing the same gpu_shape for every obstacle
         """
-        shape_obstacle = bs.createTextureQuadWithDims(1, 1, 0.2, 0.2)
-        self.gpu_obstacle = es.GPUShape().initBuffers()
-        pipeline.setupVAO(self.gpu_obstacle)
-        self.gpu_obstacle.fillBuffers(shape_obstacle.vertices, shape_obstacle.indices, GL_STATIC_DRAW)
-        self.gpu_obstacle.texture = es.textureSimpleSetup(
-            getAssetPath(asset_path), GL_CLAMP_TO_EDGE, GL_CLAMP_TO_EDGE, GL_NEAREST, GL_NEAREST)
+        key = (id(pipeline), asset_path)
+        if key not in Obstacle.gpu_shapes:
+            shape_obstacle = bs.createTextureQuadWithDims(1, 1, 0.2, 0.2)
+            gpu_obstacle = es.GPUShape().initBuffers()
+            pipeline.setupVAO(gpu_obstacle)
+            gpu_obstacle.fillBuffers(shape_obstacle.vertices, shape_obstacle.indices, GL_STATIC_DRAW)
+            gpu_obstacle.texture = textureManager.get(
+                getAssetPath(asset_path), GL_CLAMP_TO_EDGE, GL_CLAMP_TO_EDGE, GL_NEAREST, GL_NEAREST, flip_top_bottom=False)
+            Obstacle.gpu_shapes[key] = gpu_obstacle
+        self.gpu_obstacle = Obstacle.gpu_shapes[key]
@@ -0,0 +1,101 @@
+"""
+Compara FeedbackParticleSystem con ParticleSystem: con las mismas partículas
+emitidas, la simulación en la GPU debe coincidir con la de la CPU.
+No abre ventanas, así que funciona sin pantalla, por ejemplo con Mesa:
+
+    python check_feedback.py
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pyglet
+
+pyglet.options["headless"] = True
+# PyOpenGL debe usar el mismo contexto EGL que pyglet
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+from pyglet.graphics.shader import Shader, ShaderProgram
+
+from particle_system import FeedbackParticleSystem, ParticleSystem, drag, gravity
+
+CAPACITY = 50000
+STEPS = 300
+ACCELERATION = (0.0, -9.8, 0.0)
+DRAG = 0.1
+# diferencias por redondeo: la GPU puede agrupar las operaciones de otra forma
+TOLERANCE = 1e-3
+
+
+def emit_random(systems, rng):
+    """
+    Las mismas partículas en todos los sistemas, con tiempos de vida distintos
+    """
+    count = int(rng.integers(0, 2000))
+    position = np.zeros((count, 3), dtype=np.float32)
+    position[:, 0:2] = rng.uniform(0.0, 600.0, (count, 2))
+    velocity = rng.uniform(-50.0, 50.0, (count, 3)).astype(np.float32)
+    ttl = rng.uniform(0.5, 3.0, count).astype(np.float32)
+    color = rng.uniform(0.0, 1.0, (count, 4)).astype(np.float32)
+    for system in systems:
+        system.emit(position, velocity, ttl, color)
+
+
+def live_state(system, data):
+    return np.concatenate([data[live] for live in system.live_slices()])
+
+
+if __name__ == "__main__":
+    win = pyglet.window.Window(64, 64, visible=False)
+
+    with open(Path(os.path.dirname(__file__)) / "point_vertex_program.glsl") as f:
+        vertex_program = f.read()
+
+    with open(Path(os.path.dirname(__file__)) / "point_fragment_program.glsl") as f:
+        fragment_program = f.read()
+
+    pipeline = ShaderProgram(Shader(vertex_program, "vertex"), Shader(fragment_program, "fragment"))
+
+    cpu = ParticleSystem(CAPACITY)
+    cpu.forces = [gravity(ACCELERATION), drag(DRAG)]
+    gpu = FeedbackParticleSystem(CAPACITY, pipeline, acceleration=ACCELERATION, drag=DRAG)
+
+    rng = np.random.default_rng(0)
+    cpu_time = 0.0
+    gpu_time = 0.0
+    worst = 0.0
+    for i in range(STEPS):
+        emit_random([cpu, gpu], rng)
+        dt = float(rng.uniform(0.005, 0.03))
+
+        start = time.perf_counter()
+        cpu.step(dt)
+        cpu_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        gpu.step(dt)
+        gpu_time += time.perf_counter() - start
+
+        # el registro de vivas no depende de leer la GPU
+        assert (gpu.start, gpu.count) == (cpu.start, cpu.count), "Distinta cantidad de partículas vivas."
+
+        if i % 10 == 0 or i == STEPS - 1:
+            state = gpu.read_back()
+            for name in ("position", "velocity", "ttl", "color"):
+                expected = live_state(cpu, getattr(cpu, name))
+                obtained = live_state(gpu, state[name])
+                difference = np.abs(expected - obtained) / np.maximum(np.abs(expected), 1.0)
+                worst = max(worst, float(difference.max(initial=0.0)))
+
+    gpu.delete()
+
+    print("partículas vivas:", len(cpu))
+    print("mayor diferencia relativa:", worst)
+    print("tiempo por paso, CPU: %.2f ms, GPU: %.2f ms" % (1000 * cpu_time / STEPS, 1000 * gpu_time / STEPS))
+
+    if worst > TOLERANCE:
+        print("La simulación en la GPU no coincide con la de la CPU.")
+        sys.exit(1)
+    print("OK")
@@ -1,7 +1,5 @@
 import os
 import sys
-from collections import deque
-from itertools import chain
 from pathlib import Path
 
 import numpy as np
@@ -24,21 +22,12 @@ sys.path.append(
 
 
 import grafica.transformations as tr
+from particle_system import Emitter, FeedbackParticleSystem, ParticleGPUData, ParticleSystem
 
-
-class Particle(object):
-    def __init__(self, position, ttl):
-        self.position = np.array(position, dtype=np.float32)
-        self.ttl = ttl
-        self.velocity = np.array([0, -50, 0], dtype=np.float32)
-
-    def step(self, dt):
-        self.ttl = self.ttl - dt
-        # método de Euler
-        self.position = self.position + dt * self.velocity
-
-    def alive(self):
-        return bool(self.ttl > 0)
+# máximo de partículas vivas al mismo tiempo
+CAPACITY = 200000
+# partículas creadas cada vez que se mueve el mouse
+PARTICLES_PER_MOTION = 500
 
 
 if __name__ == "__main__":
@@ -74,14 +63,19 @@ if __name__ == "__main__":
     pipeline["view"] = view.reshape(16, 1, order="F")
     pipeline["max_ttl"] = 3
 
-    # nuestra colección de partículas.
-    # ¿por qué es una deque (cola)?
-    win.particles = deque()
-    # los datos que tendremos en la GPU. los gestionaremos con pyglet
-    win.particle_data = None
-    
-    def add_particle(x, y):
-        win.particles.append(Particle((x, y, 0.0), 3))
+    # nuestras partículas: arreglos de tamaño fijo usados como cola circular.
+    # ¿por qué las más antiguas siempre están al principio?
+    if "--gpu" in sys.argv:
+        # la simulación ocurre en la GPU, que ya tiene los datos para dibujarlas
+        win.particles = FeedbackParticleSystem(CAPACITY, pipeline, max_ttl=3)
+        win.particle_data = win.particles
+    else:
+        win.particles = ParticleSystem(CAPACITY, max_ttl=3)
+        # los datos que tendremos en la GPU, un buffer que se crea una sola vez
+        win.particle_data = ParticleGPUData(win.particles, pipeline)
+
+    # cae hacia abajo como antes, con un poco de dispersión
+    win.emitter = Emitter((0.0, 0.0, 0.0), velocity=(0.0, -50.0, 0.0), spread=20.0, ttl=3)
 
     @win.event
     def on_draw():
@@ -91,36 +85,19 @@ if __name__ == "__main__":
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
         pipeline.use()
-        if win.particle_data is not None:
-            win.particle_data.draw(pyglet.gl.GL_POINTS)
+        win.particle_data.draw(pyglet.gl.GL_POINTS)
 
     @win.event
     def on_mouse_motion(x, y, dx, dy):
-        add_particle(x, y)
+        win.emitter.position[:] = (x, y, 0.0)
+        win.emitter.emit(win.particles, PARTICLES_PER_MOTION)
 
     def update_particle_system(dt, win):
-        to_remove = 0
-        for i, p in enumerate(win.particles):
-            p.step(dt)
-
-            if not p.alive():
-                to_remove += 1
-
-        for i in range(to_remove):
-            win.particles.popleft()
-
-        if win.particle_data is not None:
-            win.particle_data.delete()
-            win.particle_data = None
-
-        if len(win.particles) > 0:
-            win.particle_data = pipeline.vertex_list(
-                len(win.particles), pyglet.gl.GL_POINTS, position="f", ttl="f"
-            )
-            win.particle_data.position[:] = tuple(
-                chain(*(p.position for p in win.particles))
-            )
-            win.particle_data.ttl[:] = tuple(p.ttl for p in win.particles)
+        # todas las partículas avanzan y mueren a la vez
+        win.particles.step(dt)
+        # una sola copia a la GPU por cuadro (con --gpu, solo las partículas nuevas)
+        win.particle_data.upload()
 
     pyglet.clock.schedule(update_particle_system, win)
     pyglet.app.run()
+    win.particle_data.delete()
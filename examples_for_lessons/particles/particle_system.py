@@ -0,0 +1,474 @@
+import ctypes
+import os
+from pathlib import Path
+
+import numpy as np
+import OpenGL.GL.shaders as shaders
+from OpenGL.GL import (
+    GL_ARRAY_BUFFER,
+    GL_DYNAMIC_COPY,
+    GL_FALSE,
+    GL_FLOAT,
+    GL_INTERLEAVED_ATTRIBS,
+    GL_LINK_STATUS,
+    GL_POINTS,
+    GL_RASTERIZER_DISCARD,
+    GL_STREAM_DRAW,
+    GL_TRANSFORM_FEEDBACK_BUFFER,
+    GL_VERTEX_SHADER,
+    glAttachShader,
+    glBeginTransformFeedback,
+    glBindBuffer,
+    glBindBufferBase,
+    glBindBufferRange,
+    glBindVertexArray,
+    glBufferData,
+    glBufferSubData,
+    glCreateProgram,
+    glDeleteBuffers,
+    glDeleteProgram,
+    glDeleteShader,
+    glDeleteVertexArrays,
+    glDisable,
+    glDrawArrays,
+    glEnable,
+    glEnableVertexAttribArray,
+    glEndTransformFeedback,
+    glGenBuffers,
+    glGenVertexArrays,
+    glGetAttribLocation,
+    glGetBufferSubData,
+    glGetProgramInfoLog,
+    glGetProgramiv,
+    glGetUniformLocation,
+    glLinkProgram,
+    glTransformFeedbackVaryings,
+    glUniform1f,
+    glUniform3f,
+    glUseProgram,
+    glVertexAttribPointer,
+)
+
+# datos de cada partícula que necesita la GPU, intercalados: 3 + 1 + 4 floats = 32 bytes
+VERTEX_DTYPE = np.dtype([("position", np.float32, 3), ("ttl", np.float32), ("color", np.float32, 4)])
+
+# estado completo de cada partícula cuando se simula en la GPU: 3 + 3 + 1 + 4 floats = 44 bytes
+STATE_DTYPE = np.dtype([
+    ("position", np.float32, 3), ("velocity", np.float32, 3), ("ttl", np.float32), ("color", np.float32, 4)])
+
+
+def setup_attributes(dtype, locations):
+    """
+    Apunta los atributos del shader (nombre -> location) a los campos de dtype,
+    intercalados en el buffer enlazado a GL_ARRAY_BUFFER.
+    Los campos que el shader no usa se ignoran.
+    """
+    for name in dtype.names:
+        location = locations.get(name, -1)
+        if location < 0:
+            continue
+        count = int(np.prod(dtype[name].shape)) or 1
+        offset = dtype.fields[name][1]
+        glEnableVertexAttribArray(location)
+        glVertexAttribPointer(location, count, GL_FLOAT, GL_FALSE, dtype.itemsize, ctypes.c_void_p(offset))
+
+
+def ring_slices(first, count, capacity):
+    """
+    Rangos de un arreglo de largo capacity ocupados por count elementos desde first,
+    volviendo al inicio del arreglo al llegar al final. Son dos si dan la vuelta.
+    """
+    end = first + count
+    if count == 0:
+        return []
+    if end <= capacity:
+        return [slice(first, end)]
+    return [slice(first, capacity), slice(0, end - capacity)]
+
+
+def gravity(acceleration):
+    """
+    Fuerza constante, por ejemplo gravity((0.0, -9.8, 0.0))
+    """
+    acceleration = np.asarray(acceleration, dtype=np.float32)
+
+    def force(position, velocity):
+        return acceleration
+
+    return force
+
+
+def drag(coefficient):
+    """
+    Roce con el aire, opuesto a la velocidad
+    """
+
+    def force(position, velocity):
+        return -coefficient * velocity
+
+    return force
+
+
+class Emitter:
+    """
+    Crea rate partículas por segundo en position, con velocidad velocity más un
+    desvío aleatorio de magnitud hasta spread en el plano XY.
+    emit() también permite crear ráfagas, por ejemplo al mover el mouse.
+    """
+
+    def __init__(self, position, velocity=(0.0, 0.0, 0.0), spread=0.0, ttl=3.0, color=(1.0, 1.0, 1.0, 1.0), rate=0.0):
+        self.position = np.array(position, dtype=np.float32)
+        self.velocity = np.array(velocity, dtype=np.float32)
+        self.spread = spread
+        self.ttl = ttl
+        self.color = np.array(color, dtype=np.float32)
+        self.rate = rate
+        # fracción de partícula que quedó pendiente en el paso anterior
+        self.pending = 0.0
+
+    def emit(self, system, count):
+        velocities = np.tile(self.velocity, (count, 1))
+        if self.spread > 0:
+            angles = np.random.uniform(0.0, 2.0 * np.pi, count)
+            speeds = self.spread * np.sqrt(np.random.uniform(0.0, 1.0, count))
+            velocities[:, 0] += speeds * np.cos(angles)
+            velocities[:, 1] += speeds * np.sin(angles)
+        system.emit(self.position, velocities, self.ttl, self.color)
+
+    def update(self, system, dt):
+        self.pending += self.rate * dt
+        count = int(self.pending)
+        self.pending -= count
+        if count > 0:
+            self.emit(system, count)
+
+
+class ParticleSystem:
+    """
+    Partículas guardadas en arreglos de numpy de capacidad fija, una fila por partícula.
+    Se usan como buffer circular: las más antiguas empiezan en start y las nuevas se
+    escriben a continuación de las count vivas, volviendo al inicio del arreglo.
+    Si no hay espacio, las nuevas reemplazan a las más antiguas.
+
+    position, ttl y color son vistas de vertex_data, que se copia tal cual a la GPU.
+    """
+
+    # campos de vertex_data, la velocidad queda aparte si no está entre ellos
+    vertex_dtype = VERTEX_DTYPE
+
+    def __init__(self, capacity, max_ttl=3.0):
+        self.capacity = capacity
+        self.max_ttl = max_ttl
+
+        self.vertex_data = np.zeros(capacity, dtype=self.vertex_dtype)
+        self.position = self.vertex_data["position"]
+        self.ttl = self.vertex_data["ttl"]
+        self.color = self.vertex_data["color"]
+        if "velocity" in self.vertex_dtype.names:
+            self.velocity = self.vertex_data["velocity"]
+        else:
+            self.velocity = np.zeros((capacity, 3), dtype=np.float32)
+
+        self.start = 0
+        self.count = 0
+
+        self.emitters = []
+        # funciones (position, velocity) -> aceleración, ver gravity y drag
+        self.forces = []
+
+    def __len__(self):
+        return self.count
+
+    def live_slices(self):
+        """
+        Rangos del arreglo con las partículas vivas, de la más antigua a la más nueva.
+        Son dos cuando las partículas dan la vuelta al final del arreglo.
+        """
+        return ring_slices(self.start, self.count, self.capacity)
+
+    def emit(self, position, velocity, ttl, color=(1.0, 1.0, 1.0, 1.0)):
+        """
+        Agrega partículas. position, velocity, ttl y color pueden ser un valor para
+        todas o un arreglo con uno por partícula; la cantidad es la de los arreglos.
+        Retorna cuántas se agregaron.
+        """
+        position = np.asarray(position, dtype=np.float32).reshape((-1, 3))
+        velocity = np.asarray(velocity, dtype=np.float32).reshape((-1, 3))
+        ttl = np.asarray(ttl, dtype=np.float32).reshape(-1)
+        color = np.asarray(color, dtype=np.float32).reshape((-1, 4))
+
+        # un valor sirve para todas, un arreglo vacío no agrega ninguna
+        lengths = {len(position), len(velocity), len(ttl), len(color)}
+        if 0 in lengths:
+            return 0
+        lengths.discard(1)
+        count = max(lengths, default=1)
+
+        # si son más que la capacidad, solo sobreviven las últimas
+        skipped = max(count - self.capacity, 0)
+        count -= skipped
+
+        def rows(values):
+            values = np.broadcast_to(values, (skipped + count,) + values.shape[1:])
+            return values[skipped:]
+
+        position, velocity, ttl, color = rows(position), rows(velocity), rows(ttl), rows(color)
+
+        # las más antiguas se pierden si no caben
+        overflow = max(self.count + count - self.capacity, 0)
+        self.start = (self.start + overflow) % self.capacity
+        self.count -= overflow
+
+        first = (self.start + self.count) % self.capacity
+        written = 0
+        # a lo más dos copias: hasta el final del arreglo y desde el inicio
+        while written < count:
+            length = min(count - written, self.capacity - first)
+            target = slice(first, first + length)
+            source = slice(written, written + length)
+            self.position[target] = position[source]
+            self.velocity[target] = velocity[source]
+            self.ttl[target] = ttl[source]
+            self.color[target] = color[source]
+            written += length
+            first = 0
+
+        self.count += count
+        return count
+
+    def step(self, dt):
+        for emitter in self.emitters:
+            emitter.update(self, dt)
+
+        for live in self.live_slices():
+            velocity = self.velocity[live]
+            for force in self.forces:
+                velocity += dt * force(self.position[live], velocity)
+
+            self.ttl[live] -= dt
+            # método de Euler
+            self.position[live] += dt * velocity
+
+        self.kill()
+
+    def kill(self):
+        """
+        Descarta las partículas más antiguas que ya murieron.
+        Con tiempos de vida distintos puede quedar alguna muerta entre las vivas:
+        no se dibuja y se descarta al llegar al principio.
+        """
+        if self.count == 0:
+            return
+
+        alive = np.concatenate([self.alive(live) for live in self.live_slices()])
+        dead = int(np.argmax(alive)) if alive.any() else self.count
+
+        self.start = (self.start + dead) % self.capacity
+        self.count -= dead
+
+    def alive(self, live):
+        return self.ttl[live] > 0
+
+
+class ParticleGPUData:
+    """
+    Buffer en la GPU con capacidad para todas las partículas del sistema, creado una
+    sola vez. Cada cuadro se actualiza con una sola copia contigua de vertex_data.
+    """
+
+    def __init__(self, system, pipeline):
+        self.system = system
+        attributes = pipeline.attributes
+
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferData(GL_ARRAY_BUFFER, system.vertex_data.nbytes, None, GL_STREAM_DRAW)
+
+        setup_attributes(system.vertex_dtype, {name: attributes[name]["location"] for name in attributes})
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def upload(self):
+        system = self.system
+        if system.count == 0:
+            return
+
+        live = system.live_slices()
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        if len(live) == 1:
+            # solo el rango de las vivas
+            data = system.vertex_data[live[0]]
+            glBufferSubData(GL_ARRAY_BUFFER, live[0].start * data.itemsize, data.nbytes, data)
+        else:
+            # dan la vuelta: se copia todo en un buffer nuevo, sin esperar a que la GPU
+            # termine de dibujar el anterior
+            data = system.vertex_data
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, mode=GL_POINTS):
+        glBindVertexArray(self.vao)
+        for live in self.system.live_slices():
+            glDrawArrays(mode, live.start, live.stop - live.start)
+        glBindVertexArray(0)
+
+    def delete(self):
+        glDeleteBuffers(1, [self.buffer])
+        glDeleteVertexArrays(1, [self.vao])
+
+
+class FeedbackParticleSystem(ParticleSystem):
+    """
+    Las mismas partículas, pero simuladas en la GPU: un vertex shader avanza cada una
+    y transform feedback guarda el resultado en un segundo buffer. Los dos buffers se
+    turnan cada paso (ping-pong), así los datos nunca vuelven a Python.
+
+    La CPU solo escribe las partículas nuevas en el buffer actual y lleva la cuenta de
+    cuáles siguen vivas con la hora en que muere cada una. Las fuerzas son fijas:
+    acceleration como gravity y drag como el roce de drag(), en ese orden.
+    La lista forces no se puede usar, step falla si tiene alguna.
+
+    Necesita un contexto de OpenGL; sirve cualquiera, incluido uno headless.
+    """
+
+    vertex_dtype = STATE_DTYPE
+
+    def __init__(self, capacity, pipeline, max_ttl=3.0, acceleration=(0.0, 0.0, 0.0), drag=0.0):
+        super().__init__(capacity, max_ttl)
+        self.acceleration = np.array(acceleration, dtype=np.float32)
+        self.drag = drag
+
+        # tiempo simulado y tiempo en que muere la partícula de cada posición
+        self.clock = 0.0
+        self.expiration = np.zeros(capacity, dtype=np.float64)
+        # partículas emitidas que aún no están en la GPU, como rango del buffer circular
+        self.pending_first = 0
+        self.pending_count = 0
+
+        with open(Path(os.path.dirname(__file__)) / "particle_update_program.glsl") as f:
+            self.update_program = self.create_update_program(f.read())
+
+        update_locations = {name: glGetAttribLocation(self.update_program, name) for name in STATE_DTYPE.names}
+        draw_locations = {name: pipeline.attributes[name]["location"] for name in pipeline.attributes}
+
+        self.buffers = []
+        self.update_vaos = []
+        self.draw_vaos = []
+        for i in range(2):
+            buffer = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, buffer)
+            glBufferData(GL_ARRAY_BUFFER, self.vertex_data.nbytes, None, GL_DYNAMIC_COPY)
+            self.buffers.append(buffer)
+
+            for vaos, locations in ((self.update_vaos, update_locations), (self.draw_vaos, draw_locations)):
+                vao = glGenVertexArrays(1)
+                glBindVertexArray(vao)
+                glBindBuffer(GL_ARRAY_BUFFER, buffer)
+                setup_attributes(STATE_DTYPE, locations)
+                glBindVertexArray(0)
+                vaos.append(vao)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        # buffer con el estado actual, el otro recibe el siguiente paso
+        self.current = 0
+
+    @staticmethod
+    def create_update_program(source):
+        # las salidas del shader se definen antes de enlazar el programa
+        shader = shaders.compileShader(source, GL_VERTEX_SHADER)
+        program = glCreateProgram()
+        glAttachShader(program, shader)
+        varyings = [b"out_position", b"out_velocity", b"out_ttl", b"out_color"]
+        names = (ctypes.c_char_p * len(varyings))(*varyings)
+        glTransformFeedbackVaryings(
+            program, len(varyings), ctypes.cast(names, ctypes.POINTER(ctypes.POINTER(ctypes.c_char))),
+            GL_INTERLEAVED_ATTRIBS)
+        glLinkProgram(program)
+        glDeleteShader(shader)
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            raise RuntimeError(glGetProgramInfoLog(program))
+        return program
+
+    def emit(self, position, velocity, ttl, color=(1.0, 1.0, 1.0, 1.0)):
+        count = super().emit(position, velocity, ttl, color)
+
+        # las nuevas son las últimas del buffer circular, se suben en el próximo paso
+        for new in ring_slices((self.start + self.count - count) % self.capacity, count, self.capacity):
+            self.expiration[new] = self.clock + self.ttl[new]
+
+        self.pending_count = min(self.pending_count + count, self.count)
+        self.pending_first = (self.start + self.count - self.pending_count) % self.capacity
+        return count
+
+    def upload(self):
+        """
+        Copia las partículas emitidas desde el último paso al buffer actual
+        """
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffers[self.current])
+        for new in ring_slices(self.pending_first, self.pending_count, self.capacity):
+            data = self.vertex_data[new]
+            glBufferSubData(GL_ARRAY_BUFFER, new.start * data.itemsize, data.nbytes, data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.pending_count = 0
+
+    def step(self, dt):
+        if self.forces:
+            raise ValueError("FeedbackParticleSystem no usa forces: definir acceleration y drag al crearlo")
+
+        for emitter in self.emitters:
+            emitter.update(self, dt)
+        self.upload()
+
+        glUseProgram(self.update_program)
+        glUniform1f(glGetUniformLocation(self.update_program, "dt"), dt)
+        glUniform3f(glGetUniformLocation(self.update_program, "acceleration"), *self.acceleration)
+        glUniform1f(glGetUniformLocation(self.update_program, "drag"), self.drag)
+
+        # solo se calcula, no se dibuja nada
+        glEnable(GL_RASTERIZER_DISCARD)
+        glBindVertexArray(self.update_vaos[self.current])
+        target = self.buffers[1 - self.current]
+        stride = STATE_DTYPE.itemsize
+        for live in self.live_slices():
+            # cada partícula queda en la misma posición del otro buffer
+            glBindBufferRange(GL_TRANSFORM_FEEDBACK_BUFFER, 0, target,
+                live.start * stride, (live.stop - live.start) * stride)
+            glBeginTransformFeedback(GL_POINTS)
+            glDrawArrays(GL_POINTS, live.start, live.stop - live.start)
+            glEndTransformFeedback()
+        glBindBufferBase(GL_TRANSFORM_FEEDBACK_BUFFER, 0, 0)
+        glBindVertexArray(0)
+        glDisable(GL_RASTERIZER_DISCARD)
+
+        self.current = 1 - self.current
+        self.clock += dt
+        self.kill()
+
+    def alive(self, live):
+        return self.expiration[live] > self.clock
+
+    def read_back(self):
+        """
+        Copia del estado en la GPU, lenta: solo para revisar la simulación
+        """
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffers[self.current])
+        data = np.empty(self.capacity, dtype=STATE_DTYPE)
+        glGetBufferSubData(GL_ARRAY_BUFFER, 0, data.nbytes, data.view(np.uint8))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return data
+
+    def draw(self, mode=GL_POINTS):
+        glBindVertexArray(self.draw_vaos[self.current])
+        for live in self.live_slices():
+            glDrawArrays(mode, live.start, live.stop - live.start)
+        glBindVertexArray(0)
+
+    def delete(self):
+        glDeleteBuffers(2, self.buffers)
+        glDeleteVertexArrays(2, self.update_vaos)
+        glDeleteVertexArrays(2, self.draw_vaos)
+        glDeleteProgram(self.update_program)
@@ -0,0 +1,29 @@
+#version 330
+// avanza cada partícula un paso de tiempo. no dibuja nada:
+// los out se guardan en otro buffer mediante transform feedback
+uniform float dt;
+uniform vec3 acceleration;
+uniform float drag;
+
+in vec3 position;
+in vec3 velocity;
+in float ttl;
+in vec4 color;
+
+out vec3 out_position;
+out vec3 out_velocity;
+out float out_ttl;
+out vec4 out_color;
+
+void main()
+{
+    // mismas fuerzas y en el mismo orden que gravity y drag en la CPU
+    vec3 new_velocity = velocity + dt * acceleration;
+    new_velocity = new_velocity + dt * (-drag * new_velocity);
+
+    // método de Euler
+    out_position = position + dt * new_velocity;
+    out_velocity = new_velocity;
+    out_ttl = ttl - dt;
+    out_color = color;
+}
\ No newline at end of file
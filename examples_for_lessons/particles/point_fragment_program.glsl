@@ -1,9 +1,10 @@
 #version 330
 
 in float alpha;
+in vec4 particleColor;
 out vec4 outColor;
 
 void main()
 {
-    outColor = vec4(1.0, 1.0, 1.0, alpha);
+    outColor = vec4(particleColor.rgb, particleColor.a * alpha);
 }
\ No newline at end of file
@@ -5,11 +5,15 @@ uniform float max_ttl;
 
 in vec3 position;
 in float ttl;
+in vec4 color;
 out float alpha;
+out vec4 particleColor;
 
 void main()
 {
-    gl_PointSize = 15.0 * (ttl / max_ttl);
-    gl_Position = projection * view * vec4(position, 1.0);
+    // las partículas muertas quedan fuera de la pantalla
+    gl_PointSize = 15.0 * max(ttl / max_ttl, 0.0);
+    gl_Position = ttl > 0.0 ? projection * view * vec4(position, 1.0) : vec4(2.0, 2.0, 2.0, 1.0);
     alpha = ttl / max_ttl;
+    particleColor = color;
 }
\ No newline at end of file
@@ -22,19 +22,104 @@ class Shape:
         return "vertices: " + str(self.vertices) + "\n"\
             "indices: " + str(self.indices)
 
-    
+
+# The same container backed by numpy arrays: vertices are stored as an (N, stride)
+# float32 array and indices as a uint32 array, so operations work on whole arrays
+# and GPUShape.fillBuffers uploads them without any conversion.
+class ArrayShape:
+    def __init__(self, vertices, indices, stride=None):
+        vertices = np.asarray(vertices, dtype=np.float32)
+        if stride is not None:
+            vertices = vertices.reshape((-1, stride))
+        assert vertices.ndim == 2, "vertices must be an (N, stride) array, or a flat one with its stride"
+        self.vertices = np.ascontiguousarray(vertices)
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint32).reshape(-1)
+
+    @staticmethod
+    def fromShape(shape, stride):
+        return ArrayShape(shape.vertices, shape.indices, stride)
+
+    def toShape(self):
+        return Shape(self.vertices.reshape(-1).tolist(), self.indices.tolist())
+
+    @property
+    def stride(self):
+        return self.vertices.shape[1]
+
+    def __str__(self):
+        return "vertices: " + str(self.vertices) + "\n"\
+            "indices: " + str(self.indices)
+
+    def copy(self):
+        return ArrayShape(self.vertices.copy(), self.indices.copy())
+
+    def applyOffset(self, offset):
+        self.vertices[:, 0:3] += np.asarray(offset, dtype=np.float32)
+        return self
+
+    def scaleVertices(self, scaleFactor):
+        self.vertices[:, 0:3] *= np.asarray(scaleFactor, dtype=np.float32)
+        return self
+
+    def transform(self, matrix, normalOffset=None):
+        """Applies a 4x4 transformation to the positions (first 3 values of each vertex).
+        If normalOffset is given, normals stored from that column are transformed
+        with the inverse transpose and normalized again."""
+
+        matrix = np.asarray(matrix, dtype=np.float32)
+        positions = self.vertices[:, 0:3]
+        positions[...] = positions @ matrix[:3, :3].T + matrix[:3, 3]
+
+        if normalOffset is not None:
+            normals = self.vertices[:, normalOffset:normalOffset + 3]
+            # (M^-T n)^T = n^T M^-1
+            normals[...] = normals @ np.linalg.inv(matrix[:3, :3])
+            normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        return self
+
+    def merge(self, *shapes):
+        return mergeShapes((self,) + shapes)
+
+
+def mergeShapes(shapes):
+    """Merges many ArrayShapes in a single concatenation, so building a large
+    composite shape takes linear time instead of growing it one shape at a time"""
+
+    shapes = list(shapes)
+    if len(shapes) == 0:
+        return ArrayShape(np.zeros((0, 0), dtype=np.float32), [])
+
+    vertexCounts = [len(shape.vertices) for shape in shapes]
+    indexCounts = [len(shape.indices) for shape in shapes]
+
+    # each shape's indices are shifted by the number of vertices before it
+    offsets = np.repeat(np.cumsum([0] + vertexCounts[:-1]), indexCounts).astype(np.uint32)
+
+    vertices = np.concatenate([shape.vertices for shape in shapes])
+    indices = np.concatenate([shape.indices for shape in shapes]) + offsets
+    return ArrayShape(vertices, indices)
 
 
 def merge(destinationShape, strideSize, sourceShape):
 
+    if isinstance(destinationShape, ArrayShape):
+        merged = mergeShapes([destinationShape, sourceShape])
+        destinationShape.vertices = merged.vertices
+        destinationShape.indices = merged.indices
+        return
+
     # current vertices are an offset for indices refering to vertices of the new shape
     offset = len(destinationShape.vertices)
     destinationShape.vertices += sourceShape.vertices
-    destinationShape.indices += [(offset/strideSize) + index for index in sourceShape.indices]
+    destinationShape.indices += [(offset//strideSize) + index for index in sourceShape.indices]
 
 
 def applyOffset(shape, stride, offset):
 
+    if isinstance(shape, ArrayShape):
+        shape.applyOffset(offset)
+        return
+
     numberOfVertices = len(shape.vertices)//stride
 
     for i in range(numberOfVertices):
@@ -46,6 +131,10 @@ def applyOffset(shape, stride, offset):
 
 def scaleVertices(shape, stride, scaleFactor):
 
+    if isinstance(shape, ArrayShape):
+        shape.scaleVertices(scaleFactor)
+        return
+
     numberOfVertices = len(shape.vertices) // stride
 
     for i in range(numberOfVertices):
@@ -270,82 +359,118 @@ def createRainbowCube():
 
     return Shape(vertices, indices)
 
-def readOFF(filename, color):
-    vertices = []
-    normals= []
-    faces = []
+def _parseOFF(filename):
+    """Parses an OFF file into vertex positions with smooth normals, (N, 6) float32,
+    and the triangle indices of its faces. Polygons are triangulated as fans."""
 
     with open(filename, 'r') as file:
-        line = file.readline().strip()
-        assert line=="OFF"
-
-        line = file.readline().strip()
-        aux = line.split(' ')
-
-        numVertices = int(aux[0])
-        numFaces = int(aux[1])
-
-        for i in range(numVertices):
-            aux = file.readline().strip().split(' ')
-            vertices += [float(coord) for coord in aux[0:]]
-        
-        vertices = np.asarray(vertices)
-        vertices = np.reshape(vertices, (numVertices, 3))
-        #print(f'Vertices shape: {vertices.shape}')
-
-        normals = np.zeros((numVertices,3), dtype=np.float32)
-        #print(f'Normals shape: {normals.shape}')
-
-        for i in range(numFaces):
-            aux = file.readline().strip().split(' ')
-            aux = [int(index) for index in aux[0:]]
-            faces += [aux[1:]]
-            
-            vecA = [vertices[aux[2]][0] - vertices[aux[1]][0], vertices[aux[2]][1] - vertices[aux[1]][1], vertices[aux[2]][2] - vertices[aux[1]][2]]
-            vecB = [vertices[aux[3]][0] - vertices[aux[2]][0], vertices[aux[3]][1] - vertices[aux[2]][1], vertices[aux[3]][2] - vertices[aux[2]][2]]
-
-            res = np.cross(vecA, vecB)
-            normals[aux[1]][0] += res[0]  
-            normals[aux[1]][1] += res[1]  
-            normals[aux[1]][2] += res[2]  
-
-            normals[aux[2]][0] += res[0]  
-            normals[aux[2]][1] += res[1]  
-            normals[aux[2]][2] += res[2]  
-
-            normals[aux[3]][0] += res[0]  
-            normals[aux[3]][1] += res[1]  
-            normals[aux[3]][2] += res[2]  
-        #print(faces)
-        norms = np.linalg.norm(normals,axis=1)
-        normals = normals/norms[:,None]
-
-        color = np.asarray(color)
-        color = np.tile(color, (numVertices, 1))
-
-        vertexData = np.concatenate((vertices, color), axis=1)
-        vertexData = np.concatenate((vertexData, normals), axis=1)
-
-        #print(vertexData.shape)
-
-        indices = []
-        vertexDataF = []
-        index = 0
-
-        for face in faces:
-            vertex = vertexData[face[0],:]
-            vertexDataF += vertex.tolist()
-            vertex = vertexData[face[1],:]
-            vertexDataF += vertex.tolist()
-            vertex = vertexData[face[2],:]
-            vertexDataF += vertex.tolist()
-            
-            indices += [index, index + 1, index + 2]
-            index += 3        
-
-
-
-        return Shape(vertexDataF, indices)
+        lines = [line.split('#')[0].strip() for line in file]
+    lines = [line for line in lines if line]
+
+    header = lines[0].split()
+    assert header[0] == "OFF"
+    if len(header) > 1:
+        counts = header[1:]
+        start = 1
+    else:
+        counts = lines[1].split()
+        start = 2
+
+    numVertices = int(counts[0])
+    numFaces = int(counts[1])
+
+    vertexLines = lines[start:start + numVertices]
+    faceLines = lines[start + numVertices:start + numVertices + numFaces]
+
+    vertices = np.fromstring(" ".join(vertexLines), dtype=np.float64, sep=" ")
+    vertices = vertices.reshape((numVertices, -1))[:, 0:3]
+
+    # Every face written with the same number of values is read in a single pass,
+    # otherwise each line is split on its own
+    faceData = np.fromstring(" ".join(faceLines), dtype=np.int64, sep=" ")
+    if numFaces > 0 and faceData.size % numFaces == 0 and np.all(faceData.reshape((numFaces, -1))[:, 0] == faceData[0]):
+        faceData = faceData.reshape((numFaces, -1))
+        faceSizes = faceData[:, 0]
+        faceIndices = faceData[:, 1:1 + faceData[0, 0]].reshape(-1)
+    else:
+        faces = [line.split() for line in faceLines]
+        faceSizes = np.array([int(face[0]) for face in faces], dtype=np.int64)
+        faceIndices = np.array([int(index) for face in faces for index in face[1:1 + int(face[0])]], dtype=np.int64)
+
+    # Fan triangulation: face (a, b, c, d, ...) -> (a, b, c), (a, c, d), ...
+    trianglesPerFace = faceSizes - 2
+    faceStarts = np.cumsum(faceSizes) - faceSizes
+    triangleFace = np.repeat(np.arange(len(faceSizes)), trianglesPerFace)
+    triangleStarts = np.repeat(np.cumsum(trianglesPerFace) - trianglesPerFace, trianglesPerFace)
+    corner = np.arange(len(triangleFace)) - triangleStarts + 1
+    base = faceStarts[triangleFace]
+    triangles = np.stack([
+        faceIndices[base],
+        faceIndices[base + corner],
+        faceIndices[base + corner + 1]], axis=1)
+
+    # Each vertex normal adds up the (area weighted) normals of its triangles
+    a = vertices[triangles[:, 0]]
+    b = vertices[triangles[:, 1]]
+    c = vertices[triangles[:, 2]]
+    faceNormals = np.cross(b - a, c - b)
+
+    normals = np.zeros((numVertices, 3), dtype=np.float64)
+    for k in range(3):
+        np.add.at(normals, triangles[:, k], faceNormals)
+    norms = np.linalg.norm(normals, axis=1)
+    normals[norms > 0] /= norms[norms > 0, None]
+
+    vertexData = np.concatenate((vertices, normals), axis=1).astype(np.float32)
+    return vertexData, triangles.reshape(-1).astype(np.uint32)
+
+
+def _offCachePaths(filename):
+    """Cache files for an OFF file, named after its modification time and size"""
+
+    stat = os.stat(filename)
+    cacheDirectory = os.path.join(os.path.dirname(os.path.abspath(filename)), "__offcache__")
+    prefix = os.path.basename(filename) + "-"
+    key = prefix + str(stat.st_mtime_ns) + "-" + str(stat.st_size)
+    return cacheDirectory, prefix, \
+        os.path.join(cacheDirectory, key + ".vertices.npy"), \
+        os.path.join(cacheDirectory, key + ".indices.npy")
+
+
+def readOFF(filename, color, cache=True):
+    """Reads an OFF file into an ArrayShape with position, color and normal per vertex.
+    With cache=True the parsed arrays are stored in a __offcache__ folder next to the
+    file and memory mapped on later loads, until the file changes."""
+
+    vertexData = None
+
+    if cache:
+        cacheDirectory, prefix, verticesPath, indicesPath = _offCachePaths(filename)
+        if os.path.exists(verticesPath) and os.path.exists(indicesPath):
+            vertexData = np.load(verticesPath, mmap_mode='r')
+            indices = np.load(indicesPath, mmap_mode='r')
+
+    if vertexData is None:
+        vertexData, indices = _parseOFF(filename)
+
+        if cache:
+            try:
+                os.makedirs(cacheDirectory, exist_ok=True)
+                # entries of older versions of the file are no longer useful
+                for entry in os.listdir(cacheDirectory):
+                    if entry.startswith(prefix):
+                        os.remove(os.path.join(cacheDirectory, entry))
+                np.save(verticesPath, vertexData)
+                np.save(indicesPath, indices)
+            except OSError:
+                # the cache is optional, e.g. for read-only asset folders
+                pass
+
+    numVertices = len(vertexData)
+    colors = np.tile(np.asarray(color, dtype=np.float32), (numVertices, 1))
+
+    vertices = np.concatenate((vertexData[:, 0:3], colors, vertexData[:, 3:6]), axis=1)
+    return ArrayShape(vertices, indices)
 
 def createColorCubeTarea2(r,g,b):
 
@@ -0,0 +1,147 @@
+# coding=utf-8
+"""Rigid circles moving in a 2D box, colliding elastically among them and against the borders"""
+
+import numpy as np
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# Key of the cell (i, j) of the grid: i * CELL_ROW + j
+CELL_ROW = 1 << 21
+
+
+class CircleSimulation:
+    """
+    Positions, velocities and radii of all the circles are stored as (N, 2) and (N,) arrays,
+    so every step works on all of them at once.
+
+    Circles of the same mass are assumed: a collision swaps the velocity components of
+    both circles along the line joining their centers.
+    """
+
+    def __init__(self, positions, velocities, radii, bounds=(-1.0, 1.0, -1.0, 1.0)):
+        self.positions = np.array(positions, dtype=np.float64).reshape((-1, 2))
+        self.velocities = np.array(velocities, dtype=np.float64).reshape((-1, 2))
+        self.radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(self.positions),)).copy()
+        # left, right, bottom, top
+        self.bounds = bounds
+        self.collisions = 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def step(self, deltaTime, acceleration=(0.0, 0.0), circleCollisions=True):
+        # Euler integration
+        self.velocities += deltaTime * np.asarray(acceleration, dtype=np.float64)
+        self.positions += self.velocities * deltaTime
+
+        self.collideWithBorders()
+
+        if circleCollisions:
+            first, second = self.contactPairs()
+            self.collide(first, second)
+
+    def collideWithBorders(self):
+        """
+        Circles going out of the box bounce back
+        """
+        left, right, bottom, top = self.bounds
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        vx, vy = self.velocities[:, 0], self.velocities[:, 1]
+
+        vx[:] = np.where(x + self.radii > right, -np.abs(vx), vx)
+        vx[:] = np.where(x < left + self.radii, np.abs(vx), vx)
+        vy[:] = np.where(y > top - self.radii, -np.abs(vy), vy)
+        vy[:] = np.where(y < bottom + self.radii, np.abs(vy), vy)
+
+    def contactPairs(self):
+        """
+        Pairs (first[k], second[k]) of overlapping circles, with first[k] < second[k],
+        sorted by first and then by second.
+
+        A uniform grid with cells as large as the biggest circle is used:
+        only circles in neighbour cells are compared.
+        """
+        count = len(self.positions)
+        if count < 2:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        cellSize = 2.0 * self.radii.max()
+        cells = np.floor(self.positions / cellSize).astype(np.int64)
+        keys = cells[:, 0] * CELL_ROW + cells[:, 1]
+
+        # Circles sorted by cell, and the occupied cells with their range in that order.
+        # The search works with positions in that order, as circles close in space are close in memory
+        order = np.argsort(keys, kind='stable')
+        cellKeys, cellStarts, cellOf, cellSizes = np.unique(keys[order], return_index=True, return_inverse=True, return_counts=True)
+        sortedPositions = self.positions[order]
+        sortedRadii = self.radii[order]
+
+        first = []
+        second = []
+        # Half of the neighbourhood, so each pair of cells is visited once
+        for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+            neighbourKeys = cellKeys + dx * CELL_ROW + dy
+            neighbour = np.minimum(np.searchsorted(cellKeys, neighbourKeys), len(cellKeys) - 1)
+            found = cellKeys[neighbour] == neighbourKeys
+
+            # range of the circles in the neighbour cell of each circle
+            starts = np.where(found, cellStarts[neighbour], 0)[cellOf]
+            sizes = np.where(found, cellSizes[neighbour], 0)[cellOf]
+
+            owners = np.repeat(np.arange(count), sizes)
+            others = np.arange(sizes.sum()) + np.repeat(starts - (np.cumsum(sizes) - sizes), sizes)
+
+            if dx == 0 and dy == 0:
+                keep = owners < others
+                owners, others = owners[keep], others[keep]
+
+            difference = sortedPositions[others] - sortedPositions[owners]
+            distance2 = np.einsum('ij,ij->i', difference, difference)
+            touching = distance2 < (sortedRadii[owners] + sortedRadii[others]) ** 2
+            first.append(order[owners[touching]])
+            second.append(order[others[touching]])
+
+        first = np.concatenate(first)
+        second = np.concatenate(second)
+        first, second = np.minimum(first, second), np.maximum(first, second)
+
+        pairOrder = np.lexsort((second, first))
+        return first[pairOrder], second[pairOrder]
+
+    def collide(self, first, second):
+        """
+        Elastic collisions for the given pairs, with the same result as solving them one
+        after the other. Each round solves at once the pairs that do not share a circle
+        with any previous pending pair.
+        """
+        self.collisions = len(first)
+
+        while len(first) > 0:
+            # Position of the first pending pair that uses each circle
+            circles = np.stack((first, second), axis=1).reshape(-1)
+            used, firstIndex = np.unique(circles, return_index=True)
+            firstUse = np.empty(len(self.positions), dtype=np.int64)
+            firstUse[used] = firstIndex // 2
+
+            pairIndices = np.arange(len(first))
+            ready = (firstUse[first] == pairIndices) & (firstUse[second] == pairIndices)
+
+            self._swapNormalVelocities(first[ready], second[ready])
+            first, second = first[~ready], second[~ready]
+
+    def _swapNormalVelocities(self, first, second):
+        normal = self.positions[second] - self.positions[first]
+        normal /= np.linalg.norm(normal, axis=1)[:, None]
+
+        velocity1 = self.velocities[first]
+        velocity2 = self.velocities[second]
+        v1n = np.einsum('ij,ij->i', velocity1, normal)
+        v2n = np.einsum('ij,ij->i', velocity2, normal)
+
+        # Circles already moving apart are left alone
+        separating = (v2n > 0.0) & (v1n < 0.0)
+        change = np.where(separating, 0.0, v2n - v1n)[:, None] * normal
+
+        self.velocities[first] = velocity1 + change
+        self.velocities[second] = velocity2 - change
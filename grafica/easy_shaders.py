@@ -3,11 +3,15 @@
 
 from OpenGL.GL import *
 import OpenGL.GL.shaders
+import grafica.vertex_format as vf
+from grafica.uniforms import getUniforms
+from grafica.program_cache import getProgram
 import numpy as np
 from PIL import Image
 
 import grafica.basic_shapes as bs
 from grafica.gpu_shape import GPUShape
+from grafica.textures import texture_2D_setup
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -17,39 +21,17 @@ __license__ = "MIT"
 SIZE_IN_BYTES = 4
 
 
-def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode):
+def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode, mipmaps=False):
      # wrapMode: GL_REPEAT, GL_CLAMP_TO_EDGE
      # filterMode: GL_LINEAR, GL_NEAREST
-    texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
-    
-    # texture wrapping params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, sWrapMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, tWrapMode)
-
-    # texture filtering params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilterMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, maxFilterMode)
-    
-    image = Image.open(imgName)
-    img_data = np.array(image, np.uint8)
-
-    if image.mode == "RGB":
-        internalFormat = GL_RGB
-        format = GL_RGB
-    elif image.mode == "RGBA":
-        internalFormat = GL_RGBA
-        format = GL_RGBA
-    else:
-        print("Image mode not supported.")
-        raise Exception()
-
-    glTexImage2D(GL_TEXTURE_2D, 0, internalFormat, image.size[0], image.size[1], 0, format, GL_UNSIGNED_BYTE, img_data)
-
-    return texture
+     # Every call creates a new texture, use grafica.textures.textureManager to share them
+    return texture_2D_setup(Image.open(imgName), sWrapMode, tWrapMode, minFilterMode, maxFilterMode,
+        flip_top_bottom=False, mipmaps=mipmaps)
 
 
 class SimpleShaderProgram:
+    # 3d vertices + rgb color => 3*4 + 3*4 = 24 bytes
+    vertexFormat = vf.POSITION_COLOR
 
     def __init__(self):
 
@@ -78,33 +60,13 @@ class SimpleShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.uniforms = getUniforms(self.shaderProgram)
 
 
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color specification => 3*4 + 3*4 = 24 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "color")
-        glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -112,13 +74,15 @@ class SimpleShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleTextureShaderProgram:
+    # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS
 
     def __init__(self):
 
@@ -152,32 +116,12 @@ class SimpleTextureShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
-
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.uniforms = getUniforms(self.shaderProgram)
 
-    def setupVAO(self, gpuShape):
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        texCoords = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(texCoords, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(texCoords)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -186,13 +130,15 @@ class SimpleTextureShaderProgram:
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
         
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleTransformShaderProgram:
+    # 3d vertices + rgb color => 3*4 + 3*4 = 24 bytes
+    vertexFormat = vf.POSITION_COLOR
 
     def __init__(self):
 
@@ -225,46 +171,91 @@ class SimpleTransformShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
-    def setupVAO(self, gpuShape):
-        glBindVertexArray(gpuShape.vao)
 
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
+    def drawCall(self, gpuShape, mode=GL_TRIANGLES):
+        assert isinstance(gpuShape, GPUShape)
 
-        # 3d vertices + rgb color specification => 3*4 + 3*4 = 24 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
+        # Binding the VAO and executing the draw call
+        glBindVertexArray(gpuShape.vao)
+        gpuShape.drawElements(mode)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
-        glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        # Unbinding current vao
+        # Unbind the current VAO
         glBindVertexArray(0)
 
 
+class SimpleInstancedTransformShaderProgram:
+    # 3d vertices + rgb color => 3*4 + 3*4 = 24 bytes
+    vertexFormat = vf.POSITION_COLOR
+    # 2d offset + scale + rgb color added to the shape's => 2*4 + 4 + 3*4 = 24 bytes per instance
+    instanceFormat = vf.VertexFormat(("offset", 2), ("scale", 1), ("instanceColor", 3))
+
+    def __init__(self):
+
+        vertex_shader = """
+            #version 330
+            
+            uniform mat4 transform;
+
+            in vec3 position;
+            in vec3 color;
+
+            in vec2 offset;
+            in float scale;
+            in vec3 instanceColor;
+
+            out vec3 newColor;
+
+            void main()
+            {
+                vec3 instancePosition = vec3(scale * position.xy + offset, position.z);
+                gl_Position = transform * vec4(instancePosition, 1.0f);
+                newColor = color + instanceColor;
+            }
+            """
+
+        fragment_shader = """
+            #version 330
+            in vec3 newColor;
+
+            out vec4 outColor;
+
+            void main()
+            {
+                outColor = vec4(newColor, 1.0f);
+            }
+            """
+
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
+
+        self.uniforms = getUniforms(self.shaderProgram)
+
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
+        self.instanceFormat.setupInstances(self.shaderProgram, gpuShape)
+
+
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
         assert isinstance(gpuShape, GPUShape)
 
-        # Binding the VAO and executing the draw call
+        # Binding the VAO and executing the draw call,
+        # gpuShape.instances copies of the shape
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
         
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleTextureTransformShaderProgram:
+    # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS
 
     def __init__(self):
 
@@ -300,35 +291,13 @@ class SimpleTextureTransformShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
-
-
-        # Compiling our shader program
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
-
-
-    def setupVAO(self, gpuShape):
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
-        glBindVertexArray(gpuShape.vao)
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
-        # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        texCoords = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(texCoords, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(3 * SIZE_IN_BYTES))
-        glEnableVertexAttribArray(texCoords)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -336,13 +305,15 @@ class SimpleTextureTransformShaderProgram:
 
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleModelViewProjectionShaderProgram:
+    # 3d vertices + rgb color => 3*4 + 3*4 = 24 bytes
+    vertexFormat = vf.POSITION_COLOR
 
     def __init__(self):
 
@@ -375,34 +346,13 @@ class SimpleModelViewProjectionShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
-
-
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
-
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        # 3d vertices + rgb color specification => 3*4 + 3*4 = 24 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "color")
-        glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
 
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -410,13 +360,15 @@ class SimpleModelViewProjectionShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleTextureModelViewProjectionShaderProgram:
+    # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS
 
     def __init__(self):
 
@@ -454,34 +406,13 @@ class SimpleTextureModelViewProjectionShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
-
-
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
-
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
-    def setupVAO(self, gpuShape):
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
-        # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        texCoords = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(texCoords, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(texCoords)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -490,7 +421,7 @@ class SimpleTextureModelViewProjectionShaderProgram:
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
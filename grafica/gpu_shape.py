@@ -4,6 +4,7 @@
 #import OpenGL.GL as ogl
 from OpenGL.GL import *
 import numpy as np
+import grafica.vertex_format as vf
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -21,6 +22,24 @@ class GPUShape:
         self.ebo = None
         self.texture = None
         self.size = None
+        # GL_UNSIGNED_INT or GL_UNSIGNED_SHORT, as stored by fillBuffers
+        self.indexType = GL_UNSIGNED_INT
+
+        # Preallocated storage, see allocateBuffers
+        self.usage = None
+        self.vertexCapacity = 0
+        self.indexCapacity = 0
+        self.stride = None
+        self.segments = 1
+        self.segment = 0
+        # Vertex added to every index when drawing, selects the ring buffer segment
+        self.baseVertex = 0
+
+        # Per instance attributes, see VertexFormat.setupInstances and updateInstances.
+        # With instances set, drawElements draws that many copies of the shape
+        self.instanceVbo = None
+        self.instanceStride = None
+        self.instances = None
 
     def initBuffers(self):
         """Convenience function for initialization of OpenGL buffers.
@@ -43,16 +62,123 @@ class GPUShape:
 
     def fillBuffers(self, vertices, indices, usage):
 
-        vertexData = np.array(vertices, dtype=np.float32)
-        indices = np.array(indices, dtype=np.uint32)
+        # Arrays already stored as contiguous float32/uint32 (e.g. an ArrayShape)
+        # are uploaded as they are, lists are converted.
+        # Structured arrays (see VertexFormat.pack) and uint16 indices are kept as well.
+        if isinstance(vertices, np.ndarray) and vertices.dtype.fields is not None:
+            vertexData = np.ascontiguousarray(vertices)
+        else:
+            vertexData = np.ascontiguousarray(vertices, dtype=np.float32)
 
-        self.size = len(indices)
+        if isinstance(indices, np.ndarray) and indices.dtype == np.uint16:
+            indices = np.ascontiguousarray(indices)
+            self.indexType = GL_UNSIGNED_SHORT
+        else:
+            indices = np.ascontiguousarray(indices, dtype=np.uint32)
+            self.indexType = GL_UNSIGNED_INT
+
+        self.size = indices.size
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertexData.nbytes, vertexData, usage)
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, usage)
+
+    def allocateBuffers(self, numVertices, stride, numIndices, usage=GL_DYNAMIC_DRAW, segments=1):
+        """Reserves GPU memory for numVertices vertices of stride floats and numIndices
+        indices, without data. They are filled later with updateVertices/updateIndices
+        or streamVertices, which never reallocate.
+
+        With segments > 1 the vertex buffer holds that many copies of the vertices, used
+        in turn by streamVertices: while a frame writes one segment the GPU may still be
+        reading the ones written by the previous frames.
+        """
+
+        self.usage = usage
+        self.vertexCapacity = numVertices * stride
+        self.indexCapacity = numIndices
+        self.stride = stride
+        self.segments = segments
+        self.segment = 0
+        self.baseVertex = 0
+        self.size = 0
+        self.indexType = GL_UNSIGNED_INT
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.vertexCapacity * segments * SIZE_IN_BYTES, None, usage)
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indexCapacity * SIZE_IN_BYTES, None, usage)
+
+    def updateVertices(self, vertices, offset=0, orphan=False):
+        """Copies vertices into the buffer starting at the float number offset,
+        transferring only those bytes.
+
+        orphan=True first asks the driver for fresh storage, so it does not wait for
+        draw calls still using the old contents. The rest of the buffer is then
+        undefined, so use it when rewriting all the vertices.
+        """
+
+        if isinstance(vertices, np.ndarray) and vertices.dtype.fields is not None:
+            # Packed vertices, their strides are multiples of 4 bytes
+            vertexData = np.ascontiguousarray(vertices).view(np.float32)
+        else:
+            vertexData = np.ascontiguousarray(vertices, dtype=np.float32)
+        assert offset + vertexData.size <= self.vertexCapacity * self.segments, "Vertices exceed the allocated capacity."
 
         glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferData(GL_ARRAY_BUFFER, len(vertexData) * SIZE_IN_BYTES, vertexData, usage)
+        if orphan:
+            glBufferData(GL_ARRAY_BUFFER, self.vertexCapacity * self.segments * SIZE_IN_BYTES, None, self.usage)
+        glBufferSubData(GL_ARRAY_BUFFER, offset * SIZE_IN_BYTES, vertexData.nbytes, vertexData)
+
+    def updateIndices(self, indices, offset=0, orphan=False):
+        """Copies indices into the buffer starting at the index number offset.
+        The shape then draws the first offset + len(indices) indices."""
+
+        indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        assert offset + indices.size <= self.indexCapacity, "Indices exceed the allocated capacity."
 
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, len(indices) * SIZE_IN_BYTES, indices, usage)
+        if orphan:
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indexCapacity * SIZE_IN_BYTES, None, self.usage)
+        glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, offset * SIZE_IN_BYTES, indices.nbytes, indices)
+
+        self.size = offset + indices.size
+
+    def streamVertices(self, vertices):
+        """Writes this frame's vertices into the next segment of the ring buffer and
+        draws from it. Indices keep referring to vertices from 0, baseVertex shifts them."""
+
+        self.segment = (self.segment + 1) % self.segments
+        offset = self.segment * self.vertexCapacity
+        self.updateVertices(vertices, offset, orphan=(self.segments == 1))
+        self.baseVertex = offset // self.stride
+
+    def updateInstances(self, instanceData, usage=GL_STREAM_DRAW):
+        """Replaces the per instance attributes, one row (or packed record) per instance.
+        The old storage is orphaned, so draw calls still reading it do not stall the upload."""
+
+        if isinstance(instanceData, np.ndarray) and instanceData.dtype.fields is not None:
+            instanceData = np.ascontiguousarray(instanceData)
+        else:
+            instanceData = np.ascontiguousarray(instanceData, dtype=np.float32)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceVbo)
+        glBufferData(GL_ARRAY_BUFFER, instanceData.nbytes, None, usage)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, instanceData.nbytes, instanceData)
+
+        self.instances = instanceData.nbytes // self.instanceStride
+
+    def drawElements(self, mode=GL_TRIANGLES):
+        """Draw call for the bound VAO of this shape"""
+
+        if self.instances is not None:
+            glDrawElementsInstanced(mode, self.size, self.indexType, None, self.instances)
+        elif self.baseVertex == 0:
+            glDrawElements(mode, self.size, self.indexType, None)
+        else:
+            glDrawElementsBaseVertex(mode, self.size, self.indexType, None, self.baseVertex)
 
     def clear(self):
         """Freeing GPU memory"""
@@ -66,18 +192,29 @@ class GPUShape:
         if self.vbo != None:
             glDeleteBuffers(1, [self.vbo])
 
+        if self.instanceVbo != None:
+            glDeleteBuffers(1, [self.instanceVbo])
+
         if self.vao != None:
             glDeleteVertexArrays(1, [self.vao])
 
 
-def createGPUShape(pipeline, shape):
+def createGPUShape(pipeline, shape, vertexFormat=None):
     """Shortcut for the typical way to create a GPUShape.
     Please consider that GL_STATIC_DRAW is not always the best way to draw.
     You should also know what setupVAO and fillBuffers do in a low level,
     in case you want to implement something new, like two textures,
     bump mapping, alternative ways to represent of vertices, etc.
+
+    With a vertexFormat (see grafica.vertex_format), the vertices are packed
+    into it and the indices use 16 bits when possible, e.g.
+    createGPUShape(pipeline, shape, vf.COMPACT_POSITION_COLOR_NORMAL)
     """
     gpuShape = GPUShape().initBuffers()
-    pipeline.setupVAO(gpuShape)
-    gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+    if vertexFormat is None:
+        pipeline.setupVAO(gpuShape)
+        gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+    else:
+        pipeline.setupVAO(gpuShape, vertexFormat)
+        gpuShape.fillBuffers(vertexFormat.pack(shape.vertices), vf.packIndices(shape.indices), GL_STATIC_DRAW)
     return gpuShape
@@ -3,6 +3,9 @@
 
 from OpenGL.GL import *
 import OpenGL.GL.shaders
+import grafica.vertex_format as vf
+from grafica.uniforms import getUniforms
+from grafica.program_cache import getProgram
 from grafica.gpu_shape import GPUShape
 
 import sys
@@ -11,6 +14,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from grafica.assets_path import getAssetPath
 
 class SimpleFlatShaderProgram():
+    # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
+    vertexFormat = vf.POSITION_COLOR_NORMAL
 
     def __init__(self):
 
@@ -84,38 +89,13 @@ class SimpleFlatShaderProgram():
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "color")
-        glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -123,13 +103,15 @@ class SimpleFlatShaderProgram():
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleTextureFlatShaderProgram():
+    # 3d vertices + 2d texture coordinates + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS_NORMAL
 
     def __init__(self):
 
@@ -210,38 +192,13 @@ class SimpleTextureFlatShaderProgram():
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -251,13 +208,15 @@ class SimpleTextureFlatShaderProgram():
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleGouraudShaderProgram():
+    # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
+    vertexFormat = vf.POSITION_COLOR_NORMAL
 
     def __init__(self):
 
@@ -331,38 +290,13 @@ class SimpleGouraudShaderProgram():
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "color")
-        glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -370,13 +304,15 @@ class SimpleGouraudShaderProgram():
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleTextureGouraudShaderProgram():
+    # 3d vertices + 2d texture coordinates + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS_NORMAL
 
     def __init__(self):
 
@@ -457,38 +393,13 @@ class SimpleTextureGouraudShaderProgram():
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -498,13 +409,15 @@ class SimpleTextureGouraudShaderProgram():
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimplePhongShaderProgram:
+    # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
+    vertexFormat = vf.POSITION_COLOR_NORMAL
 
     def __init__(self):
         vertex_shader = """
@@ -584,38 +497,13 @@ class SimplePhongShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "color")
-        glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -623,13 +511,15 @@ class SimplePhongShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
 class SimpleTexturePhongShaderProgram:
+    # 3d vertices + 2d texture coordinates + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS_NORMAL
 
     def __init__(self):
         vertex_shader = """
@@ -713,38 +603,13 @@ class SimpleTexturePhongShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -754,13 +619,15 @@ class SimpleTexturePhongShaderProgram:
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 #TAREA4: Se crea este nuevo shader para usar múltiples luces con texturas
 class MultipleLightTexturePhongShaderProgram:
+    # 3d vertices + 2d texture coordinates + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS_NORMAL
 
     def __init__(self):
         #TAREA4: Ahora los shaders están en archivos de texto independientes, se leen aquí
@@ -770,38 +637,13 @@ class MultipleLightTexturePhongShaderProgram:
         with open(getAssetPath('multiple_lights_textures.fs'), 'r') as f:
             fragment_shader = f.readlines()
         
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -811,13 +653,15 @@ class MultipleLightTexturePhongShaderProgram:
         glBindVertexArray(gpuShape.vao)
         glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
 
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
 
 #TAREA4: Se crea este shader para soportar geometría con color y múltiples luces
 class MultipleLightPhongShaderProgram:
+    # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
+    vertexFormat = vf.POSITION_COLOR_NORMAL
 
     def __init__(self):
         #TAREA4: Ahora los shaders están en archivos de texto independientes, aquí los leemos
@@ -827,38 +671,13 @@ class MultipleLightPhongShaderProgram:
         with open(getAssetPath('multiple_lights_color.fs'), 'r') as f:
             fragment_shader = f.readlines()
         
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
 
-
-    def setupVAO(self, gpuShape):
-
-        glBindVertexArray(gpuShape.vao)
-
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
-
-        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
-        
-        color = glGetAttribLocation(self.shaderProgram, "color")
-        glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(color)
-
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
-        glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
-        glEnableVertexAttribArray(normal)
-
-        # Unbinding current vao
-        glBindVertexArray(0)
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
 
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
@@ -866,7 +685,7 @@ class MultipleLightPhongShaderProgram:
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+        gpuShape.drawElements(mode)
 
         # Unbind the current VAO
         glBindVertexArray(0)
\ No newline at end of file
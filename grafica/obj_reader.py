@@ -0,0 +1,249 @@
+# coding=utf-8
+"""Reading Wavefront OBJ files into indexed, array based geometry"""
+
+import numpy as np
+import grafica.basic_shapes as bs
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# The file is read in chunks of this many characters
+CHUNK_SIZE = 1 << 20
+
+
+class OBJData:
+    """Geometry read from an OBJ file. Each vertex is a unique (position, texture
+    coordinate, normal) combination, shared by all the triangles using it.
+    groups holds (material, first index, number of indices) for each usemtl block."""
+
+    def __init__(self, positions, texCoords, normals, indices, groups):
+        self.positions = positions
+        self.texCoords = texCoords
+        self.normals = normals
+        self.indices = indices
+        self.groups = groups
+
+    def __str__(self):
+        return "OBJData(vertices: " + str(len(self.positions)) +\
+            ", triangles: " + str(len(self.indices) // 3) +\
+            ", groups: " + str([group[0] for group in self.groups]) + ")"
+
+    def computeNormals(self):
+        """Smooth vertex normals, accumulated from the normals of the triangles"""
+
+        triangles = self.indices.reshape((-1, 3))
+        a = self.positions[triangles[:, 0]]
+        b = self.positions[triangles[:, 1]]
+        c = self.positions[triangles[:, 2]]
+        faceNormals = np.cross(b - a, c - b)
+
+        normals = np.zeros(self.positions.shape, dtype=np.float32)
+        for k in range(3):
+            np.add.at(normals, triangles[:, k], faceNormals)
+        norms = np.linalg.norm(normals, axis=1)
+        normals[norms > 0] /= norms[norms > 0, None]
+        return normals
+
+    def toShape(self, color=None, texCoords=False, normals=True):
+        """ArrayShape with positions, and then the optional color, texture coordinates and normals"""
+
+        columns = [self.positions]
+
+        if color is not None:
+            columns += [np.tile(np.asarray(color, dtype=np.float32), (len(self.positions), 1))]
+
+        if texCoords:
+            assert self.texCoords is not None, "The file does not define texture coordinates."
+            columns += [self.texCoords]
+
+        if normals:
+            columns += [self.normals if self.normals is not None else self.computeNormals()]
+
+        return bs.ArrayShape(np.concatenate(columns, axis=1), self.indices)
+
+
+def _parseRows(rows, width):
+    """Converts the text of v/vt/vn records into a (len(rows), width) array"""
+
+    if len(rows) == 0:
+        return np.zeros((0, width), dtype=np.float32)
+
+    values = np.fromstring(" ".join(rows), dtype=np.float32, sep=" ")
+    rowWidth = len(rows[0].split())
+    if rowWidth >= width and values.size == rowWidth * len(rows):
+        return values.reshape((len(rows), rowWidth))[:, 0:width]
+
+    # records with different number of values, e.g. some vertices with colors
+    return np.array([row.split()[0:width] for row in rows], dtype=np.float32)
+
+
+def _parseCorners(corners):
+    """Converts face corners as 'v', 'v/vt', 'v//vn' or 'v/vt/vn' into an (N, 3)
+    array of 1-based indices, where 0 stands for an undefined index"""
+
+    slashes = corners[0].count("/")
+    width = slashes + 1
+    # all corners must have the same format, else the values of one may shift into the next
+    sameFormat = all(corner.count("/") == slashes for corner in corners)
+    if sameFormat:
+        joined = "/".join(corners).replace("//", "/0/")
+        values = np.fromstring(joined, dtype=np.int64, sep="/")
+
+    if not sameFormat or values.size != width * len(corners):
+        # corners written in different formats
+        values = np.array([
+            [int(index) if index else 0 for index in (corner.split("/") + ["", ""])[0:3]]
+            for corner in corners], dtype=np.int64)
+        return values
+
+    values = values.reshape((len(corners), width))
+    if width < 3:
+        values = np.concatenate((values, np.zeros((len(corners), 3 - width), dtype=np.int64)), axis=1)
+    return values
+
+
+class _OBJParser:
+    def __init__(self):
+        self.positions = []
+        self.texCoords = []
+        self.normals = []
+        self.corners = []
+        self.faceSizes = []
+        self.numPositions = 0
+        self.numTexCoords = 0
+        self.numNormals = 0
+        self.numFaces = 0
+        # (material, first face)
+        self.materials = [(None, 0)]
+
+    def parseLines(self, lines):
+        positions = []
+        texCoords = []
+        normals = []
+        corners = []
+        faceSizes = []
+        # element counts when each face was defined, to solve negative indices
+        faceCounts = []
+
+        for line in lines:
+            if line.startswith("v "):
+                positions.append(line[2:])
+            elif line.startswith("vt "):
+                texCoords.append(line[3:])
+            elif line.startswith("vn "):
+                normals.append(line[3:])
+            elif line.startswith("f "):
+                faceCorners = line.split()[1:]
+                corners.extend(faceCorners)
+                faceSizes.append(len(faceCorners))
+                faceCounts.append((
+                    self.numPositions + len(positions),
+                    self.numTexCoords + len(texCoords),
+                    self.numNormals + len(normals)))
+            elif line.startswith("usemtl "):
+                self.materials.append((line[7:].strip(), self.numFaces + len(faceSizes)))
+
+        self.positions.append(_parseRows(positions, 3))
+        self.texCoords.append(_parseRows(texCoords, 2))
+        self.normals.append(_parseRows(normals, 3))
+        self.numPositions += len(positions)
+        self.numTexCoords += len(texCoords)
+        self.numNormals += len(normals)
+
+        if len(corners) == 0:
+            return
+
+        faceSizes = np.array(faceSizes, dtype=np.int64)
+        cornerIndices = _parseCorners(corners)
+
+        # OBJ indices start at 1, negative ones count backwards from the last element defined
+        negative = cornerIndices < 0
+        if negative.any():
+            cornerCounts = np.repeat(np.array(faceCounts, dtype=np.int64), faceSizes, axis=0)
+            cornerIndices[negative] += cornerCounts[negative] + 1
+
+        self.corners.append(cornerIndices)
+        self.faceSizes.append(faceSizes)
+        self.numFaces += len(faceSizes)
+
+    def result(self):
+        positions = np.concatenate(self.positions)
+        texCoords = np.concatenate(self.texCoords)
+        normals = np.concatenate(self.normals)
+
+        if self.numFaces == 0:
+            return OBJData(positions, None, None, np.zeros(0, dtype=np.uint32), [])
+
+        corners = np.concatenate(self.corners)
+        faceSizes = np.concatenate(self.faceSizes)
+
+        # Fan triangulation: face (a, b, c, d, ...) -> (a, b, c), (a, c, d), ...
+        trianglesPerFace = faceSizes - 2
+        faceStarts = np.cumsum(faceSizes) - faceSizes
+        triangleFace = np.repeat(np.arange(len(faceSizes)), trianglesPerFace)
+        triangleStarts = np.repeat(np.cumsum(trianglesPerFace) - trianglesPerFace, trianglesPerFace)
+        corner = np.arange(len(triangleFace)) - triangleStarts + 1
+        base = faceStarts[triangleFace]
+        triangleCorners = np.stack([
+            corners[base],
+            corners[base + corner],
+            corners[base + corner + 1]], axis=1).reshape((-1, 3))
+
+        # Each (position, texture coordinate, normal) combination becomes one vertex,
+        # numbered in order of first appearance
+        keys = (triangleCorners[:, 0] * (len(texCoords) + 1) + triangleCorners[:, 1]) * (len(normals) + 1) + triangleCorners[:, 2]
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        indices = rank[inverse.reshape(-1)].astype(np.uint32)
+        uniqueCorners = triangleCorners[first[order]]
+
+        vertexPositions = positions[uniqueCorners[:, 0] - 1]
+        vertexTexCoords = texCoords[uniqueCorners[:, 1] - 1] if np.all(uniqueCorners[:, 1] > 0) else None
+        vertexNormals = normals[uniqueCorners[:, 2] - 1] if np.all(uniqueCorners[:, 2] > 0) else None
+
+        # usemtl blocks as ranges of indices, consecutive blocks with the same material are joined
+        triangleOffsets = np.concatenate(([0], np.cumsum(trianglesPerFace)))
+        groups = []
+        for k, (material, firstFace) in enumerate(self.materials):
+            lastFace = self.materials[k + 1][1] if k + 1 < len(self.materials) else self.numFaces
+            start = int(triangleOffsets[firstFace]) * 3
+            count = int(triangleOffsets[lastFace]) * 3 - start
+            if count == 0:
+                continue
+            if len(groups) > 0 and groups[-1][0] == material:
+                groups[-1] = (material, groups[-1][1], groups[-1][2] + count)
+            else:
+                groups.append((material, start, count))
+
+        return OBJData(vertexPositions, vertexTexCoords, vertexNormals, indices, groups)
+
+
+def loadOBJ(filename, chunkSize=CHUNK_SIZE):
+    """Reads an OBJ file in chunks, returning its deduplicated and indexed geometry as OBJData"""
+
+    parser = _OBJParser()
+    pending = ""
+
+    with open(filename, 'r') as file:
+        while True:
+            chunk = file.read(chunkSize)
+            if not chunk:
+                break
+
+            # the last line of the chunk may continue in the next one
+            lines = (pending + chunk).split("\n")
+            pending = lines.pop()
+            parser.parseLines(lines)
+
+    if pending:
+        parser.parseLines([pending])
+
+    return parser.result()
+
+
+def readOBJ(filename, color):
+    """ArrayShape with position, color and normal per vertex, to draw with lighting shaders"""
+
+    return loadOBJ(filename).toShape(color)
@@ -1,5 +1,13 @@
 # coding=utf-8
-"""Simple class to monitor the frames per second of an application"""
+"""Simple class to monitor the frames per second of an application,
+and a frame profiler with CPU and GPU scopes"""
+
+import time
+import json
+import ctypes
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -54,4 +62,218 @@ class PerformanceMonitor:
         return self.milisecondsPerFrame
 
     def __str__(self):
-        return f" [{self.framesPerSecond:.2f} fps - {self.milisecondsPerFrame:.2f} ms]"
\ No newline at end of file
+        return f" [{self.framesPerSecond:.2f} fps - {self.milisecondsPerFrame:.2f} ms]"
+
+
+class FrameProfiler:
+    """
+    Measures how long each frame and each named part of it takes.
+
+    profiler = FrameProfiler(gpu=True)
+    # once per frame
+    profiler.newFrame()
+    with profiler.scope("update"):
+        with profiler.scope("physics"):
+            world.Step(...)
+    with profiler.scope("draw", gpu=True):
+        ...
+
+    Scopes can be nested, CPU times are measured with time.perf_counter.
+    gpu=True also measures the GPU time of the scope with a GL_TIME_ELAPSED query,
+    read some frames later when its result is available, so it never stalls the
+    application. GPU scopes can not be nested.
+    """
+
+    def __init__(self, window=300, gpu=False, maxQueries=64, hitchFactor=2.0, hitchMinimum=1.0/30, traceFrames=600):
+        """
+        window: number of frames used by the statistics.
+        A hitch is a frame longer than hitchFactor times the median frame time and than hitchMinimum seconds.
+        traceFrames: number of frames exported to a Chrome trace.
+        """
+        self.gpu = gpu
+        self.maxQueries = maxQueries
+        self.hitchFactor = hitchFactor
+        self.hitchMinimum = hitchMinimum
+
+        self.frameIndex = -1
+        self.frameStart = None
+        self.frame = None
+        self.stack = []
+
+        # (frame index, duration) of the last frames
+        self.frameTimes = deque(maxlen=window)
+        # Every frame: index, start, duration, cpu and gpu scopes
+        self.frames = deque(maxlen=traceFrames)
+        self.hitches = deque(maxlen=100)
+
+        self.freeQueries = []
+        self.numQueries = 0
+        # (query, frame, name, start) waiting for their results
+        self.pendingQueries = deque()
+        self.activeQuery = None
+        self.droppedQueries = 0
+
+    def newFrame(self):
+        """
+        It must be called once per frame, it closes the previous frame
+        """
+        now = time.perf_counter()
+
+        if self.frame is not None:
+            self.frame["duration"] = now - self.frameStart
+            self.frameTimes.append(self.frame["duration"])
+            self._checkHitch(self.frame)
+
+        if self.gpu:
+            self._readQueries()
+
+        self.frameIndex += 1
+        self.frameStart = now
+        self.frame = {"index": self.frameIndex, "start": now, "duration": None, "cpu": [], "gpu": []}
+        self.frames.append(self.frame)
+
+    @contextmanager
+    def scope(self, name, gpu=False):
+        """
+        Measures the code inside the with block as a part of the current frame
+        """
+        if self.frame is None:
+            self.newFrame()
+
+        frame = self.frame
+        gpu = gpu and self.gpu and self._beginQuery(frame, name)
+        self.stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            frame["cpu"].append((name, len(self.stack) - 1, start, end - start))
+            self.stack.pop()
+            if gpu:
+                self._endQuery()
+
+    def _beginQuery(self, frame, name):
+        from OpenGL.GL import glGenQueries, glBeginQuery, GL_TIME_ELAPSED
+
+        assert self.activeQuery is None, "GPU scopes can not be nested."
+
+        if len(self.freeQueries) > 0:
+            query = self.freeQueries.pop()
+        elif self.numQueries < self.maxQueries:
+            query = int(glGenQueries(1)[0])
+            self.numQueries += 1
+        else:
+            # The GPU is too far behind, this measure is skipped
+            self.droppedQueries += 1
+            return False
+
+        glBeginQuery(GL_TIME_ELAPSED, query)
+        self.activeQuery = (query, frame, name, time.perf_counter())
+        return True
+
+    def _endQuery(self):
+        from OpenGL.GL import glEndQuery, GL_TIME_ELAPSED
+
+        glEndQuery(GL_TIME_ELAPSED)
+        self.pendingQueries.append(self.activeQuery)
+        self.activeQuery = None
+
+    def _readQueries(self):
+        from OpenGL.GL import glGetQueryObjectiv, GL_QUERY_RESULT_AVAILABLE, GL_QUERY_RESULT
+        # The wrapped glGetQueryObjectui64v can not convert its 64 bits result
+        from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v
+        nanoseconds = ctypes.c_uint64(0)
+
+        # Results become available in the same order the queries were issued
+        while len(self.pendingQueries) > 0:
+            query, frame, name, start = self.pendingQueries[0]
+            if not glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE):
+                break
+            self.pendingQueries.popleft()
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(nanoseconds))
+            frame["gpu"].append((name, start, nanoseconds.value * 1e-9))
+            self.freeQueries.append(query)
+
+    def _checkHitch(self, frame):
+        if len(self.frameTimes) < 10:
+            return
+
+        median = np.median(self.frameTimes)
+        if frame["duration"] > max(self.hitchFactor * median, self.hitchMinimum):
+            self.hitches.append({
+                "frame": frame["index"],
+                "duration": frame["duration"],
+                "median": median,
+                # the slowest scopes explain the hitch
+                "scopes": sorted(((name, duration) for name, _, _, duration in frame["cpu"]), key=lambda scope: -scope[1])[0:5]
+            })
+
+    def percentiles(self, percentiles=(50, 95, 99)):
+        """
+        Frame times in seconds at the given percentiles, over the last frames
+        """
+        if len(self.frameTimes) == 0:
+            return [0.0 for _ in percentiles]
+        return list(np.percentile(self.frameTimes, percentiles))
+
+    def scopeTimes(self, gpu=False):
+        """
+        Mean time in seconds per frame of each scope, over the frames in the trace
+        """
+        totals = {}
+        frames = [frame for frame in self.frames if frame["duration"] is not None]
+        for frame in frames:
+            for event in frame["gpu" if gpu else "cpu"]:
+                totals[event[0]] = totals.get(event[0], 0.0) + event[-1]
+        return {name: total / max(len(frames), 1) for name, total in totals.items()}
+
+    def stats(self):
+        p50, p95, p99 = self.percentiles()
+        return {
+            "frames": len(self.frameTimes),
+            "mean": float(np.mean(self.frameTimes)) if len(self.frameTimes) > 0 else 0.0,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "max": max(self.frameTimes) if len(self.frameTimes) > 0 else 0.0,
+            "hitches": len(self.hitches),
+            "cpu": self.scopeTimes(),
+            "gpu": self.scopeTimes(gpu=True)
+        }
+
+    def exportChromeTrace(self, filename):
+        """
+        Writes the frames in the trace as Chrome trace JSON, to open in chrome://tracing or Perfetto.
+        GPU times are drawn in their own row, starting when the CPU issued them.
+        """
+        if len(self.frames) == 0:
+            return
+
+        origin = self.frames[0]["start"]
+        microseconds = lambda seconds: seconds * 1e6
+
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 0, "tid": 0, "args": {"name": "CPU"}},
+            {"name": "thread_name", "ph": "M", "pid": 0, "tid": 1, "args": {"name": "GPU"}}
+        ]
+        for frame in self.frames:
+            if frame["duration"] is not None:
+                events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0,
+                    "ts": microseconds(frame["start"] - origin), "dur": microseconds(frame["duration"]),
+                    "args": {"frame": frame["index"]}})
+            for name, depth, start, duration in frame["cpu"]:
+                events.append({"name": name, "ph": "X", "pid": 0, "tid": 0,
+                    "ts": microseconds(start - origin), "dur": microseconds(duration),
+                    "args": {"frame": frame["index"], "depth": depth}})
+            for name, start, duration in frame["gpu"]:
+                events.append({"name": name, "ph": "X", "pid": 0, "tid": 1,
+                    "ts": microseconds(start - origin), "dur": microseconds(duration),
+                    "args": {"frame": frame["index"]}})
+
+        with open(filename, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def __str__(self):
+        p50, p95, p99 = self.percentiles()
+        return f" [p50 {1000 * p50:.2f} ms - p95 {1000 * p95:.2f} ms - p99 {1000 * p99:.2f} ms - {len(self.hitches)} hitches]"
@@ -0,0 +1,164 @@
+# coding=utf-8
+"""Shader programs compiled once per process, and optionally stored on disk as program binaries"""
+
+from OpenGL.GL import *
+import OpenGL.GL.shaders
+from OpenGL import contextdata
+import numpy as np
+import hashlib
+import os
+import grafica.uniforms as uniforms
+import grafica.vertex_format as vf
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# Linked programs by (OpenGL context, hash of their sources).
+# Program names are only valid in the context that created them
+_programs = {}
+
+# Directory for program binaries, None to always compile.
+# Binaries only work with the same driver and GPU, any failure to load one compiles again
+binaryCacheDir = None
+
+
+def enableBinaryCache(directory):
+    """Stores linked programs in directory and loads them from there in later runs"""
+
+    global binaryCacheDir
+    os.makedirs(directory, exist_ok=True)
+    binaryCacheDir = directory
+
+
+def _source(source):
+    # Sources read with readlines come as a list of lines
+    return source if isinstance(source, str) else "".join(source)
+
+
+def sourceHash(vertexSource, fragmentSource):
+    return hashlib.sha1((_source(vertexSource) + "\0" + _source(fragmentSource)).encode()).hexdigest()
+
+
+def _binariesSupported():
+    try:
+        return bool(glProgramBinary) and glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+    except Exception:
+        return False
+
+
+def _binaryPath(key):
+    renderer = glGetString(GL_RENDERER) + glGetString(GL_VERSION)
+    # A new driver or GPU gets different files
+    driver = hashlib.sha1(renderer).hexdigest()[0:8]
+    return os.path.join(binaryCacheDir, key + "-" + driver + ".bin")
+
+
+def _loadBinary(path):
+    if not os.path.exists(path):
+        return None
+
+    data = np.fromfile(path, dtype=np.uint8)
+    binaryFormat = int(data[0:4].view(np.uint32)[0])
+    binary = np.ascontiguousarray(data[4:])
+
+    program = glCreateProgram()
+    try:
+        glProgramBinary(program, binaryFormat, binary, binary.size)
+        if glGetProgramiv(program, GL_LINK_STATUS) == GL_TRUE:
+            return program
+    except GLError:
+        pass
+
+    glDeleteProgram(program)
+    return None
+
+
+def _saveBinary(program, path):
+    try:
+        length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+        if length <= 0:
+            return
+        binary = np.zeros(length, dtype=np.uint8)
+        binaryFormat = GLenum(0)
+        glGetProgramBinary(program, length, None, binaryFormat, binary)
+    except GLError:
+        return
+
+    header = np.array([binaryFormat.value], dtype=np.uint32).view(np.uint8)
+    temporary = path + ".tmp"
+    np.concatenate((header, binary)).tofile(temporary)
+    os.replace(temporary, path)
+
+
+def _compile(vertexSource, fragmentSource, retrievable):
+    vertexShader = OpenGL.GL.shaders.compileShader(vertexSource, GL_VERTEX_SHADER)
+    fragmentShader = OpenGL.GL.shaders.compileShader(fragmentSource, GL_FRAGMENT_SHADER)
+
+    program = glCreateProgram()
+    glAttachShader(program, vertexShader)
+    glAttachShader(program, fragmentShader)
+    if retrievable:
+        glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    glLinkProgram(program)
+
+    if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE:
+        log = glGetProgramInfoLog(program)
+        glDeleteProgram(program)
+        raise RuntimeError("Link failure: " + str(log))
+
+    # Validation needs a bound vertex array object, a temporary one is used
+    previousVAO = glGetIntegerv(GL_VERTEX_ARRAY_BINDING)
+    vao = glGenVertexArrays(1)
+    glBindVertexArray(vao)
+    glValidateProgram(program)
+    valid = glGetProgramiv(program, GL_VALIDATE_STATUS)
+    glBindVertexArray(previousVAO)
+    glDeleteVertexArrays(1, [vao])
+
+    if valid != GL_TRUE:
+        log = glGetProgramInfoLog(program)
+        glDeleteProgram(program)
+        raise RuntimeError("Validation failure: " + str(log))
+
+    # The linked program keeps what it needs from the shaders
+    for shader in (vertexShader, fragmentShader):
+        glDetachShader(program, shader)
+        glDeleteShader(shader)
+
+    return program
+
+
+def getProgram(vertexSource, fragmentSource):
+    """Linked program for the sources, compiled only the first time they are requested
+    in the current context. Pipelines with the same shaders share it."""
+
+    sources = sourceHash(vertexSource, fragmentSource)
+    key = (contextdata.getContext(), sources)
+    program = _programs.get(key)
+    if program is not None:
+        return program
+
+    useBinaries = binaryCacheDir is not None and _binariesSupported()
+    if useBinaries:
+        path = _binaryPath(sources)
+        program = _loadBinary(path)
+
+    if program is None:
+        program = _compile(vertexSource, fragmentSource, useBinaries)
+        if useBinaries:
+            _saveBinary(program, path)
+
+    _programs[key] = program
+    return program
+
+
+def clear():
+    """Deletes every program of the current context, e.g. before destroying it"""
+
+    context = contextdata.getContext()
+    for key in [key for key in _programs if key[0] == context]:
+        program = _programs.pop(key)
+        glDeleteProgram(program)
+        # A new program may get the same name
+        uniforms.forgetProgram(program)
+        vf.forgetProgram(program)
@@ -6,6 +6,7 @@ import OpenGL.GL.shaders
 import numpy as np
 import grafica.transformations as tr
 import grafica.gpu_shape as gs
+from grafica.uniforms import getUniformLocation
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -95,7 +96,7 @@ def drawSceneGraphNode(node, pipeline, transformName, parentTransform=tr.identit
     # Hence, it can be drawn with drawCall
     if len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape):
         leaf = node.childs[0]
-        glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, transformName), 1, GL_TRUE, newTransform)
+        glUniformMatrix4fv(getUniformLocation(pipeline.shaderProgram, transformName), 1, GL_TRUE, newTransform)
         pipeline.drawCall(leaf)
 
     # If the child node is not a leaf, it MUST be a SceneGraphNode,
@@ -6,6 +6,9 @@ Font: IBM text mode 8x8
 
 from OpenGL.GL import *
 import OpenGL.GL.shaders
+import grafica.vertex_format as vf
+from grafica.uniforms import getUniforms
+from grafica.program_cache import getProgram
 import numpy as np
 import grafica.basic_shapes as bs
 import grafica.easy_shaders as es
@@ -23,21 +26,17 @@ def generateTextBitsTexture():
 
     assert f88.font8x8_basic.shape == (128,8)
 
-    bits = np.zeros(shape=(8,8,128), dtype=np.uint8)
-    
-    for k in range(128):
-        for i in range(8):
-            row = f88.font8x8_basic[k, i]
-            bits[0, i, k] = toBit(row, 1)
-            bits[1, i, k] = toBit(row, 2)
-            bits[2, i, k] = toBit(row, 4)
-            bits[3, i, k] = toBit(row, 8)
-            bits[4, i, k] = toBit(row, 16)
-            bits[5, i, k] = toBit(row, 32)
-            bits[6, i, k] = toBit(row, 64)
-            bits[7, i, k] = toBit(row, 128)
+    # bits[b, i, k]: bit b (the column, least significant first) of the row i of character k
+    bits = np.unpackbits(f88.font8x8_basic[:, :, None], axis=2, bitorder='little')
+    return np.ascontiguousarray(bits.transpose((2, 1, 0)))
 
-    return bits
+
+def generateFontAtlas():
+    """2D image with the 128 characters side by side, 8 rows of 128*8 texels.
+    Texel (8*k + column, row) belongs to character k."""
+
+    bits = generateTextBitsTexture()
+    return np.ascontiguousarray(bits.transpose((1, 2, 0)).reshape((8, 128 * 8)))
 
 
 def toOpenGLTexture(textBitsTexture):
@@ -64,6 +63,23 @@ def toOpenGLTexture(textBitsTexture):
     return texture
 
 
+def toOpenGLAtlasTexture(fontAtlas):
+
+    assert fontAtlas.shape == (8, 128 * 8)
+
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_R8, 128 * 8, 8, 0, GL_RED, GL_UNSIGNED_BYTE, fontAtlas)
+
+    return texture
+
+
 def getCharacterShape(char):
 
     # Getting the unicode code of the character as int
@@ -91,20 +107,26 @@ def getCharacterShape(char):
 
 def textToShape(text, charWidth, charHeight):
 
-    shape = bs.Shape([],[])
+    # Same quads as getCharacterShape, one per character, built for the whole string at once
+    n = len(text)
+    codes = np.fromiter((ord(char) for char in text), dtype=np.float32, count=n)
+
+    vertices = np.zeros((n, 4, 6), dtype=np.float32)
+    vertices[:, :, 0] = (np.arange(n, dtype=np.float32)[:, None] + [0, 1, 1, 0]) * charWidth
+    vertices[:, :, 1] = np.array([0, 0, 1, 1], dtype=np.float32) * charHeight
+    vertices[:, :, 3] = codes[:, None]
+    vertices[:, :, 4] = [8, 8, 0, 0]
+    vertices[:, :, 5] = [0, 8, 8, 0]
 
-    for i in range(len(text)):
-        char = text[i]
-        charShape = getCharacterShape(char)
-        bs.applyOffset(charShape, 6, [i, 0, 0])
-        bs.scaleVertices(charShape, 6, [charWidth, charHeight, 1])
-        bs.merge(shape, 6, charShape)
+    indices = np.arange(n, dtype=np.uint32)[:, None] * 4 + np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32)
 
-    return shape
+    return bs.ArrayShape(vertices.reshape((-1, 6)), indices)
 
 
 
 class TextureTextRendererShaderProgram:
+    # 3d vertices + 3d texture coordinates => 3*4 + 3*4 = 24 bytes
+    vertexFormat = vf.POSITION_TEXCOORDS3
 
     def __init__(self):
 
@@ -151,44 +173,230 @@ class TextureTextRendererShaderProgram:
             }
             """
 
-        # Binding artificial vertex array object for validation
-        VAO = glGenVertexArrays(1)
-        glBindVertexArray(VAO)
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
 
+        self.uniforms = getUniforms(self.shaderProgram)
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
 
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
 
-    def setupVAO(self, gpuShape):
-        glBindVertexArray(gpuShape.vao)
 
-        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
+    def drawCall(self, gpuShape, mode=GL_TRIANGLES):
+        assert isinstance(gpuShape, es.GPUShape)
 
-        # 3d vertices + 3d texture coordinates => 3*4 + 3*4 = 24 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
-        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(position)
+        # Binding the VAO and executing the draw call
+        glBindVertexArray(gpuShape.vao)
+        glBindTexture(GL_TEXTURE_3D, gpuShape.texture)
+        gpuShape.drawElements(mode)
         
-        texCoords = glGetAttribLocation(self.shaderProgram, "texCoords")
-        glVertexAttribPointer(texCoords, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(texCoords)
-
-        # Unbinding current vao
+        # Unbind the current VAO
         glBindVertexArray(0)
 
 
+
+
+# Position, (character, row, column) as in getCharacterShape and colors of each corner of a character
+TEXT_VERTEX_FORMAT = vf.VertexFormat(
+    ("position", 3),
+    ("texCoords", 3, np.uint8),
+    ("fontColor", 4, np.uint8, True),
+    ("backColor", 4, np.uint8, True))
+
+
+class TextureTextAtlasShaderProgram:
+    # 3d vertices + 3 bytes for the character texel + rgba font and back colors => 3*4 + 4 + 4 + 4 = 24 bytes
+    vertexFormat = TEXT_VERTEX_FORMAT
+
+    def __init__(self):
+
+        vertex_shader = """
+            #version 330
+
+            uniform mat4 transform;
+
+            in vec3 position;
+            in vec3 texCoords;
+            in vec4 fontColor;
+            in vec4 backColor;
+
+            out vec3 outTexCoords;
+            flat out vec4 outFontColor;
+            flat out vec4 outBackColor;
+
+            void main()
+            {
+                gl_Position = transform * vec4(position, 1.0f);
+                outTexCoords = texCoords;
+                outFontColor = fontColor;
+                outBackColor = backColor;
+            }
+            """
+
+        fragment_shader = """
+            #version 330
+
+            in vec3 outTexCoords;
+            flat in vec4 outFontColor;
+            flat in vec4 outBackColor;
+
+            out vec4 outColor;
+
+            uniform sampler2D samplerTex;
+
+            void main()
+            {
+                // Character k is stored in the columns 8*k to 8*k + 7 of the atlas
+                ivec3 texel = ivec3(outTexCoords);
+                vec4 data = texelFetch(samplerTex, ivec2(8 * texel.x + texel.z, texel.y), 0);
+                if (data.r != 0)
+                {
+                    outColor = outFontColor;
+                }
+                else
+                {
+                    outColor = outBackColor;
+                }
+            }
+            """
+
+        self.shaderProgram = getProgram(vertex_shader, fragment_shader)
+
+        self.uniforms = getUniforms(self.shaderProgram)
+
+
+    def setupVAO(self, gpuShape, vertexFormat=None):
+        (vertexFormat or self.vertexFormat).setupVAO(self.shaderProgram, gpuShape)
+
+
     def drawCall(self, gpuShape, mode=GL_TRIANGLES):
         assert isinstance(gpuShape, es.GPUShape)
 
         # Binding the VAO and executing the draw call
         glBindVertexArray(gpuShape.vao)
-        glBindTexture(GL_TEXTURE_3D, gpuShape.texture)
-        glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
-        
+        glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
+        gpuShape.drawElements(mode)
+
         # Unbind the current VAO
         glBindVertexArray(0)
 
 
+class TextField:
+    def __init__(self, start, length, x, y, charWidth, charHeight, fontColor, backColor):
+        """Place of a TextBuffer reserved for a text of up to length characters"""
+
+        self.start = start
+        self.length = length
+        self.x = x
+        self.y = y
+        self.charWidth = charWidth
+        self.charHeight = charHeight
+        self.fontColor = fontColor
+        self.backColor = backColor
+        self.text = ""
+
+
+class TextBuffer:
+    """Characters of many texts stored in a single GPUShape, drawn with a single draw call.
+
+    Each text is a TextField added with addField. setText compares the new text
+    with the current one and sends to the GPU only the vertices of the characters
+    that changed, so counters updated every frame do not rebuild their geometry.
+
+    hud = TextBuffer(TextureTextAtlasShaderProgram(), 64)
+    fps = hud.addField(-0.9, 0.9, 0.05, 0.05, 10)
+    ...
+    hud.setText(fps, "FPS " + str(int(fps)))
+    hud.draw(tr.identity())
+    """
+
+    def __init__(self, pipeline, capacity, fontTexture=None):
+        self.pipeline = pipeline
+        self.capacity = capacity
+        self.fields = []
+        self.used = 0
+
+        # -1 marks a character without text, drawn as an empty quad
+        self.codes = np.full(capacity, -1, dtype=np.int32)
+        self.vertices = np.zeros(capacity * 4, dtype=pipeline.vertexFormat.dtype)
+
+        if fontTexture is None:
+            fontTexture = toOpenGLAtlasTexture(generateFontAtlas())
+
+        self.gpuShape = es.GPUShape().initBuffers()
+        pipeline.setupVAO(self.gpuShape)
+        self.gpuShape.allocateBuffers(capacity * 4, pipeline.vertexFormat.stride // 4, capacity * 6)
+        self.gpuShape.texture = fontTexture
+
+        # The two triangles of each character never change
+        indices = np.arange(capacity, dtype=np.uint32)[:, None] * 4 + np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32)
+        self.gpuShape.updateIndices(indices)
+        self.gpuShape.updateVertices(self.vertices)
+        self.gpuShape.size = 0
+
+    def addField(self, x, y, charWidth, charHeight, length, fontColor=(1, 1, 1, 1), backColor=(0, 0, 0, 0)):
+        assert self.used + length <= self.capacity, "The text buffer is full."
+
+        field = TextField(self.used, length, x, y, charWidth, charHeight, fontColor, backColor)
+        self.fields.append(field)
+        self.used += length
+        self.gpuShape.size = self.used * 6
+        return field
+
+    def setText(self, field, text):
+        """Writes text in the field, longer texts are cut"""
+
+        text = text[0:field.length]
+        if text == field.text:
+            return
+        field.text = text
+
+        codes = np.full(field.length, -1, dtype=np.int32)
+        codes[0:len(text)] = np.fromiter((ord(char) for char in text), dtype=np.int32, count=len(text))
+        codes[codes > 127] = ord("?")
+
+        current = self.codes[field.start:field.start + field.length]
+        changed = np.nonzero(codes != current)[0]
+        if changed.size == 0:
+            return
+
+        # One upload covering every changed character
+        first, last = changed[0], changed[-1] + 1
+        current[first:last] = codes[first:last]
+        self._writeCharacters(field, first, last)
+
+    def setColors(self, field, fontColor, backColor):
+        field.fontColor = fontColor
+        field.backColor = backColor
+        self._writeCharacters(field, 0, field.length)
+
+    def _writeCharacters(self, field, first, last):
+        # Same quads as textToShape, for the characters first to last of the field
+        codes = self.codes[field.start + first:field.start + last]
+        count = last - first
+        column = np.arange(first, last, dtype=np.float32)[:, None]
+        empty = (codes < 0)[:, None]
+
+        vertices = np.zeros((count, 4, 14), dtype=np.float32)
+        vertices[:, :, 0] = field.x + np.where(empty, column, column + [0, 1, 1, 0]) * field.charWidth
+        vertices[:, :, 1] = field.y + np.where(empty, 0, [0, 0, 1, 1]) * field.charHeight
+        vertices[:, :, 3] = np.maximum(codes, 0)[:, None]
+        vertices[:, :, 4] = [8, 8, 0, 0]
+        vertices[:, :, 5] = [0, 8, 8, 0]
+        vertices[:, :, 6:10] = field.fontColor
+        vertices[:, :, 10:14] = field.backColor
+
+        vertexFormat = self.pipeline.vertexFormat
+        packed = vertexFormat.pack(vertices)
+        self.vertices[(field.start + first) * 4:(field.start + last) * 4] = packed
+        self.gpuShape.updateVertices(packed, (field.start + first) * 4 * vertexFormat.stride // 4)
+
+    def draw(self, transform):
+        """Draws every field. It sets the program in use."""
+
+        glUseProgram(self.pipeline.shaderProgram)
+        self.pipeline.uniforms["transform"] = transform
+        self.pipeline.drawCall(self.gpuShape)
+
+    def clear(self):
+        self.gpuShape.clear()
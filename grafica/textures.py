@@ -15,7 +15,10 @@ from OpenGL.GL import (
     GL_LINEAR,
     GL_NEAREST,
     GL_REPEAT,
+    glGenerateMipmap,
+    glDeleteTextures,
 )
+import os
 
 from PIL import Image
 import numpy as np
@@ -29,10 +32,12 @@ def texture_2D_setup(
     tWrapMode=GL_CLAMP_TO_EDGE,
     minFilterMode=GL_LINEAR,
     maxFilterMode=GL_LINEAR,
-    flip_top_bottom=True
+    flip_top_bottom=True,
+    mipmaps=False
 ):
     # wrapMode: GL_REPEAT, GL_CLAMP_TO_EDGE
     # filterMode: GL_LINEAR, GL_NEAREST
+    # with mipmaps=True use a *_MIPMAP_* minFilterMode, e.g. GL_LINEAR_MIPMAP_LINEAR
     texture = glGenTextures(1)
     glBindTexture(GL_TEXTURE_2D, texture)
 
@@ -70,4 +75,128 @@ def texture_2D_setup(
         img_data,
     )
 
+    if mipmaps:
+        glGenerateMipmap(GL_TEXTURE_2D)
+
     return texture
+
+
+class TextureManager:
+    """Creates each texture once per (path, sampler parameters) and returns the same
+    GL texture on later requests. Textures belong to the manager: release them with
+    clear() instead of deleting them from the shapes that use them."""
+
+    def __init__(self):
+        self.textures = {}
+
+    def get(
+        self,
+        path,
+        sWrapMode=GL_CLAMP_TO_EDGE,
+        tWrapMode=GL_CLAMP_TO_EDGE,
+        minFilterMode=GL_LINEAR,
+        maxFilterMode=GL_LINEAR,
+        flip_top_bottom=True,
+        mipmaps=False
+    ):
+        key = (os.path.abspath(path), sWrapMode, tWrapMode, minFilterMode, maxFilterMode, flip_top_bottom, mipmaps)
+        if key not in self.textures:
+            self.textures[key] = texture_2D_setup(
+                Image.open(path), sWrapMode, tWrapMode, minFilterMode, maxFilterMode, flip_top_bottom, mipmaps)
+        return self.textures[key]
+
+    def clear(self):
+        if len(self.textures) > 0:
+            glDeleteTextures(len(self.textures), list(self.textures.values()))
+        self.textures = {}
+
+
+# Shared manager for code that does not need its own
+textureManager = TextureManager()
+
+
+class TextureAtlas:
+    """Packs many small images into a single texture, so sprites sharing it can be
+    drawn without changing the bound texture.
+
+    Images are added with add(name, image_or_path) and uploaded together by build().
+    uvRect(name) gives (u0, v0, u1, v1), the region of the atlas holding that image,
+    and remapUVs(name, uvs) moves texture coordinates meant for the image alone into
+    that region. Each image is padded repeating its border to avoid bleeding when filtering."""
+
+    def __init__(self, maxWidth=2048, padding=1):
+        self.maxWidth = maxWidth
+        self.padding = padding
+        self.images = {}
+        self.rects = {}
+        self.size = None
+        self.texture = None
+        self.flip_top_bottom = True
+
+    def add(self, name, image):
+        if not isinstance(image, Image.Image):
+            image = Image.open(image)
+        self.images[name] = np.array(image.convert("RGBA"), np.uint8)
+
+    def pack(self):
+        """Shelf packing: images sorted by height are placed left to right in rows"""
+
+        padding = self.padding
+        order = sorted(self.images, key=lambda name: self.images[name].shape[0], reverse=True)
+
+        width = max([self.images[name].shape[1] + 2 * padding for name in order] + [1])
+        width = max(width, min(self.maxWidth, int(np.ceil(np.sqrt(
+            sum((image.shape[0] + 2 * padding) * (image.shape[1] + 2 * padding) for image in self.images.values()))))))
+
+        x, y, shelfHeight = 0, 0, 0
+        self.rects = {}
+        for name in order:
+            height, imageWidth = self.images[name].shape[0:2]
+            if x + imageWidth + 2 * padding > width:
+                x, y, shelfHeight = 0, y + shelfHeight, 0
+            self.rects[name] = (x + padding, y + padding, imageWidth, height)
+            x += imageWidth + 2 * padding
+            shelfHeight = max(shelfHeight, height + 2 * padding)
+
+        self.size = (width, y + shelfHeight)
+
+    def build(
+        self,
+        minFilterMode=GL_LINEAR,
+        maxFilterMode=GL_LINEAR,
+        flip_top_bottom=True,
+        mipmaps=False
+    ):
+        """Packs the images, uploads the atlas and returns its GL texture"""
+
+        self.pack()
+        width, height = self.size
+        padding = self.padding
+        data = np.zeros((height, width, 4), np.uint8)
+        for name, (x, y, w, h) in self.rects.items():
+            data[y - padding:y + h + padding, x - padding:x + w + padding] = \
+                np.pad(self.images[name], ((padding, padding), (padding, padding), (0, 0)), mode="edge")
+
+        self.flip_top_bottom = flip_top_bottom
+        self.texture = texture_2D_setup(
+            Image.fromarray(data, "RGBA"), GL_CLAMP_TO_EDGE, GL_CLAMP_TO_EDGE,
+            minFilterMode, maxFilterMode, flip_top_bottom, mipmaps)
+        return self.texture
+
+    def uvRect(self, name):
+        x, y, w, h = self.rects[name]
+        width, height = self.size
+        u0, u1 = x / width, (x + w) / width
+        if self.flip_top_bottom:
+            # v grows upwards, from the last row of the image
+            v0, v1 = 1 - (y + h) / height, 1 - y / height
+        else:
+            v0, v1 = y / height, (y + h) / height
+        return (u0, v0, u1, v1)
+
+    def remapUVs(self, name, uvs):
+        """Maps (N, 2) texture coordinates in [0, 1] of an image to its region in the atlas"""
+
+        u0, v0, u1, v1 = self.uvRect(name)
+        uvs = np.asarray(uvs, dtype=np.float32)
+        return uvs * np.array([u1 - u0, v1 - v0], dtype=np.float32) + np.array([u0, v0], dtype=np.float32)
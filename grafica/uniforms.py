@@ -0,0 +1,154 @@
+# coding=utf-8
+"""Cached uniform locations and typed uniform setters for shader programs"""
+
+from OpenGL.GL import *
+from OpenGL import contextdata
+import numpy as np
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+
+def _vector(function, components, dtype):
+    def setter(location, count, value):
+        function(location, count, np.ascontiguousarray(value, dtype=dtype))
+    return setter, components, dtype
+
+
+def _matrix(function, components):
+    # grafica.transformations matrices are row major, so OpenGL transposes them
+    def setter(location, count, value):
+        function(location, count, GL_TRUE, np.ascontiguousarray(value, dtype=np.float32))
+    return setter, components, np.float32
+
+
+# setter, number of components and numpy type for each uniform type
+_SETTERS = {
+    GL_FLOAT: _vector(glUniform1fv, 1, np.float32),
+    GL_FLOAT_VEC2: _vector(glUniform2fv, 2, np.float32),
+    GL_FLOAT_VEC3: _vector(glUniform3fv, 3, np.float32),
+    GL_FLOAT_VEC4: _vector(glUniform4fv, 4, np.float32),
+    GL_INT: _vector(glUniform1iv, 1, np.int32),
+    GL_INT_VEC2: _vector(glUniform2iv, 2, np.int32),
+    GL_INT_VEC3: _vector(glUniform3iv, 3, np.int32),
+    GL_INT_VEC4: _vector(glUniform4iv, 4, np.int32),
+    GL_UNSIGNED_INT: _vector(glUniform1uiv, 1, np.uint32),
+    GL_UNSIGNED_INT_VEC2: _vector(glUniform2uiv, 2, np.uint32),
+    GL_UNSIGNED_INT_VEC3: _vector(glUniform3uiv, 3, np.uint32),
+    GL_UNSIGNED_INT_VEC4: _vector(glUniform4uiv, 4, np.uint32),
+    GL_BOOL: _vector(glUniform1iv, 1, np.int32),
+    GL_SAMPLER_1D: _vector(glUniform1iv, 1, np.int32),
+    GL_SAMPLER_2D: _vector(glUniform1iv, 1, np.int32),
+    GL_SAMPLER_3D: _vector(glUniform1iv, 1, np.int32),
+    GL_SAMPLER_CUBE: _vector(glUniform1iv, 1, np.int32),
+    GL_SAMPLER_2D_ARRAY: _vector(glUniform1iv, 1, np.int32),
+    GL_FLOAT_MAT2: _matrix(glUniformMatrix2fv, 4),
+    GL_FLOAT_MAT3: _matrix(glUniformMatrix3fv, 9),
+    GL_FLOAT_MAT4: _matrix(glUniformMatrix4fv, 16)
+}
+
+
+class ProgramUniforms:
+    def __init__(self, shaderProgram):
+        """Active uniforms of a linked shader program, read once.
+        Arrays can be named as 'lights' or 'lights[0]' to set all their elements.
+
+        With skipUnchanged=True, set does not send again a value equal to the last
+        one it sent. Only use it when the uniforms are not also set with plain
+        glUniform calls, which this cache would not know about.
+        """
+
+        self.shaderProgram = shaderProgram
+        self.skipUnchanged = False
+        # name -> (location, type, size)
+        self.uniforms = {}
+        self.values = {}
+
+        for index in range(glGetProgramiv(shaderProgram, GL_ACTIVE_UNIFORMS)):
+            name, size, uniformType = glGetActiveUniform(shaderProgram, index)
+            name = name.decode() if isinstance(name, bytes) else name
+            location = glGetUniformLocation(shaderProgram, name)
+            if location < 0:
+                # uniforms in blocks have no location
+                continue
+            self.uniforms[name] = (location, uniformType, size)
+            if name.endswith("[0]"):
+                self.uniforms[name[:-3]] = self.uniforms[name]
+
+    def __contains__(self, name):
+        return name in self.uniforms
+
+    def location(self, name):
+        """Location of the uniform, -1 if it is not active in the program"""
+
+        if name in self.uniforms:
+            return self.uniforms[name][0]
+
+        # e.g. 'lights[2]', an element of an array other than the first,
+        # which may be set with the following ones
+        base, _, element = name.rpartition("[")
+        if base not in self.uniforms or not element[:-1].isdigit():
+            return -1
+
+        location = glGetUniformLocation(self.shaderProgram, name)
+        if location >= 0:
+            _, uniformType, size = self.uniforms[base]
+            self.uniforms[name] = (location, uniformType, size - int(element[:-1]))
+        return location
+
+    def set(self, name, value):
+        """Sends value to the uniform, converted to its type. The program must be in use.
+        Uniforms not used by the shaders are ignored, as OpenGL does."""
+
+        uniform = self.uniforms.get(name)
+        if uniform is None:
+            if self.location(name) < 0:
+                return
+            uniform = self.uniforms[name]
+
+        location, uniformType, size = uniform
+        setter, components, dtype = _SETTERS[uniformType]
+        value = np.asarray(value, dtype=dtype)
+
+        if self.skipUnchanged:
+            last = self.values.get(name)
+            if last is not None and np.array_equal(last, value):
+                return
+            self.values[name] = value.copy()
+
+        setter(location, min(value.size // components, size), value)
+
+    __setitem__ = set
+
+    def forget(self):
+        """Next calls to set send their values even when skipUnchanged is on"""
+
+        self.values.clear()
+
+
+# Uniforms of each (OpenGL context, shader program).
+# Every context numbers its programs independently
+_programUniforms = {}
+
+
+def getUniforms(shaderProgram):
+    """ProgramUniforms of the shader program in the current context, created on its first use"""
+
+    key = (contextdata.getContext(), shaderProgram)
+    uniforms = _programUniforms.get(key)
+    if uniforms is None:
+        uniforms = ProgramUniforms(shaderProgram)
+        _programUniforms[key] = uniforms
+    return uniforms
+
+
+def getUniformLocation(shaderProgram, name):
+    """Cached glGetUniformLocation"""
+
+    return getUniforms(shaderProgram).location(name)
+
+
+def forgetProgram(shaderProgram):
+    """Drops the cached uniforms of a program deleted in the current context"""
+
+    _programUniforms.pop((contextdata.getContext(), shaderProgram), None)
@@ -0,0 +1,188 @@
+# coding=utf-8
+"""Declarative description of the vertex attributes stored in a GPUShape"""
+
+from OpenGL.GL import *
+from OpenGL import contextdata
+import numpy as np
+
+__author__ = "Daniel Calderon"
+__license__ = "MIT"
+
+# OpenGL type used for each numpy type
+GL_TYPES = {
+    np.dtype(np.float32): GL_FLOAT,
+    np.dtype(np.float16): GL_HALF_FLOAT,
+    np.dtype(np.int8): GL_BYTE,
+    np.dtype(np.uint8): GL_UNSIGNED_BYTE,
+    np.dtype(np.int16): GL_SHORT,
+    np.dtype(np.uint16): GL_UNSIGNED_SHORT,
+    np.dtype(np.int32): GL_INT,
+    np.dtype(np.uint32): GL_UNSIGNED_INT
+}
+
+# Attribute locations of each (OpenGL context, shader program, attribute name)
+_attributeLocations = {}
+
+
+def getAttribLocation(shaderProgram, name):
+    """glGetAttribLocation, queried only once per program and attribute in each context"""
+
+    key = (contextdata.getContext(), shaderProgram, name)
+    location = _attributeLocations.get(key)
+    if location is None:
+        location = glGetAttribLocation(shaderProgram, name)
+        _attributeLocations[key] = location
+    return location
+
+
+def forgetProgram(shaderProgram):
+    """Drops the cached attribute locations of a program deleted in the current context"""
+
+    context = contextdata.getContext()
+    for key in [key for key in _attributeLocations if key[0:2] == (context, shaderProgram)]:
+        del _attributeLocations[key]
+
+
+class VertexAttribute:
+    def __init__(self, name, components, dtype=np.float32, normalized=False):
+        """An input of the vertex shader, stored as components values of dtype.
+        Normalized integers are read by the shader as floats in [0, 1] or [-1, 1]."""
+
+        self.name = name
+        self.components = components
+        self.dtype = np.dtype(dtype)
+        self.normalized = normalized
+        self.glType = GL_TYPES[self.dtype]
+
+    def __str__(self):
+        return self.name + ": " + str(self.components) + " x " + str(self.dtype) +\
+            (" normalized" if self.normalized else "")
+
+    def convert(self, values):
+        """Converts float values to the dtype of the attribute"""
+
+        if self.dtype.kind == 'f':
+            return values.astype(self.dtype)
+
+        if self.normalized:
+            info = np.iinfo(self.dtype)
+            low = -1 if info.min < 0 else 0
+            values = np.round(np.clip(values, low, 1) * info.max)
+
+        return values.astype(self.dtype)
+
+
+class VertexFormat:
+    def __init__(self, *attributes):
+        """Interleaved layout of the given VertexAttribute or (name, components) tuples.
+        Every attribute starts at a multiple of 4 bytes, as OpenGL recommends."""
+
+        self.attributes = [
+            attribute if isinstance(attribute, VertexAttribute) else VertexAttribute(*attribute)
+            for attribute in attributes]
+
+        self.offsets = []
+        offset = 0
+        for attribute in self.attributes:
+            self.offsets += [offset]
+            size = attribute.components * attribute.dtype.itemsize
+            offset += (size + 3) // 4 * 4
+        self.stride = offset
+
+        # Floats per vertex in the usual float32 layout of the shapes
+        self.floats = sum(attribute.components for attribute in self.attributes)
+
+        self.dtype = np.dtype({
+            'names': [attribute.name for attribute in self.attributes],
+            'formats': [(attribute.dtype, (attribute.components,)) for attribute in self.attributes],
+            'offsets': self.offsets,
+            'itemsize': self.stride})
+
+    def __str__(self):
+        return "VertexFormat(" + ", ".join(str(attribute) for attribute in self.attributes) +\
+            "; stride: " + str(self.stride) + " bytes)"
+
+    def setupVAO(self, shaderProgram, gpuShape):
+        """Points the attributes of shaderProgram to the buffers of gpuShape.
+        Attributes not used by the program are skipped."""
+
+        glBindVertexArray(gpuShape.vao)
+
+        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
+
+        for attribute, offset in zip(self.attributes, self.offsets):
+            location = getAttribLocation(shaderProgram, attribute.name)
+            if location < 0:
+                continue
+            glVertexAttribPointer(location, attribute.components, attribute.glType,
+                GL_TRUE if attribute.normalized else GL_FALSE, self.stride, ctypes.c_void_p(offset))
+            glEnableVertexAttribArray(location)
+
+        # Unbinding current vao
+        glBindVertexArray(0)
+
+    def setupInstances(self, shaderProgram, gpuShape):
+        """Points the attributes of shaderProgram to the instance buffer of gpuShape,
+        advancing once per instance instead of once per vertex"""
+
+        if gpuShape.instanceVbo is None:
+            gpuShape.instanceVbo = glGenBuffers(1)
+        gpuShape.instanceStride = self.stride
+        # Nothing is drawn until the instances are uploaded
+        gpuShape.instances = 0
+
+        glBindVertexArray(gpuShape.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.instanceVbo)
+
+        for attribute, offset in zip(self.attributes, self.offsets):
+            location = getAttribLocation(shaderProgram, attribute.name)
+            if location < 0:
+                continue
+            glVertexAttribPointer(location, attribute.components, attribute.glType,
+                GL_TRUE if attribute.normalized else GL_FALSE, self.stride, ctypes.c_void_p(offset))
+            glVertexAttribDivisor(location, 1)
+            glEnableVertexAttribArray(location)
+
+        glBindVertexArray(0)
+
+    def pack(self, vertices):
+        """Converts vertices in the float32 layout, a flat list or an (N, floats) array
+        as the shapes store them, to a structured array with this format"""
+
+        vertices = np.asarray(vertices, dtype=np.float32).reshape((-1, self.floats))
+        packed = np.zeros(len(vertices), dtype=self.dtype)
+
+        column = 0
+        for attribute in self.attributes:
+            packed[attribute.name] = attribute.convert(vertices[:, column:column + attribute.components])
+            column += attribute.components
+
+        return packed
+
+
+def packIndices(indices):
+    """uint16 indices when every vertex can be reached with them, uint32 otherwise"""
+
+    indices = np.asarray(indices)
+    if indices.size == 0 or indices.max() < 1 << 16:
+        return indices.astype(np.uint16)
+    return indices.astype(np.uint32)
+
+
+# Formats of the pipelines in easy_shaders, lighting_shaders and text_renderer
+POSITION_COLOR = VertexFormat(("position", 3), ("color", 3))
+POSITION_TEXCOORDS = VertexFormat(("position", 3), ("texCoords", 2))
+POSITION_COLOR_NORMAL = VertexFormat(("position", 3), ("color", 3), ("normal", 3))
+POSITION_TEXCOORDS_NORMAL = VertexFormat(("position", 3), ("texCoords", 2), ("normal", 3))
+POSITION_TEXCOORDS3 = VertexFormat(("position", 3), ("texCoords", 3))
+
+# Compact alternatives: 8 bit colors and normals, half float texture coordinates
+COMPACT_POSITION_COLOR = VertexFormat(
+    ("position", 3), ("color", 3, np.uint8, True))
+COMPACT_POSITION_TEXCOORDS = VertexFormat(
+    ("position", 3), ("texCoords", 2, np.float16))
+COMPACT_POSITION_COLOR_NORMAL = VertexFormat(
+    ("position", 3), ("color", 3, np.uint8, True), ("normal", 3, np.int8, True))
+COMPACT_POSITION_TEXCOORDS_NORMAL = VertexFormat(
+    ("position", 3), ("texCoords", 2, np.float16), ("normal", 3, np.int8, True))
@@ -218,3 +218,173 @@ def lookAt(eye, at, up):
             [-forward[0], -forward[1], -forward[2], np.dot(forward, eye)],
             [0,0,0,1]
         ], dtype = np.float32)
+
+
+def trs(position, rotation, scale):
+    # Closed form of translate @ rotationY @ rotationX @ rotationZ @ scale,
+    # the composition used by the scene graph nodes
+    sx, sy, sz = np.sin(rotation)
+    cx, cy, cz = np.cos(rotation)
+    kx, ky, kz = scale
+
+    return np.array([
+        [(cy * cz + sy * sx * sz) * kx, (sy * sx * cz - cy * sz) * ky, sy * cx * kz, position[0]],
+        [cx * sz * kx,                  cx * cz * ky,                  -sx * kz,     position[1]],
+        [(cy * sx * sz - sy * cz) * kx, (sy * sz + cy * sx * cz) * ky, cy * cx * kz, position[2]],
+        [0,0,0,1]], dtype = np.float32)
+
+# Batched constructors
+#
+# The following functions build a stack of N transformations in a single
+# numpy pass. Every argument may be a scalar or an array of length N (they are
+# broadcast against each other) and the result is an (N, 4, 4) float32 array.
+# An optional preallocated `out` buffer can be given so per-frame loops do not
+# allocate new memory every time.
+
+def _batchOut(n, out):
+    if out is None:
+        return np.zeros((n, 4, 4), dtype=np.float32)
+
+    assert out.shape == (n, 4, 4)
+    assert out.dtype == np.float32
+
+    out.fill(0)
+    return out
+
+
+def _batchArgs(*args):
+    args = np.broadcast_arrays(*[np.asarray(a, dtype=np.float32) for a in args])
+    return [np.ravel(a) for a in args]
+
+
+def identityBatch(n, out=None):
+    out = _batchOut(n, out)
+    out[:, 0, 0] = 1
+    out[:, 1, 1] = 1
+    out[:, 2, 2] = 1
+    out[:, 3, 3] = 1
+    return out
+
+
+def uniformScaleBatch(s, out=None):
+    s, = _batchArgs(s)
+    return scaleBatch(s, s, s, out)
+
+
+def scaleBatch(sx, sy, sz, out=None):
+    sx, sy, sz = _batchArgs(sx, sy, sz)
+    out = _batchOut(sx.shape[0], out)
+    out[:, 0, 0] = sx
+    out[:, 1, 1] = sy
+    out[:, 2, 2] = sz
+    out[:, 3, 3] = 1
+    return out
+
+
+def translateBatch(tx, ty, tz, out=None):
+    tx, ty, tz = _batchArgs(tx, ty, tz)
+    out = identityBatch(tx.shape[0], out)
+    out[:, 0, 3] = tx
+    out[:, 1, 3] = ty
+    out[:, 2, 3] = tz
+    return out
+
+
+def rotationXBatch(theta, out=None):
+    theta, = _batchArgs(theta)
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+
+    out = _batchOut(theta.shape[0], out)
+    out[:, 0, 0] = 1
+    out[:, 1, 1] = cos_theta
+    out[:, 1, 2] = -sin_theta
+    out[:, 2, 1] = sin_theta
+    out[:, 2, 2] = cos_theta
+    out[:, 3, 3] = 1
+    return out
+
+
+def rotationYBatch(theta, out=None):
+    theta, = _batchArgs(theta)
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+
+    out = _batchOut(theta.shape[0], out)
+    out[:, 0, 0] = cos_theta
+    out[:, 0, 2] = sin_theta
+    out[:, 1, 1] = 1
+    out[:, 2, 0] = -sin_theta
+    out[:, 2, 2] = cos_theta
+    out[:, 3, 3] = 1
+    return out
+
+
+def rotationZBatch(theta, out=None):
+    theta, = _batchArgs(theta)
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+
+    out = _batchOut(theta.shape[0], out)
+    out[:, 0, 0] = cos_theta
+    out[:, 0, 1] = -sin_theta
+    out[:, 1, 0] = sin_theta
+    out[:, 1, 1] = cos_theta
+    out[:, 2, 2] = 1
+    out[:, 3, 3] = 1
+    return out
+
+
+def rotationABatch(theta, axis, out=None):
+    # axis can be a single (3,) axis shared by all angles or an (N, 3) array
+    axis = np.asarray(axis, dtype=np.float32)
+    assert axis.shape[-1] == 3
+
+    theta, x, y, z = _batchArgs(theta, axis[..., 0], axis[..., 1], axis[..., 2])
+    s = np.sin(theta)
+    c = np.cos(theta)
+    t = 1 - c
+
+    out = _batchOut(theta.shape[0], out)
+    # First row
+    out[:, 0, 0] = c + t * x * x
+    out[:, 0, 1] = t * x * y - s * z
+    out[:, 0, 2] = t * x * z + s * y
+    # Second row
+    out[:, 1, 0] = t * x * y + s * z
+    out[:, 1, 1] = c + t * y * y
+    out[:, 1, 2] = t * y * z - s * x
+    # Third row
+    out[:, 2, 0] = t * x * z - s * y
+    out[:, 2, 1] = t * y * z + s * x
+    out[:, 2, 2] = c + t * z * z
+    # Fourth row
+    out[:, 3, 3] = 1
+    return out
+
+
+def lookAtBatch(eye, at, up, out=None):
+    # eye, at and up are (3,) or (N, 3) arrays
+    eye, at, up = np.broadcast_arrays(
+        np.asarray(eye, dtype=np.float32).reshape(-1, 3),
+        np.asarray(at, dtype=np.float32).reshape(-1, 3),
+        np.asarray(up, dtype=np.float32).reshape(-1, 3))
+
+    forward = at - eye
+    forward = forward / np.linalg.norm(forward, axis=1, keepdims=True)
+
+    side = np.cross(forward, up)
+    side = side / np.linalg.norm(side, axis=1, keepdims=True)
+
+    newUp = np.cross(side, forward)
+    newUp = newUp / np.linalg.norm(newUp, axis=1, keepdims=True)
+
+    out = _batchOut(eye.shape[0], out)
+    out[:, 0, :3] = side
+    out[:, 1, :3] = newUp
+    out[:, 2, :3] = -forward
+    out[:, 0, 3] = -np.einsum("ij,ij->i", side, eye)
+    out[:, 1, 3] = -np.einsum("ij,ij->i", newUp, eye)
+    out[:, 2, 3] = np.einsum("ij,ij->i", forward, eye)
+    out[:, 3, 3] = 1
+    return out
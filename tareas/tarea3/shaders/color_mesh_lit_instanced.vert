@@ -0,0 +1,25 @@
+#version 330
+
+in vec3 position;
+in vec3 normal;
+
+// Matriz de modelo por instancia, guardada por columnas
+in vec4 a_model0;
+in vec4 a_model1;
+in vec4 a_model2;
+in vec4 a_model3;
+
+uniform mat4 u_view = mat4(1.0);
+uniform mat4 u_projection = mat4(1.0);
+
+out vec3 fragPos;
+out vec3 fragNormal;
+
+void main()
+{
+    mat4 model = mat4(a_model0, a_model1, a_model2, a_model3);
+    fragPos = vec3(model * vec4(position, 1.0f));
+    fragNormal = mat3(transpose(inverse(model))) * normal;
+    
+    gl_Position = u_projection * u_view * model * vec4(position, 1.0f);
+}
\ No newline at end of file
@@ -17,7 +17,7 @@ import utils.shapes as shapes
 from utils.camera import FreeCamera
 from utils.scene_graph import SceneGraph
 from utils.drawables import Model, Texture, DirectionalLight, PointLight, SpotLight, Material
-from utils.helpers import init_axis, init_pipeline, mesh_from_file, get_path
+from utils.helpers import init_axis, init_pipeline, mesh_from_file, get_path, AssetManager
 from Box2D import b2PolygonShape, b2World
 
 from scenes.scenes import Hangar, Circuit
@@ -40,7 +40,9 @@ class Controller(pyglet.window.Window):
             # parámetros para el integrador
             "vel_iters": 6,
             "pos_iters": 2,
-            "scene": None
+            "scene": None,
+            # pares (pipeline, variante con instancing)
+            "instanced_pipelines": []
             }
         self.init()
 
@@ -78,8 +80,24 @@ if __name__ == "__main__":
         get_path("shaders/textured_mesh_lit.vert"),
         get_path("shaders/textured_mesh_lit.frag"))
 
+    # Los nodos que comparten mesh, material y textura (como las ruedas) se dibujan con instancing
+    controller.program_state["instanced_pipelines"] = [
+        (color_mesh_lit_pipeline, init_pipeline(
+            get_path("shaders/color_mesh_lit_instanced.vert"),
+            get_path("shaders/color_mesh_lit.frag"))),
+        (textured_mesh_lit_pipeline, init_pipeline(
+            get_path("shaders/textured_mesh_lit_instanced.vert"),
+            get_path("shaders/textured_mesh_lit.frag")))]
+
     #Inicializar cámara
     controller.program_state["camera"] = FreeCamera([0,0,0],"perspective")
+    # Leemos en paralelo los modelos de todas las escenas, después las escenas los
+    # obtienen del caché de mesh_from_file
+    assets = AssetManager(progress=lambda name, loaded, total: print(f"Cargado {name} ({loaded}/{total})"))
+    for asset in ["cylinder.off", "LamboChassis.obj", "LamboWheel.obj"]:
+        assets.mesh(asset, get_path(f"assets/{asset}"))
+    assets.wait()
+    assets.shutdown()
     # Cargamos la escena
     axis_scene = init_axis(controller)
     controller.program_state["scene"] = Hangar(controller, textured_mesh_lit_pipeline, color_mesh_lit_pipeline)
@@ -27,6 +27,24 @@ class Camera():
             depth = np.linalg.norm(depth)
             perspective_matrix = tr.ortho(-(self.width/self.height) * depth, (self.width/self.height) * depth, -1 * depth, 1 * depth, 0.01, 100)
         return np.reshape(perspective_matrix, (16, 1), order="F")
+
+    def get_frustum(self):
+        """
+        Planos (a, b, c, d) del frustum en coordenadas de mundo, normalizados y con la
+        normal hacia adentro: un punto p está dentro si a*x + b*y + c*z + d >= 0 para todos.
+        """
+        projection = np.reshape(self.get_projection(), (4, 4), order="F")
+        view = np.reshape(self.get_view(), (4, 4), order="F")
+        clip = projection @ view
+        planes = np.array([
+            clip[3] + clip[0], # izquierda
+            clip[3] - clip[0], # derecha
+            clip[3] + clip[1], # abajo
+            clip[3] - clip[1], # arriba
+            clip[3] + clip[2], # cerca
+            clip[3] - clip[2], # lejos
+        ], dtype=np.float32)
+        return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
     
     def resize(self, width, height):
         self.width = width
@@ -1,5 +1,11 @@
 import numpy as np
 from OpenGL.GL import glEnable, glDisable, glBindTexture, GL_TRIANGLES, GL_CULL_FACE, GL_TEXTURE_2D, GL_CLAMP_TO_EDGE, GL_LINEAR
+from OpenGL.GL import glGenBuffers, glBindBuffer, glBufferData, glBufferSubData, glBindBufferBase, GL_UNIFORM_BUFFER, GL_DYNAMIC_DRAW
+from OpenGL.GL import glGenVertexArrays, glBindVertexArray, glDeleteVertexArrays, glDeleteBuffers, glEnableVertexAttribArray, glVertexAttribPointer, glVertexAttribDivisor
+from OpenGL.GL import glDrawArraysInstanced, glDrawElementsInstanced, GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER, GL_STATIC_DRAW, GL_STREAM_DRAW, GL_FLOAT, GL_FALSE, GL_UNSIGNED_INT
+from OpenGL.GL import glGetActiveUniformsiv, GL_UNIFORM_OFFSET
+import ctypes
+import weakref
 from PIL import Image
 from grafica.textures import texture_2D_setup
 import grafica.transformations as tr
@@ -68,6 +74,231 @@ class SpotLight():
         self.cutOff = cutOff
         self.outerCutOff = outerCutOff
 
+MAX_POINT_LIGHTS = 16
+MAX_SPOT_LIGHTS = 16
+
+# Layout std140 del uniform block "Lights" de los shaders iluminados.
+# Cada vec3 ocupa 16 bytes, por lo que los floats se guardan en su cuarto componente.
+DIRECTIONAL_LIGHT_DTYPE = np.dtype([
+    ("direction", np.float32, 3), ("_pad0", np.float32),
+    ("ambient", np.float32, 3), ("_pad1", np.float32),
+    ("diffuse", np.float32, 3), ("_pad2", np.float32),
+    ("specular", np.float32, 3), ("_pad3", np.float32)])
+
+POINT_LIGHT_DTYPE = np.dtype([
+    ("position", np.float32, 3), ("constant", np.float32),
+    ("ambient", np.float32, 3), ("linear", np.float32),
+    ("diffuse", np.float32, 3), ("quadratic", np.float32),
+    ("specular", np.float32, 3), ("_pad0", np.float32)])
+
+SPOT_LIGHT_DTYPE = np.dtype([
+    ("position", np.float32, 3), ("constant", np.float32),
+    ("direction", np.float32, 3), ("linear", np.float32),
+    ("ambient", np.float32, 3), ("quadratic", np.float32),
+    ("diffuse", np.float32, 3), ("cutOff", np.float32),
+    ("specular", np.float32, 3), ("outerCutOff", np.float32)])
+
+LIGHTS_DTYPE = np.dtype([
+    ("dirLight", DIRECTIONAL_LIGHT_DTYPE),
+    ("pointLights", POINT_LIGHT_DTYPE, MAX_POINT_LIGHTS),
+    ("spotLights", SPOT_LIGHT_DTYPE, MAX_SPOT_LIGHTS),
+    ("numPointLights", np.int32),
+    ("numSpotLights", np.int32),
+    ("_pad0", np.int32, 2)])
+
+def dtype_offset(dtype, name):
+    """
+    Posición en bytes dentro de dtype de un miembro del uniform block,
+    por ejemplo "u_pointLights[3].diffuse". Se ignora el prefijo u_ de los shaders.
+    """
+    offset = 0
+    for part in name.split("."):
+        field, _, index = part.partition("[")
+        if field.startswith("u_"):
+            field = field[2:]
+        dtype, field_offset = dtype.fields[field][:2]
+        offset += field_offset
+        if index:
+            dtype = dtype.base
+            offset += int(index[:-1]) * dtype.itemsize
+    return offset
+
+class LightBuffer():
+    """
+    Uniform buffer con las luces de una escena, compartido por todos los
+    pipelines que declaran el uniform block "Lights".
+    Sólo se sube a la GPU cuando su contenido cambia.
+    """
+    def __init__(self):
+        self.data = np.zeros((), dtype=LIGHTS_DTYPE)
+        self.buffer = None
+        self.uploaded = None
+        # pipelines cuyo uniform block ya se comparó con LIGHTS_DTYPE. Se guardan los
+        # objetos y no pipeline.id: otro contexto, o un programa nuevo, puede repetir el id
+        self.checked_programs = weakref.WeakSet()
+
+    def clear(self):
+        self.data["dirLight"] = np.zeros((), dtype=DIRECTIONAL_LIGHT_DTYPE)
+        self.data["numPointLights"] = 0
+        self.data["numSpotLights"] = 0
+
+    def set_directional_light(self, light, direction):
+        dirLight = self.data["dirLight"]
+        dirLight["direction"] = direction
+        dirLight["ambient"] = light.ambient
+        dirLight["diffuse"] = light.diffuse
+        dirLight["specular"] = light.specular
+
+    def add_point_light(self, light, position):
+        index = int(self.data["numPointLights"])
+        pointLight = self.data["pointLights"][index]
+        pointLight["position"] = position
+        pointLight["ambient"] = light.ambient
+        pointLight["diffuse"] = light.diffuse
+        pointLight["specular"] = light.specular
+        pointLight["constant"] = light.constant
+        pointLight["linear"] = light.linear
+        pointLight["quadratic"] = light.quadratic
+        self.data["numPointLights"] = index + 1
+
+    def add_spot_light(self, light, position, direction):
+        index = int(self.data["numSpotLights"])
+        spotLight = self.data["spotLights"][index]
+        spotLight["position"] = position
+        spotLight["direction"] = direction
+        spotLight["ambient"] = light.ambient
+        spotLight["diffuse"] = light.diffuse
+        spotLight["specular"] = light.specular
+        spotLight["constant"] = light.constant
+        spotLight["linear"] = light.linear
+        spotLight["quadratic"] = light.quadratic
+        spotLight["cutOff"] = light.cutOff
+        spotLight["outerCutOff"] = light.outerCutOff
+        self.data["numSpotLights"] = index + 1
+
+    def upload(self):
+        data = self.data.tobytes()
+        if data == self.uploaded:
+            return False
+
+        if self.buffer is None:
+            self.buffer = glGenBuffers(1)
+            glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+            glBufferData(GL_UNIFORM_BUFFER, len(data), data, GL_DYNAMIC_DRAW)
+        else:
+            glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+            glBufferSubData(GL_UNIFORM_BUFFER, 0, len(data), data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.uploaded = data
+        return True
+
+    def check_layout(self, pipeline):
+        """
+        Compara el tamaño y los GL_UNIFORM_OFFSET del bloque "Lights" del pipeline
+        con LIGHTS_DTYPE, que se sube tal cual.
+        """
+        block = pipeline.uniform_blocks["Lights"]
+        assert block.size == LIGHTS_DTYPE.itemsize, \
+            f"El bloque Lights mide {block.size} bytes y LIGHTS_DTYPE {LIGHTS_DTYPE.itemsize}"
+
+        indices = np.array(list(block.uniforms.keys()), dtype=np.uint32)
+        offsets = np.zeros(len(indices), dtype=np.int32)
+        glGetActiveUniformsiv(pipeline.id, len(indices), indices, GL_UNIFORM_OFFSET, offsets)
+        for (name, *_), offset in zip(block.uniforms.values(), offsets):
+            assert dtype_offset(LIGHTS_DTYPE, name) == offset, \
+                f"{name} está en el byte {offset} del bloque Lights y no en {dtype_offset(LIGHTS_DTYPE, name)}"
+
+    def bind(self, pipeline):
+        if self.buffer is not None and "Lights" in pipeline.uniform_blocks:
+            if pipeline not in self.checked_programs:
+                self.check_layout(pipeline)
+                self.checked_programs.add(pipeline)
+            glBindBufferBase(GL_UNIFORM_BUFFER, pipeline.uniform_blocks["Lights"].binding, self.buffer)
+
+class InstancedGPUData():
+    """
+    Datos de un Model en la GPU para dibujarlo muchas veces con una sola llamada.
+    Cada instancia tiene su matriz de modelo (a_model0..a_model3, por columnas)
+    y su color (a_color), guardados en un buffer con divisor 1.
+    """
+    INSTANCE_SIZE = 16 + 3
+
+    def __init__(self, model, pipeline):
+        attributes = pipeline.attributes
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+
+        self.buffers = []
+        for name, data, count in [("position", model.position_data, 3), ("texCoord", model.uv_data, 2), ("normal", model.normal_data, 3)]:
+            if name not in attributes:
+                continue
+            data = np.asarray(data, dtype=np.float32)
+            buffer = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, buffer)
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+            glEnableVertexAttribArray(attributes[name]["location"])
+            glVertexAttribPointer(attributes[name]["location"], count, GL_FLOAT, GL_FALSE, 0, None)
+            self.buffers.append(buffer)
+
+        self.vertex_count = len(model.position_data) // 3
+        self.index_count = 0
+        if model.index_data is not None:
+            self.index_count = len(model.index_data)
+            buffer = glGenBuffers(1)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, buffer)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, model.index_data.nbytes, model.index_data, GL_STATIC_DRAW)
+            self.buffers.append(buffer)
+
+        self.instance_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        stride = self.INSTANCE_SIZE * 4
+        for column in range(4):
+            location = attributes[f"a_model{column}"]["location"]
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(16 * column))
+            glVertexAttribDivisor(location, 1)
+        if "a_color" in attributes:
+            location = attributes["a_color"]["location"]
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(64))
+            glVertexAttribDivisor(location, 1)
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        # Copia en CPU de los datos por instancia, crece según se necesite
+        self.instances = np.zeros((0, self.INSTANCE_SIZE), dtype=np.float32)
+
+    def draw(self, mode, models, colors=None):
+        count = len(models)
+        if count > len(self.instances):
+            self.instances = np.zeros((count, self.INSTANCE_SIZE), dtype=np.float32)
+            self.instances[:, 16:] = 1
+            glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+            glBufferData(GL_ARRAY_BUFFER, self.instances.nbytes, None, GL_STREAM_DRAW)
+        else:
+            glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+
+        # las matrices de numpy están por filas, OpenGL las lee por columnas
+        instances = self.instances[:count]
+        instances[:, :16] = np.transpose(models, (0, 2, 1)).reshape(count, 16)
+        if colors is not None:
+            instances[:, 16:] = colors
+        glBufferSubData(GL_ARRAY_BUFFER, 0, instances.nbytes, instances)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        glBindVertexArray(self.vao)
+        if self.index_count > 0:
+            glDrawElementsInstanced(mode, self.index_count, GL_UNSIGNED_INT, None, count)
+        else:
+            glDrawArraysInstanced(mode, 0, self.vertex_count, count)
+        glBindVertexArray(0)
+
+    def delete(self):
+        glDeleteBuffers(len(self.buffers), self.buffers)
+        glDeleteBuffers(1, [self.instance_buffer])
+        glDeleteVertexArrays(1, [self.vao])
+
 class Model():
     def __init__(self, position_data, uv_data=None, normal_data=None, index_data=None):
         self.position_data = position_data
@@ -78,9 +309,40 @@ class Model():
         if index_data is not None:
             self.index_data = np.array(index_data, dtype=np.uint32)
 
+        # Volúmenes envolventes en coordenadas locales, para el culling de la escena
+        positions = np.reshape(np.asarray(position_data, dtype=np.float32), (-1, 3))
+        self.aabb_min = positions.min(axis=0)
+        self.aabb_max = positions.max(axis=0)
+        self.bounding_center = (self.aabb_min + self.aabb_max) / 2
+        self.bounding_radius = float(np.linalg.norm(positions - self.bounding_center, axis=1).max())
+
+        # Último vertex list inicializado
         self.gpu_data = None
+        # Vertex lists compartidos por layout de atributos: llave -> [vertex list, referencias]
+        self.gpu_resources = {}
+
+    @staticmethod
+    def layout_key(pipeline):
+        return tuple(sorted(
+            (name, attribute["location"], attribute["count"], attribute["format"])
+            for name, attribute in pipeline.attributes.items()))
 
     def init_gpu_data(self, pipeline):
+        """
+        Sube el modelo a la GPU para el layout de atributos del pipeline.
+        Pipelines con el mismo layout comparten los datos, que se suben una sola vez.
+        """
+        key = self.layout_key(pipeline)
+        if key in self.gpu_resources:
+            self.gpu_resources[key][1] += 1
+            if not isinstance(self.gpu_resources[key][0], InstancedGPUData):
+                self.gpu_data = self.gpu_resources[key][0]
+            return
+
+        # los pipelines con atributos por instancia no usan vertex lists de pyglet
+        if "a_model0" in pipeline.attributes:
+            self.gpu_resources[key] = [InstancedGPUData(self, pipeline), 1]
+            return
 
         size = len(self.position_data)
         count = 3
@@ -105,14 +367,51 @@ class Model():
         if "normal" in pipeline.attributes:
             self.gpu_data.normal[:] = self.normal_data
 
-    def draw(self, mode = GL_TRIANGLES, cull_face=True):
+        self.gpu_resources[key] = [self.gpu_data, 1]
+
+    def release_gpu_data(self, pipeline):
+        """Libera una referencia a los datos del pipeline, se borran de la GPU con la última"""
+        key = self.layout_key(pipeline)
+        if key not in self.gpu_resources:
+            return
+
+        resource = self.gpu_resources[key]
+        resource[1] -= 1
+        if resource[1] > 0:
+            return
+
+        resource[0].delete()
+        del self.gpu_resources[key]
+        if self.gpu_data is resource[0]:
+            self.gpu_data = None
+            for vertex_list, _ in self.gpu_resources.values():
+                if not isinstance(vertex_list, InstancedGPUData):
+                    self.gpu_data = vertex_list
+
+    def get_gpu_data(self, pipeline=None):
+        if pipeline is None:
+            return self.gpu_data
+        return self.gpu_resources[self.layout_key(pipeline)][0]
+
+    def draw(self, mode = GL_TRIANGLES, cull_face=True, pipeline=None):
+        gpu_data = self.get_gpu_data(pipeline)
+
+        # con cull_face=None no se modifica el estado de GL_CULL_FACE
+        if cull_face is None:
+            gpu_data.draw(mode)
+            return
+
         if cull_face:
             glEnable(GL_CULL_FACE)
         else:
             glDisable(GL_CULL_FACE)
-        self.gpu_data.draw(mode)
+        gpu_data.draw(mode)
         glEnable(GL_CULL_FACE)
 
+    def draw_instanced(self, pipeline, models, colors=None, mode = GL_TRIANGLES):
+        """Dibuja una instancia por cada matriz de modelo de models (N, 4, 4)"""
+        self.get_gpu_data(pipeline).draw(mode, models, colors)
+
 class Material():
     def __init__(self, ambient=[1, 1, 1], diffuse=[1, 1, 1], specular=[1, 1, 1], shininess=32.0):
         self.ambient = np.array(ambient, dtype=np.float32)
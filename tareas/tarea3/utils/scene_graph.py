@@ -1,17 +1,156 @@
-from networkx import DiGraph, edge_dfs
-from OpenGL.GL import GL_TRIANGLES
+from networkx import DiGraph, edge_dfs, descendants
+from OpenGL.GL import glEnable, glDisable, GL_TRIANGLES, GL_CULL_FACE
 import grafica.transformations as tr
 import numpy as np
-from utils.drawables import DirectionalLight, PointLight, SpotLight, Texture
+from utils.drawables import DirectionalLight, PointLight, SpotLight, Texture, LightBuffer, MAX_POINT_LIGHTS, MAX_SPOT_LIGHTS
+
+# Atributos de un nodo que definen su transformación local
+TRANSFORM_ATTRIBUTES = ("transform", "position", "rotation", "scale")
+
+class TrackedArray(np.ndarray):
+    """
+    Copia de un arreglo que cuenta en version las veces que se modifica, ya sea por
+    elementos (node["rotation"][1] += 0.1), completo (node["position"] += v), por una
+    vista (node["position"][:2] += d) o como salida de numpy (np.copyto, out=).
+    Así se sabe si cambió sin comparar su contenido.
+    """
+    def __new__(cls, values, dtype=None):
+        # una copia: otros arreglos que apunten a values no pueden cambiarlo sin avisar
+        return np.array(values, dtype=dtype).view(cls)
+
+    def __array_finalize__(self, obj):
+        # una vista cuenta sus cambios en el arreglo del que viene, una copia es independiente
+        self._root = obj._root if isinstance(obj, TrackedArray) and self.base is not None else self
+        if self._root is self:
+            self.version = 0
+
+    def _modified(method):
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._root.version += 1
+            return result
+        return wrapper
+
+    __setitem__ = _modified(np.ndarray.__setitem__)
+    fill = _modified(np.ndarray.fill)
+    put = _modified(np.ndarray.put)
+    sort = _modified(np.ndarray.sort)
+    del _modified
+
+    def __array_ufunc__(self, ufunc, method, *inputs, out=None, **kwargs):
+        # operadores como += y out= escriben en out, ufunc.at en el primer argumento
+        written = out if out is not None else (inputs[0:1] if method == "at" else ())
+
+        # se opera con arreglos comunes, los resultados nuevos no se siguen
+        inputs = tuple(_untracked(value) for value in inputs)
+        if out is not None:
+            kwargs["out"] = tuple(_untracked(value) for value in out)
+        result = getattr(ufunc, method)(*inputs, **kwargs)
+
+        for value in written:
+            if isinstance(value, TrackedArray):
+                value._root.version += 1
+        if out is None:
+            return result
+        return out[0] if len(out) == 1 else out
+
+    def __array_function__(self, func, types, args, kwargs):
+        result = super().__array_function__(func, types, args, kwargs)
+        if func in WRITING_FUNCTIONS:
+            target = args[0] if args else next(iter(kwargs.values()), None)
+            if isinstance(target, TrackedArray):
+                target._root.version += 1
+        return result
+
+def _untracked(value):
+    return value.view(np.ndarray) if isinstance(value, TrackedArray) else value
+
+# Funciones de numpy que escriben en su primer argumento
+WRITING_FUNCTIONS = {np.copyto, np.put, np.place, np.putmask, np.fill_diagonal}
+
+class RenderState():
+    """
+    Guarda el estado de OpenGL fijado durante un frame para no repetir
+    llamadas cuando el estado no cambia.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.pipeline = None
+        self.texture = None
+        self.cull_face = None
+        self.material = None
+        self.color = None
+
+    def use_pipeline(self, pipeline):
+        if self.pipeline is pipeline:
+            return False
+        pipeline.use()
+        self.pipeline = pipeline
+        # los uniforms son propios de cada pipeline
+        self.material = None
+        self.color = None
+        return True
+
+    def bind_texture(self, texture):
+        if self.texture is texture:
+            return
+        if texture is None:
+            self.texture.unbind()
+        else:
+            texture.bind()
+        self.texture = texture
+
+    def set_cull_face(self, cull_face):
+        if self.cull_face == cull_face:
+            return
+        if cull_face:
+            glEnable(GL_CULL_FACE)
+        else:
+            glDisable(GL_CULL_FACE)
+        self.cull_face = cull_face
+
+    def set_material(self, material):
+        if self.material is material:
+            return False
+        self.material = material
+        return True
+
+    def set_color(self, color):
+        color = tuple(color)
+        if self.color == color:
+            return False
+        self.color = color
+        return True
 
 class SceneGraph():
     def __init__(self, controller=None):
         self.graph = DiGraph(root="root")
-        self.add_node("root")
+        self.transformations = {}
+        # Caché de transformaciones locales: nombre -> (atributos, versiones, matriz)
+        self.local_transformations = {}
+        # Orden DFS aplanado: lista de (nombre, índice del padre, atributos)
+        self.draw_order = None
+        self.world_transforms = []
+        # Índice siguiente al último descendiente de cada nodo en el orden DFS
+        self.subtree_end = []
         self.controller = controller
         self.num_point_lights = 0
         self.num_spot_lights = 0
-        self.transformations = {}
+        self.render_state = RenderState()
+        self.lights = LightBuffer()
+        self.frame_uniforms = {}
+        # Variantes con instancing de cada pipeline: id(pipeline) -> pipeline
+        self.instanced_pipelines = {}
+        # Culling contra el frustum de la cámara, y cuántas mallas se dibujaron y descartaron en el último frame
+        self.frustum_culling = True
+        self.drawn_nodes = 0
+        self.culled_nodes = 0
+        self.add_node("root")
+        if controller is not None:
+            for pipeline, instanced_pipeline in controller.program_state.get("instanced_pipelines", []):
+                self.add_instanced_pipeline(pipeline, instanced_pipeline)
 
     def add_node(self,
                  name,
@@ -34,20 +173,25 @@ class SceneGraph():
         if pipeline is None and light is not None:
             raise ValueError("Definir pipeline para una luz")
         
+        if name in self.graph.nodes:
+            self.release_node(name)
+
         _texture = texture
         if mesh is not None:
             mesh.init_gpu_data(pipeline)
+            if id(pipeline) in self.instanced_pipelines:
+                mesh.init_gpu_data(self.instanced_pipelines[id(pipeline)])
             if texture is None:
                 _texture = Texture()
 
         if light is not None and isinstance(light, PointLight):
-            if self.num_point_lights == 16:
-                raise ValueError("No se pueden agregar más de 16 PointLights")
+            if self.num_point_lights == MAX_POINT_LIGHTS:
+                raise ValueError(f"No se pueden agregar más de {MAX_POINT_LIGHTS} PointLights")
             self.num_point_lights += 1
 
         if light is not None and isinstance(light, SpotLight):
-            if self.num_spot_lights == 16:
-                raise ValueError("No se pueden agregar más de 16 SpotLights")
+            if self.num_spot_lights == MAX_SPOT_LIGHTS:
+                raise ValueError(f"No se pueden agregar más de {MAX_SPOT_LIGHTS} SpotLights")
             self.num_spot_lights += 1
 
         self.graph.add_node(
@@ -58,14 +202,49 @@ class SceneGraph():
             color=color,
             material=material,
             texture=_texture,
-            transform=transform,
-            position=np.array(position, dtype=np.float32),
-            rotation=np.array(rotation, dtype=np.float32),
-            scale=np.array(scale, dtype=np.float32),
+            transform=TrackedArray(transform),
+            position=TrackedArray(position, dtype=np.float32),
+            rotation=TrackedArray(rotation, dtype=np.float32),
+            scale=TrackedArray(scale, dtype=np.float32),
             mode=mode,
             cull_face=cull_face)
         
         self.graph.add_edge(attach_to, name)
+        self.draw_order = None
+        self.transformations.pop(name, None)
+        self.local_transformations.pop(name, None)
+
+    def add_instanced_pipeline(self, pipeline, instanced_pipeline):
+        """
+        Registra la variante con instancing de un pipeline. Los nodos que comparten
+        mesh, pipeline, material y textura se dibujan con una sola llamada.
+        """
+        self.instanced_pipelines[id(pipeline)] = instanced_pipeline
+        for _, node in self.graph.nodes(data=True):
+            if node.get("mesh") is not None and node["pipeline"] is pipeline:
+                node["mesh"].init_gpu_data(instanced_pipeline)
+
+    def release_node(self, name):
+        node = self.graph.nodes[name]
+        # la luz deja espacio para otra del mismo tipo
+        if isinstance(node.get("light"), PointLight):
+            self.num_point_lights -= 1
+        elif isinstance(node.get("light"), SpotLight):
+            self.num_spot_lights -= 1
+        if node.get("mesh") is not None:
+            node["mesh"].release_gpu_data(node["pipeline"])
+            if id(node["pipeline"]) in self.instanced_pipelines:
+                node["mesh"].release_gpu_data(self.instanced_pipelines[id(node["pipeline"])])
+        self.transformations.pop(name, None)
+        self.local_transformations.pop(name, None)
+
+    def remove_node(self, name):
+        if name in self.graph.nodes:
+            nodes = [name, *descendants(self.graph, name)]
+            for node in nodes:
+                self.release_node(node)
+            self.graph.remove_nodes_from(nodes)
+            self.draw_order = None
 
     def __getitem__(self, name):
         if name not in self.graph.nodes:
@@ -73,139 +252,328 @@ class SceneGraph():
 
         return self.graph.nodes[name]
     
+    def __contains__(self, name):
+        return name in self.graph.nodes
+    
     def __setitem__(self, name, value):
         if name not in self.graph.nodes:
             raise KeyError(f"Node {name} not in graph")
 
         self.graph.nodes[name] = value
+        self.draw_order = None
     
+    def update_transform(self, node):
+        """
+        Retorna la transformación local de un nodo y si cambió desde la última llamada.
+        La matriz sólo se recalcula cuando cambia transform, position, rotation o scale.
+        """
+        return self._update_transform(node, self.graph.nodes[node])
+
+    def _update_transform(self, node, attributes):
+        # Cambió si se asignó otro arreglo al atributo o si se modificó el mismo
+        cached = self.local_transformations.get(node)
+        if cached is not None:
+            transform, position, rotation, scale = cached[0]
+            if attributes["transform"] is transform and attributes["position"] is position and \
+                    attributes["rotation"] is rotation and attributes["scale"] is scale and \
+                    cached[1] == (transform.version, position.version, rotation.version, scale.version):
+                return cached[2], False
+
+        values = [self._tracked(attributes, name) for name in TRANSFORM_ATTRIBUTES]
+        versions = tuple(value.version for value in values)
+
+        transform, position, rotation, scale = (np.asarray(value) for value in values)
+        transform = transform @ tr.trs(position, rotation, scale)
+        self.local_transformations[node] = (values, versions, transform)
+        return transform, True
+
+    @staticmethod
+    def _tracked(attributes, name):
+        # Un arreglo asignado directamente al nodo, o una vista de otro, se reemplaza por una copia con versión
+        value = attributes[name]
+        if not isinstance(value, TrackedArray) or value._root is not value:
+            value = TrackedArray(value)
+            attributes[name] = value
+        return value
+
     def get_transform(self, node):
-        node = self.graph.nodes[node]
-        transform = node["transform"]
-        translation_matrix = tr.translate(node["position"][0], node["position"][1], node["position"][2])
-        rotation_matrix =  tr.rotationY(node["rotation"][1]) @ tr.rotationX(node["rotation"][0]) @ tr.rotationZ(node["rotation"][2])
-        scale_matrix = tr.scale(node["scale"][0], node["scale"][1], node["scale"][2])
-        return transform @ translation_matrix @ rotation_matrix @ scale_matrix
+        return self.update_transform(node)[0]
 
     def get_forward(self, node):
         node = self.graph.nodes[node]
         rotation_matrix = tr.rotationY(node["rotation"][1]) @ tr.rotationX(node["rotation"][0]) @ tr.rotationZ(node["rotation"][2])
         return rotation_matrix @ np.array([0, 0, 1, 0], dtype=np.float32)
 
+    def get_draw_order(self):
+        """
+        Retorna los nodos en orden DFS como una lista de (nombre, índice del padre, atributos).
+        Sólo se recorre el grafo cuando cambia su estructura.
+        """
+        if self.draw_order is None:
+            root_key = self.graph.graph["root"]
+            indices = {root_key: 0}
+            self.draw_order = [(root_key, -1, self.graph.nodes[root_key])]
+            for src, dst in edge_dfs(self.graph, source=root_key):
+                # la raíz está conectada a sí misma
+                if dst in indices:
+                    continue
+                indices[dst] = len(self.draw_order)
+                self.draw_order.append((dst, indices[src], self.graph.nodes[dst]))
+            self.world_transforms = [None] * len(self.draw_order)
+            # cada subárbol queda contiguo en el orden DFS
+            self.subtree_end = list(range(1, len(self.draw_order) + 1))
+            for i in range(len(self.draw_order) - 1, 0, -1):
+                parent = self.draw_order[i][1]
+                self.subtree_end[parent] = max(self.subtree_end[parent], self.subtree_end[i])
+        return self.draw_order
+
+    @staticmethod
+    def outside_frustum(frustum, box_min, box_max):
+        """Indica para cada caja (AABB) si queda completamente detrás de algún plano del frustum"""
+        normals = frustum[:, :3]
+        # esquina de cada caja más adentro según la normal de cada plano
+        corners = np.where(normals[None] >= 0, box_max[:, None], box_min[:, None])
+        return ((corners * normals).sum(axis=2) + frustum[:, 3] < 0).any(axis=1)
+
+    def cull(self, frustum):
+        """
+        Descarta los nodos fuera del frustum. Cada nodo tiene una caja en coordenadas de
+        mundo para su malla y otra que envuelve su subárbol, de modo que un subárbol
+        completo se descarta con una sola prueba. Los subárboles con luces nunca se descartan.
+        Retorna (malla fuera, subárbol fuera, cantidad acumulada de mallas en orden DFS).
+        """
+        draw_order = self.draw_order
+        n = len(draw_order)
+        has_mesh = np.zeros(n, dtype=bool)
+        has_light = np.zeros(n, dtype=bool)
+        local_min = np.zeros((n, 3), dtype=np.float32)
+        local_max = np.zeros((n, 3), dtype=np.float32)
+        for i, (_, _, current_node) in enumerate(draw_order):
+            if current_node["pipeline"] is None:
+                continue
+            if current_node["light"] is not None:
+                has_light[i] = True
+            elif current_node["mesh"] is not None:
+                has_mesh[i] = True
+                local_min[i] = current_node["mesh"].aabb_min
+                local_max[i] = current_node["mesh"].aabb_max
+
+        # caja de la malla transformada a coordenadas de mundo
+        world = np.array(self.world_transforms, dtype=np.float32)
+        center = (local_min + local_max) / 2
+        extent = (local_max - local_min) / 2
+        world_center = np.einsum("nij,nj->ni", world[:, :3, :3], center) + world[:, :3, 3]
+        world_extent = np.einsum("nij,nj->ni", np.abs(world[:, :3, :3]), extent)
+        node_min = world_center - world_extent
+        node_max = world_center + world_extent
+
+        # cajas de los subárboles, de las hojas hacia la raíz
+        subtree_min = node_min.copy()
+        subtree_max = node_max.copy()
+        subtree_mesh = has_mesh.copy()
+        subtree_light = has_light.copy()
+        for i in range(n - 1, 0, -1):
+            parent = draw_order[i][1]
+            subtree_light[parent] |= subtree_light[i]
+            if not subtree_mesh[i]:
+                continue
+            if subtree_mesh[parent]:
+                np.minimum(subtree_min[parent], subtree_min[i], out=subtree_min[parent])
+                np.maximum(subtree_max[parent], subtree_max[i], out=subtree_max[parent])
+            else:
+                subtree_min[parent] = subtree_min[i]
+                subtree_max[parent] = subtree_max[i]
+                subtree_mesh[parent] = True
+
+        node_outside = self.outside_frustum(frustum, node_min, node_max)
+        subtree_outside = ~subtree_light & (~subtree_mesh | self.outside_frustum(frustum, subtree_min, subtree_max))
+        mesh_count = np.concatenate(([0], np.cumsum(has_mesh)))
+        return node_outside, subtree_outside, mesh_count
+
     def draw(self):
-        root_key = self.graph.graph["root"]
-        edges = list(edge_dfs(self.graph, source=root_key))
-        self.transformations = {root_key: self.get_transform(root_key)}
-        pointLightIndex = 0
-        spotLightIndex = 0
+        draw_order = self.get_draw_order()
+        world_transforms = self.world_transforms
 
-        for src, dst in edges:
-            current_node = self.graph.nodes[dst]
+        # Sólo se recalculan las transformaciones globales de los nodos que
+        # cambiaron o que tienen un ancestro que cambió
+        dirty = [False] * len(draw_order)
+        for i, (dst, parent, current_node) in enumerate(draw_order):
+            local_transform, changed = self._update_transform(dst, current_node)
+            if changed or world_transforms[i] is None or (parent >= 0 and dirty[parent]):
+                world_transforms[i] = local_transform if parent < 0 else world_transforms[parent] @ local_transform
+                self.transformations[dst] = world_transforms[i]
+                dirty[i] = True
+
+        culling = None
+        if self.frustum_culling and "camera" in self.controller.program_state:
+            culling = self.cull(self.controller.program_state["camera"].get_frustum())
+
+        render_queue = []
+        pipeline_order = {}
+        texture_order = {}
+        material_order = {}
+        mesh_order = {}
+        self.lights.clear()
+        self.drawn_nodes = 0
+        self.culled_nodes = 0
+        skip_until = 0
+
+        for i, (dst, parent, current_node) in enumerate(draw_order):
+            if i < skip_until:
+                continue
 
-            if not dst in self.transformations:
-                self.transformations[dst] = self.transformations[src] @ self.get_transform(dst)
+            """
+            Culling, se saltan los subárboles que quedan fuera de la cámara
+            """
+            if culling is not None and culling[1][i]:
+                skip_until = self.subtree_end[i]
+                self.culled_nodes += int(culling[2][skip_until] - culling[2][i])
+                continue
 
             current_pipeline = current_node["pipeline"]
             if current_pipeline is None:
                 continue
 
             """ 
-            Setup de luces 
+            Setup de luces, se empaquetan en el uniform buffer de la escena
             """
-            if current_node["light"] is not None:
-                current_pipelines = current_pipeline
-                if not isinstance(current_pipeline, list):
-                    current_pipelines = [current_pipeline]
-
-                for pipeline in current_pipelines:
-                    pipeline.use()
-                    if "u_viewPos" in pipeline.uniforms:
-                        pipeline["u_viewPos"] = self.controller.program_state["camera"].position[:3]
-                    if isinstance(current_node["light"], DirectionalLight):
-                        if "u_dirLight.direction" in pipeline.uniforms:
-                            pipeline["u_dirLight.direction"] = (self.transformations[src] @ self.get_forward(dst))[:3]
-                            pipeline["u_dirLight.ambient"] = current_node["light"].ambient
-                            pipeline["u_dirLight.diffuse"] = current_node["light"].diffuse
-                            pipeline["u_dirLight.specular"] = current_node["light"].specular
-                    elif isinstance(current_node["light"], PointLight):
-                        if "u_numPointLights" in pipeline.uniforms:
-                            pipeline["u_numPointLights"] = self.num_point_lights
-                            position = (self.transformations[src] @ np.array([current_node["position"][0], current_node["position"][1], current_node["position"][2], 1], dtype=np.float32))[:3]
-                            pipeline[f"u_pointLights[{str(pointLightIndex)}].position"] = position
-                            pipeline[f"u_pointLights[{str(pointLightIndex)}].ambient"] = current_node["light"].ambient
-                            pipeline[f"u_pointLights[{str(pointLightIndex)}].diffuse"] = current_node["light"].diffuse
-                            pipeline[f"u_pointLights[{str(pointLightIndex)}].specular"] = current_node["light"].specular
-                            pipeline[f"u_pointLights[{str(pointLightIndex)}].constant"] = current_node["light"].constant
-                            pipeline[f"u_pointLights[{str(pointLightIndex)}].linear"] = current_node["light"].linear
-                            pipeline[f"u_pointLights[{str(pointLightIndex)}].quadratic"] = current_node["light"].quadratic
-
-                    elif isinstance(current_node["light"], SpotLight):
-                        if "u_numSpotLights" in pipeline.uniforms:
-                            pipeline["u_numSpotLights"] = self.num_spot_lights
-                            position = (self.transformations[src] @ np.array([current_node["position"][0], current_node["position"][1], current_node["position"][2], 1], dtype=np.float32))[:3]
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].position"] = position
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].direction"] = (self.transformations[src] @ self.get_forward(dst))[:3]
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].ambient"] = current_node["light"].ambient
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].diffuse"] = current_node["light"].diffuse
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].specular"] = current_node["light"].specular
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].constant"] = current_node["light"].constant
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].linear"] = current_node["light"].linear
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].quadratic"] = current_node["light"].quadratic
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].cutOff"] = current_node["light"].cutOff
-                            pipeline[f"u_spotLights[{str(spotLightIndex)}].outerCutOff"] = current_node["light"].outerCutOff
-
-                if isinstance(current_node["light"], PointLight):
-                    pointLightIndex += 1
-                elif isinstance(current_node["light"], SpotLight):
-                    spotLightIndex += 1
+            light = current_node["light"]
+            if light is not None:
+                if isinstance(light, DirectionalLight):
+                    self.lights.set_directional_light(light, (world_transforms[parent] @ self.get_forward(dst))[:3])
+                elif isinstance(light, PointLight):
+                    position = (world_transforms[parent] @ np.append(current_node["position"], 1))[:3]
+                    self.lights.add_point_light(light, position)
+                elif isinstance(light, SpotLight):
+                    position = (world_transforms[parent] @ np.append(current_node["position"], 1))[:3]
+                    self.lights.add_spot_light(light, position, (world_transforms[parent] @ self.get_forward(dst))[:3])
+                continue
 
+            if current_node["mesh"] is None:
                 continue
 
-            current_pipeline.use()
-            """ 
-            Setup de cámara 
+            if culling is not None and culling[0][i]:
+                self.culled_nodes += 1
+                continue
+            self.drawn_nodes += 1
+
+            """
+            Cola de dibujo, ordenada por pipeline, textura y material
             """
-            if "camera" in self.controller.program_state:
-                camera = self.controller.program_state["camera"]
-                if camera is None:
-                    raise ValueError("Camera es None")
-                if "u_view" in current_pipeline.uniforms:
-                    current_pipeline["u_view"] = camera.get_view()
+            texture = None
+            if "u_texture" in current_pipeline.uniforms:
+                texture = current_node["texture"]
 
-                if "u_projection" in current_pipeline.uniforms:
-                    current_pipeline["u_projection"] = camera.get_projection()
+            material = None
+            if "u_material.diffuse" in current_pipeline.uniforms:
+                material = current_node["material"]
+                if material is None:
+                    raise ValueError("Material es None")
 
-            if current_node["mesh"] is not None:
+            render_queue.append((
+                pipeline_order.setdefault(id(current_pipeline), len(pipeline_order)),
+                texture_order.setdefault(id(texture), len(texture_order)),
+                material_order.setdefault(id(material), len(material_order)),
+                mesh_order.setdefault(id(current_node["mesh"]), len(mesh_order)),
+                current_node["mode"],
+                current_node["cull_face"],
+                i))
+
+        self.lights.upload()
+        render_queue.sort()
+        self.draw_render_queue(render_queue)
+
+    def setup_pipeline(self, pipeline):
+        """ 
+        Setup de cámara y luces, una vez por pipeline
+        """
+        if not self.render_state.use_pipeline(pipeline):
+            return
+
+        for name, value in self.frame_uniforms.items():
+            if name in pipeline.uniforms:
+                pipeline[name] = value
+
+        self.lights.bind(pipeline)
+
+    def setup_material(self, pipeline, node):
+        state = self.render_state
+        if "u_color" in pipeline.uniforms and state.set_color(node["color"]):
+            pipeline["u_color"] = np.array(node["color"], dtype=np.float32)
+
+        if "u_material.diffuse" in pipeline.uniforms and state.set_material(node["material"]):
+            material = node["material"]
+            pipeline["u_material.diffuse"] = material.diffuse
+            pipeline["u_material.ambient"] = material.ambient
+            pipeline["u_material.specular"] = material.specular
+            pipeline["u_material.shininess"] = material.shininess
+
+        if "u_texture" in pipeline.uniforms and node["texture"] is not None:
+            state.bind_texture(node["texture"])
+
+    def draw_render_queue(self, render_queue):
+        draw_order = self.get_draw_order()
+        state = self.render_state
+        state.reset()
+
+        # uniforms que son iguales para todos los nodos del frame
+        self.frame_uniforms = {}
+        if "camera" in self.controller.program_state:
+            camera = self.controller.program_state["camera"]
+            if camera is None:
+                raise ValueError("Camera es None")
+            self.frame_uniforms["u_view"] = camera.get_view()
+            self.frame_uniforms["u_projection"] = camera.get_projection()
+            self.frame_uniforms["u_viewPos"] = camera.position[:3]
+
+        start = 0
+        while start < len(render_queue):
+            # los nodos con el mismo pipeline, textura, material, mesh, modo y
+            # cull_face quedan contiguos en la cola y se pueden dibujar juntos
+            group_key = render_queue[start][:-1]
+            end = start + 1
+            while end < len(render_queue) and render_queue[end][:-1] == group_key:
+                end += 1
+
+            _, _, current_node = draw_order[render_queue[start][-1]]
+            current_pipeline = current_node["pipeline"]
+            instanced_pipeline = self.instanced_pipelines.get(id(current_pipeline))
+
+            if instanced_pipeline is not None and end - start > 1:
                 """
-                Setup de Material
+                Dibujo con instancing
                 """
-                if "u_color" in current_pipeline.uniforms:
-                    current_pipeline["u_color"] = np.array(current_node["color"], dtype=np.float32)
-
-                if "u_material.diffuse" in current_pipeline.uniforms:
-                    material = current_node["material"]
-                    if material is None:
-                        raise ValueError("Material es None")
-                    current_pipeline["u_material.diffuse"] = material.diffuse
-                    current_pipeline["u_material.ambient"] = material.ambient
-                    current_pipeline["u_material.specular"] = material.specular
-                    current_pipeline["u_material.shininess"] = material.shininess
-
-                textured = "u_texture" in current_pipeline.uniforms and current_node["texture"] is not None
-                if textured:
-                    current_node["texture"].bind()
+                nodes = [draw_order[item[-1]][2] for item in render_queue[start:end]]
+                models = np.array([self.world_transforms[item[-1]] for item in render_queue[start:end]])
+                colors = None
+                if "a_color" in instanced_pipeline.attributes:
+                    colors = np.array([node["color"] for node in nodes], dtype=np.float32)
+
+                self.setup_pipeline(instanced_pipeline)
+                self.setup_material(instanced_pipeline, current_node)
+                state.set_cull_face(current_node["cull_face"])
+                current_node["mesh"].draw_instanced(instanced_pipeline, models, colors, current_node["mode"])
+            else:
+                for item in render_queue[start:end]:
+                    _, _, current_node = draw_order[item[-1]]
+                    self.setup_pipeline(current_pipeline)
+                    self.setup_material(current_pipeline, current_node)
+
+                    """
+                    Setup de Mesh
+                    """
+                    current_pipeline["u_model"] = np.reshape(self.world_transforms[item[-1]], (16, 1), order="F")
+                    state.set_cull_face(current_node["cull_face"])
+                    current_node["mesh"].draw(current_node["mode"], None, current_pipeline)
+
+            start = end
+
+        # se deja el estado por defecto para el resto de la aplicación
+        state.bind_texture(None)
+        state.set_cull_face(True)
 
-                """
-                Setup de Mesh
-                """                
-                current_pipeline["u_model"] = np.reshape(self.transformations[dst], (16, 1), order="F")
-                current_node["mesh"].draw(current_node["mode"], current_node["cull_face"])
-
-                if textured:
-                    current_node["texture"].unbind()
-            
     def find_position(self, node_name):
-        for src, dst in self.transformations.items():
-            if src == node_name:
-                return dst[:3, 3]
-        return None
\ No newline at end of file
+        transform = self.transformations.get(node_name)
+        if transform is None:
+            return None
+        return transform[:3, 3]
\ No newline at end of file